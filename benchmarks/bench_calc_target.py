@@ -0,0 +1,56 @@
+""" Crossover of the pure Python and NumPy paths of calc_target_batch and table lookups """
+import timeit
+
+import pytest
+
+from custom_components.wda_sensor import curve
+from custom_components.wda_sensor.const import *  # noqa: F403
+from custom_components.wda_sensor.curve import NUMPY_MIN_BATCH_SIZE, CurveTable, calc_target_batch
+
+SIZES = [16, 32, 64, 128, 256]
+LOOKUP_SIZES = [4, 8, 16, 46]
+
+# Minimum size of the NumPy path by path name
+PATHS = {"python": float("inf"), "numpy": 0}
+
+
+def _outside_temps(size):
+    return [-50 + 70 * i / size for i in range(size)]
+
+
+@pytest.mark.parametrize("path", PATHS)
+@pytest.mark.parametrize("size", SIZES)
+def bench_calc_target_batch_path(bench, monkeypatch, size, path):
+    monkeypatch.setattr(curve, "NUMPY_MIN_BATCH_SIZE", PATHS[path])
+    bench(calc_target_batch, _outside_temps(size), 80)
+
+
+@pytest.mark.parametrize("path", PATHS)
+@pytest.mark.parametrize("size", LOOKUP_SIZES)
+def bench_lookup_batch_path(bench, monkeypatch, size, path):
+    """ Graph of the default range has 46 points """
+    monkeypatch.setattr(curve, "NUMPY_MIN_LOOKUP_SIZE", PATHS[path])
+    table = CurveTable(
+        80, DEFAULT_EXP_MIN, DEFAULT_EXP_MAX, CURVE_TABLE_RESOLUTION,
+        DEFAULT_MIN_OUTSIDE_TEMP, DEFAULT_MAX_OUTSIDE_TEMP)
+    bench(table.lookup_batch, [-25 + 45 * i / size for i in range(size)])
+
+
+def _best_time(size, path, monkeypatch):
+    monkeypatch.setattr(curve, "NUMPY_MIN_BATCH_SIZE", PATHS[path])
+    outside_temps = _outside_temps(size)
+    return min(timeit.repeat(lambda: calc_target_batch(outside_temps, 80), number=200, repeat=7))
+
+
+def bench_numpy_min_batch_size(request, monkeypatch):
+    """ NumPy is slower at half of the threshold and faster at double, times are of the same run """
+    if request.config.getoption("benchmark_disable"):
+        pytest.skip("benchmarks are disabled")
+    curve.get_numpy()
+
+    below = NUMPY_MIN_BATCH_SIZE // 2
+    above = NUMPY_MIN_BATCH_SIZE * 2
+    assert _best_time(below, "python", monkeypatch) < _best_time(below, "numpy", monkeypatch), \
+        f"NumPy is faster at {below} values, NUMPY_MIN_BATCH_SIZE may be lowered"
+    assert _best_time(above, "numpy", monkeypatch) < _best_time(above, "python", monkeypatch), \
+        f"NumPy is slower at {above} values, NUMPY_MIN_BATCH_SIZE has to be raised"
@@ -0,0 +1,27 @@
+""" Heating curve calculation """
+import pytest
+
+from custom_components.wda_sensor.curve import CURVE_CACHE, calc_target, calc_target_batch
+
+
+def bench_calc_target(bench):
+    bench(calc_target, -7.3, 80)
+
+
+def bench_calc_target_batch_cached_graph(bench):
+    """ Graph of the default range from the shared table, compare with bench_calc_target_batch_rounded """
+    bench(CURVE_CACHE.calc_target_batch, list(range(-25, 21)), 80, ndigits=1)
+
+
+@pytest.mark.parametrize("size", [16, 256, 4096])
+def bench_calc_target_batch_outside_temps(bench, size):
+    outside_temps = [-50 + 70 * i / size for i in range(size)]
+    bench(calc_target_batch, outside_temps, 80)
+
+
+def bench_calc_target_batch_heating_curves(bench):
+    bench(calc_target_batch, -7.3, list(range(1, 201)))
+
+
+def bench_calc_target_batch_rounded(bench):
+    bench(calc_target_batch, list(range(-25, 21)), 80, ndigits=1)
@@ -0,0 +1,32 @@
+""" Incremental fusion of several source sensors """
+import itertools
+import random
+
+import pytest
+
+from custom_components.wda_sensor.const import *  # noqa: F403
+from custom_components.wda_sensor.fusion import SourceFusion
+from custom_components.wda_sensor.settings import SourceSettings
+
+
+@pytest.mark.parametrize("sources", [10, 1000])
+@pytest.mark.parametrize("mode", FUSION_MODES)
+def bench_fusion_update(bench, mode, sources):
+    """ One state change of a source, the cost must not grow with the number of sources """
+    entities = [f"sensor.outside_temp_{index}" for index in range(sources)]
+    source = SourceSettings.create(OPT_WDA_OUTSIDE_TEMP, entities, {OPT_WDA_OUTSIDE_TEMP_FUSION: mode})
+    rnd = random.Random(0)
+    values = {entity_id: round(rnd.uniform(-30, 15), 1) for entity_id in entities}
+    fusion = SourceFusion(source, values.get)
+    assert fusion.value is not None
+
+    # Every update changes the value of the next source, some become unavailable
+    updates = itertools.cycle([
+        (entity_id, None if index % 50 == 0 else round(rnd.uniform(-30, 15), 1))
+        for index, entity_id in enumerate(entities * 3)
+    ])
+
+    def update():
+        fusion.update(*next(updates))
+
+    bench(update)
@@ -0,0 +1,35 @@
+""" Inputs reading and setpoint calculation """
+import asyncio
+
+import pytest
+
+from custom_components.wda_sensor.const import *  # noqa: F403
+from custom_components.wda_sensor.helpers import get_config_value, update
+from custom_components.wda_sensor.settings import WDASettings
+
+
+@pytest.fixture
+def run():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+def bench_update(bench, run, hass, config_entry):
+    assert run(update(hass, config_entry)) is not None
+    bench(lambda: run(update(hass, config_entry)))
+
+
+def bench_update_compiled_settings(bench, run, hass, config_entry):
+    settings = WDASettings.from_config_entry(config_entry)
+    assert run(update(hass, config_entry, settings)) is not None
+    bench(lambda: run(update(hass, config_entry, settings)))
+
+
+def bench_settings_from_config_entry(bench, config_entry):
+    bench(WDASettings.from_config_entry, config_entry)
+
+
+@pytest.mark.parametrize("key", [OPT_WDA_OUTSIDE_TEMP, "missing"])
+def bench_get_config_value(bench, config_entry, key):
+    bench(get_config_value, config_entry, key, None)
@@ -0,0 +1,12 @@
+import pytest
+
+from import_time import MODULE, measure
+
+
+def bench_import_time(request):
+    """ Import of the integration stays within the budget """
+    budget = request.config.getoption("--import-budget-ms")
+    median, slowest = measure()
+    slowest = ", ".join(f"{name} {self_us / 1000:.1f} ms" for name, self_us in slowest.items())
+    if median / 1000 > budget:
+        pytest.fail(f"Import of {MODULE} took {median / 1000:.1f} ms, budget is {budget} ms. Slowest: {slowest}")
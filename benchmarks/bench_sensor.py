@@ -0,0 +1,16 @@
+""" Heating curve graph data """
+import pytest
+
+from custom_components.wda_sensor.const import DEFAULT_EXP_MAX, DEFAULT_EXP_MIN
+from custom_components.wda_sensor.sensor import WDACurveSensor
+
+
+@pytest.fixture
+def curve_sensor():
+    # Graph data does not depend on the entity state
+    return WDACurveSensor.__new__(WDACurveSensor)
+
+
+@pytest.mark.parametrize("graph_range", [(-25, 20), (-50, 20), (-10, 10)], ids=lambda r: f"{r[0]}..{r[1]}")
+def bench_generate_graph_data(bench, curve_sensor, graph_range):
+    bench(curve_sensor.generate_graph_data, 80, DEFAULT_EXP_MIN, DEFAULT_EXP_MAX, *graph_range)
@@ -0,0 +1,29 @@
+""" Calculation trace """
+from custom_components.wda_sensor.const import *  # noqa: F403
+from custom_components.wda_sensor.trace import ComputationTrace
+
+INPUTS = {
+    OPT_WDA_OUTSIDE_TEMP: -5.0,
+    OPT_WDA_WIND_SPEED: 4.0,
+    OPT_WDA_OUTSIDE_HUMIDITY: None,
+    OPT_WDA_CIRCUITS: {
+        MAIN_CIRCUIT: {OPT_WDA_INSIDE_TEMP: 20.5, OPT_WDA_TARGET_ROOM_TEMP: 21.5, OPT_WDA_HEATING_CURVE: 80},
+    },
+}
+RESULTS = {MAIN_CIRCUIT: 58}
+BREAKDOWN = {MAIN_CIRCUIT: (54.3, 2.0, 0.8, None, 0.0)}
+
+
+def bench_trace_record(bench):
+    """ Record of a calculation, the buffer is full and records are overwritten """
+    trace = ComputationTrace()
+    for _ in range(trace.capacity):
+        trace.record(0.0, {TRIGGER_ENTITY}, INPUTS, RESULTS, BREAKDOWN)
+    bench(trace.record, 0.0, {TRIGGER_ENTITY}, INPUTS, RESULTS, BREAKDOWN)
+
+
+def bench_trace_as_dict(bench):
+    trace = ComputationTrace()
+    for _ in range(trace.capacity):
+        trace.record(0.0, {TRIGGER_ENTITY}, INPUTS, RESULTS, BREAKDOWN)
+    bench(trace.as_dict)
@@ -0,0 +1,208 @@
+"""
+Microbenchmarks of the calculation hot path.
+
+Medians are compared with a machine-readable baseline file, a benchmark
+fails if it is slower than the baseline by more than the threshold.
+Baselines are machine-local: they are written only with `--save-baseline`,
+are not committed, and nothing is compared without a baseline of this
+machine.
+"""
+import json
+import platform
+import sys
+import warnings
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+pytest.importorskip("homeassistant")
+pytest.importorskip("pytest_benchmark")
+
+from homeassistant.core import State  # noqa: E402
+from homeassistant.helpers import entity_registry  # noqa: E402
+
+from custom_components.wda_sensor.const import *  # noqa: E402,F403
+from import_time import DEFAULT_BUDGET_MS as DEFAULT_IMPORT_BUDGET_MS  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.2
+
+_measured = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("wda baseline")
+    group.addoption(
+        "--baseline", default=str(DEFAULT_BASELINE),
+        help="Path of the baseline file")
+    group.addoption(
+        "--save-baseline", "--update-baseline", dest="save_baseline", action="store_true", default=False,
+        help="Write the results of this run to the baseline, nothing is compared")
+    group.addoption(
+        "--regression-threshold", type=float, default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown of the median relative to the baseline (0.2 = 20%%)")
+    group.addoption(
+        "--import-budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+        help="Allowed import time of the integration")
+
+
+def _machine():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+    }
+
+
+def _load_baseline(config):
+    """ Baseline file contents, None if it does not exist """
+    path = Path(config.getoption("--baseline"))
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    """ Baseline medians by benchmark name, None if medians are not compared """
+    config = request.config
+    if config.getoption("save_baseline") or config.getoption("benchmark_disable"):
+        return None
+
+    data = _load_baseline(config)
+    if data is None:
+        warnings.warn(
+            f"Baseline {config.getoption('--baseline')} does not exist, medians are not compared. "
+            f"Create it on this machine with --save-baseline")
+        return None
+    if data.get("machine") != _machine():
+        warnings.warn(
+            f"Baseline was measured on {data.get('machine')}, medians are not compared "
+            f"on this machine {_machine()}. Save a baseline of this machine with --save-baseline")
+        return None
+    return data.get("benchmarks", {})
+
+
+@pytest.fixture
+def bench(benchmark, baseline, request):
+    """ `benchmark` with comparison against the baseline """
+    threshold = request.config.getoption("--regression-threshold")
+
+    def run(func, *args, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+        if benchmark.stats is None:
+            # Benchmarks are disabled
+            return result
+
+        stats = benchmark.stats.stats
+        name = request.node.nodeid.split("::", 1)[-1]
+        _measured[name] = {"median": stats.median, "mean": stats.mean, "rounds": stats.rounds}
+        if baseline is None:
+            return result
+
+        expected = baseline.get(name)
+        if expected is None:
+            warnings.warn(f"{name} is not in the baseline, save the baseline to compare it")
+        elif stats.median > expected["median"] * (1 + threshold):
+            pytest.fail(
+                f"{name}: median {stats.median * 1e6:.3f} us is slower than baseline "
+                f"{expected['median'] * 1e6:.3f} us by more than {threshold:.0%}")
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """ Save the baseline if requested """
+    config = session.config
+    if not _measured or not config.getoption("save_baseline"):
+        return
+
+    # Benchmarks of this run replace theirs of a baseline of the same machine
+    path = Path(config.getoption("--baseline"))
+    data = _load_baseline(config) or {}
+    benchmarks = data.get("benchmarks", {}) if data.get("machine") == _machine() else {}
+    benchmarks.update(_measured)
+    path.write_text(json.dumps({
+        "machine": _machine(),
+        "benchmarks": dict(sorted(benchmarks.items())),
+    }, indent=4) + "\n")
+
+
+class StubStates:
+    """ State machine with a states dict """
+
+    def __init__(self, states):
+        self._states = {entity_id: State(entity_id, str(value)) for entity_id, value in states.items()}
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+
+class StubRegistry:
+    """ Entity registry with a unique ID dict """
+
+    def __init__(self, entity_ids):
+        self._entity_ids = entity_ids
+
+    def async_get_entity_id(self, platform, domain, unique_id):
+        return self._entity_ids.get((platform, domain, unique_id))
+
+
+@pytest.fixture
+def config_entry():
+    return SimpleNamespace(
+        entry_id="bench",
+        title="Bench",
+        data={},
+        options={
+            OPT_NAME: "Bench",
+            OPT_WDA_MIN_COOLANT_TEMP: DEFAULT_MIN_COOLANT_TEMP,
+            OPT_WDA_MAX_COOLANT_TEMP: DEFAULT_MAX_COOLANT_TEMP,
+            OPT_WDA_UPDATE_INTERVAL: str(DEFAULT_UPDATE_INTERVAL),
+            OPT_WDA_OUTSIDE_TEMP: "sensor.outside_temp",
+            OPT_WDA_INSIDE_TEMP: "sensor.inside_temp",
+            OPT_WDA_WIND_SPEED: "sensor.wind_speed",
+            OPT_WDA_OUTSIDE_HUMIDITY: "sensor.outside_humidity",
+            SECTION_ADVANCED_SETTINGS: {
+                OPT_WDA_ROOM_TEMP_CORRECTION: DEFAULT_ROOM_TEMP_CORRECTION,
+                OPT_WDA_WIND_CORRECTION: DEFAULT_WIND_CORRECTION,
+                OPT_WDA_HUMIDITY_CORRECTION: DEFAULT_HUMIDITY_CORRECTION,
+                OPT_WDA_EXP_MIN: DEFAULT_EXP_MIN,
+                OPT_WDA_EXP_MAX: DEFAULT_EXP_MAX,
+            },
+        },
+    )
+
+
+@pytest.fixture
+def hass(config_entry):
+    """ Lightweight `hass` with states of all inputs and registered numbers """
+    entry_id = config_entry.entry_id
+    number_ids = {
+        OPT_WDA_TARGET_ROOM_TEMP: "number.bench_target_room_temp",
+        OPT_WDA_HEATING_CURVE: "number.bench_heating_curve",
+    }
+    hass = SimpleNamespace(
+        data={},
+        bus=SimpleNamespace(async_listen=lambda *args, **kwargs: lambda: None),
+        states=StubStates({
+            "sensor.outside_temp": -7.3,
+            "sensor.inside_temp": 20.8,
+            "sensor.wind_speed": 4.5,
+            "sensor.outside_humidity": 82,
+            number_ids[OPT_WDA_TARGET_ROOM_TEMP]: DEFAULT_TARGET_ROOM_TEMP,
+            number_ids[OPT_WDA_HEATING_CURVE]: DEFAULT_HEATING_CURVE,
+        }),
+    )
+    hass.data[entity_registry.DATA_REGISTRY] = StubRegistry({
+        ("number", DOMAIN, f"{key}_{entry_id}"): entity_id
+        for key, entity_id in number_ids.items()
+    })
+    return hass
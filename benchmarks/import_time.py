@@ -0,0 +1,102 @@
+"""
+Import time of the integration measured with `python -X importtime`.
+
+Home Assistant modules that are loaded before any integration (core,
+config entries, entity platforms and the integrations listed as
+dependencies in the manifest) are imported first, so only the cost added
+by the integration is measured. The median of several fresh interpreters
+is compared with the budget.
+
+    python benchmarks/import_time.py --budget-ms 60
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULE = "custom_components.wda_sensor"
+
+# Loaded by Home Assistant before the integration is set up
+PRELOADED = (
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.components.http",
+    "homeassistant.components.websocket_api",
+    "homeassistant.components.number",
+    "homeassistant.components.sensor",
+)
+
+DEFAULT_BUDGET_MS = 60
+DEFAULT_RUNS = 5
+
+
+def parse_importtime(output):
+    """ Return {module: (self_us, cumulative_us)} of `-X importtime` output, first import only """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_once(module=MODULE, preloaded=PRELOADED):
+    """ Import time of `module` and its own imports in a fresh interpreter """
+    code = "".join(f"import {name}\n" for name in preloaded) + f"import {module}\n"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, (str(ROOT), os.environ.get("PYTHONPATH"))))}
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, cwd=ROOT, check=False)
+    if process.returncode:
+        raise RuntimeError(f"Import of {module} failed:\n{process.stderr[-2000:]}")
+
+    modules = parse_importtime(process.stderr)
+    if module not in modules:
+        raise RuntimeError(f"{module} is already imported by preloaded modules")
+
+    # Modules imported after the preloaded ones are caused by the integration
+    names = list(modules)
+    start = max(names.index(name) for name in preloaded if name in modules) + 1
+    added = {name: modules[name] for name in names[start:]}
+    return modules[module][1], added
+
+
+def measure(module=MODULE, preloaded=PRELOADED, runs=DEFAULT_RUNS):
+    """ Median import time (microseconds) and the slowest modules of the last run """
+    totals = []
+    for _ in range(runs):
+        total, added = measure_once(module, preloaded)
+        totals.append(total)
+    slowest = sorted(added.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    return statistics.median(totals), {name: self_us for name, (self_us, _) in slowest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="allowed import time")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="number of interpreters to measure")
+    args = parser.parse_args()
+
+    median, slowest = measure(runs=args.runs)
+    report = {
+        "module": MODULE,
+        "import_ms": round(median / 1000, 3),
+        "budget_ms": args.budget_ms,
+        "slowest_self_ms": {name: round(self_us / 1000, 3) for name, self_us in slowest.items()},
+    }
+    print(json.dumps(report, indent=4))
+    if median / 1000 > args.budget_ms:
+        print(f"Import time {median / 1000:.1f} ms exceeds the budget of {args.budget_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
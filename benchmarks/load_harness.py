@@ -0,0 +1,399 @@
+"""
+End-to-end load harness: many config entries and sensor event storms.
+
+Entries are set up through the integration `async_setup_entry` on a local
+Home Assistant core (state machine, event bus, registries, entity platforms)
+without HTTP, recorder or network access. Synthetic state changes are then
+driven into the outside, inside, wind and humidity sensors.
+
+Reported metrics: per-entry setup time, event loop lag percentiles,
+recomputes per second, state writes per second and memory per entry.
+
+With `--weather` entries get a stub weather entity whose hourly forecast
+is served by a local `weather.get_forecasts` service and changes with every
+storm interval.
+
+    python benchmarks/load_harness.py --entries 500 --interval 2 --duration 30
+"""
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+from types import MappingProxyType
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from homeassistant.config_entries import ConfigEntries, ConfigEntry, ConfigEntryState  # noqa: E402
+from homeassistant.const import EVENT_STATE_CHANGED, Platform  # noqa: E402
+from homeassistant.core import HomeAssistant, SupportsResponse  # noqa: E402
+from homeassistant.helpers import device_registry, entity, entity_registry, restore_state  # noqa: E402
+from homeassistant.helpers.entity_platform import EntityPlatform  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+
+from custom_components.wda_sensor import async_setup_entry, async_unload_entry, number, sensor  # noqa: E402
+from custom_components.wda_sensor.config_flow import WDASensorConfigFlow  # noqa: E402
+from custom_components.wda_sensor.const import *  # noqa: E402,F403
+
+_LOGGER = logging.getLogger("wda_load_harness")
+
+PLATFORMS = {"number": number, "sensor": sensor}
+
+# Sensor kinds and ranges of synthetic values
+SOURCES = {
+    "outside_temp": (-30.0, 15.0),
+    "inside_temp": (18.0, 24.0),
+    "wind_speed": (0.0, 15.0),
+    "outside_humidity": (30.0, 100.0),
+}
+
+
+def source_entities(kind, group, args):
+    """ Source sensors of an input, several of them with `--sources-per-input` """
+    if args.sources_per_input == 1:
+        return [f"sensor.load_{kind}_{group}"]
+    return [f"sensor.load_{kind}_{group}_{index}" for index in range(args.sources_per_input)]
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class StubWeather:
+    """ Weather entities with hourly forecasts served by `weather.get_forecasts` """
+
+    def __init__(self, hass, groups, hours=48):
+        self.hass = hass
+        self.groups = groups
+        self.hours = hours
+        self.version = 0
+        self.calls = 0
+        hass.services.async_register(
+            "weather", "get_forecasts", self.handle_get_forecasts,
+            supports_response=SupportsResponse.ONLY)
+        self.async_update()
+
+    def entity_id(self, group):
+        return f"weather.load_{group}"
+
+    def forecast(self, group):
+        start = dt_util.utcnow().replace(minute=0, second=0, microsecond=0)
+        return [
+            {
+                "datetime": (start + timedelta(hours=hour)).isoformat(),
+                "temperature": round(-10 + 8 * ((hour + self.version + group) % 24) / 24, 1),
+                "wind_speed": 18.0,
+                "humidity": 80,
+            }
+            for hour in range(self.hours)
+        ]
+
+    def handle_get_forecasts(self, call):
+        self.calls += 1
+        entity_ids = call.data["entity_id"]
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        return {
+            entity_id: {"forecast": self.forecast(int(entity_id.rsplit("_", 1)[1]))}
+            for entity_id in entity_ids
+        }
+
+    def async_update(self):
+        """ New forecast, weather entities write their state """
+        self.version += 1
+        for group in range(self.groups):
+            self.hass.states.async_set(self.entity_id(group), "cloudy", {
+                "temperature_unit": "°C",
+                "wind_speed_unit": "km/h",
+                "forecast_version": self.version,
+            })
+
+
+def create_config_entry(index, args):
+    """ Config entry of the integration, sources are shared by groups of entries """
+    group = index % args.source_groups
+    options = {
+        OPT_NAME: f"Load {index}",
+        OPT_WDA_MIN_COOLANT_TEMP: DEFAULT_MIN_COOLANT_TEMP,
+        OPT_WDA_MAX_COOLANT_TEMP: DEFAULT_MAX_COOLANT_TEMP,
+        OPT_WDA_UPDATE_INTERVAL: str(args.update_interval),
+        OPT_WDA_OUTSIDE_TEMP: source_entities("outside_temp", group, args),
+        OPT_WDA_INSIDE_TEMP: source_entities("inside_temp", group, args),
+        OPT_WDA_WIND_SPEED: source_entities("wind_speed", group, args),
+        OPT_WDA_OUTSIDE_HUMIDITY: source_entities("outside_humidity", group, args),
+        SECTION_ADVANCED_SETTINGS: {
+            OPT_WDA_ROOM_TEMP_CORRECTION: DEFAULT_ROOM_TEMP_CORRECTION,
+            OPT_WDA_WIND_CORRECTION: DEFAULT_WIND_CORRECTION,
+            OPT_WDA_HUMIDITY_CORRECTION: DEFAULT_HUMIDITY_CORRECTION,
+            OPT_WDA_EXP_MIN: DEFAULT_EXP_MIN,
+            OPT_WDA_EXP_MAX: DEFAULT_EXP_MAX,
+            OPT_WDA_COALESCE_WINDOW: args.coalesce_window,
+            OPT_WDA_COALESCE_MAX_LATENCY: max(args.coalesce_window, DEFAULT_COALESCE_MAX_LATENCY),
+        },
+        SECTION_FUSION_SETTINGS: {
+            mode_option: args.fusion for mode_option, _, _ in FUSION_INPUTS.values()
+        },
+    }
+
+    kwargs = {
+        "version": WDASensorConfigFlow.VERSION,
+        "minor_version": 1,
+        "domain": DOMAIN,
+        "title": options[OPT_NAME],
+        "data": options,
+        "options": options,
+        "source": "user",
+        "entry_id": f"load{index:05d}",
+        # Coordinator first refresh expects entry in setup
+        "state": ConfigEntryState.SETUP_IN_PROGRESS,
+    }
+
+    if args.weather:
+        options[OPT_WDA_WEATHER] = f"weather.load_{group}"
+
+    # Arguments of newer Home Assistant versions
+    params = inspect.signature(ConfigEntry.__init__).parameters
+    if "discovery_keys" in params:
+        kwargs["discovery_keys"] = MappingProxyType({})
+    if "subentries_data" in params:
+        kwargs["subentries_data"] = None
+    return ConfigEntry(**kwargs)
+
+
+def platform_scan_interval(domain):
+    """ Scan interval the entity component gives to the platform, 30 s for sensors """
+    component = importlib.import_module(f"homeassistant.components.{domain}")
+    return getattr(PLATFORMS[domain], "SCAN_INTERVAL", component.SCAN_INTERVAL)
+
+
+class LocalConfigEntries(ConfigEntries):
+    """ Config entries with platforms set up directly, without the loader """
+
+    def __init__(self, hass, scan_interval=None):
+        super().__init__(hass, {})
+        self.platforms = []
+        self.local_entries = {}
+        # Polling entities are updated as by Home Assistant unless overridden
+        self.scan_interval = scan_interval
+
+    def async_add_local(self, entry):
+        """ Register entry without setting it up """
+        self.local_entries[entry.entry_id] = entry
+
+    def async_get_entry(self, entry_id):
+        return self.local_entries.get(entry_id)
+
+    async def async_forward_entry_setups(self, entry, platforms):
+        for domain in platforms:
+            platform = EntityPlatform(
+                hass=self.hass,
+                logger=_LOGGER,
+                domain=str(domain),
+                platform_name=DOMAIN,
+                platform=PLATFORMS[str(domain)],
+                scan_interval=self.scan_interval or platform_scan_interval(str(domain)),
+                entity_namespace=None)
+            self.platforms.append(platform)
+            await platform.async_setup_entry(entry)
+
+    async def async_unload_platforms(self, entry, platforms):
+        for platform in [p for p in self.platforms if p.config_entry is entry]:
+            await platform.async_reset()
+            self.platforms.remove(platform)
+        return True
+
+
+async def create_hass(config_dir, scan_interval=None):
+    """ Local Home Assistant core with registries """
+    hass = HomeAssistant(config_dir)
+    hass.config_entries = LocalConfigEntries(hass, scan_interval)
+    entity.async_setup(hass)
+    await device_registry.async_load(hass)
+    await entity_registry.async_load(hass)
+    await restore_state.async_load(hass)
+    return hass
+
+
+async def monitor_loop_lag(interval, lags, stop):
+    """ Collect event loop lag: delay of wakeups after `interval` sleeps """
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def drive_storm(hass, args, stop, weather=None):
+    """ Set new values of all sources every `interval` seconds, `burst` times in a row """
+    rnd = random.Random(args.seed)
+    updates = 0
+    while not stop.is_set():
+        for group in range(args.source_groups):
+            for kind, (low, high) in SOURCES.items():
+                for _ in range(args.burst):
+                    for entity_id in source_entities(kind, group, args):
+                        hass.states.async_set(entity_id, round(rnd.uniform(low, high), 1))
+                        updates += 1
+                        # Let handlers of every state change run
+                        await asyncio.sleep(0)
+        if weather is not None:
+            weather.async_update()
+        try:
+            await asyncio.wait_for(stop.wait(), args.interval)
+        except asyncio.TimeoutError:
+            pass
+    return updates
+
+
+async def run(args):
+    logging.basicConfig(level=args.log_level)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        scan_interval = None if args.scan_interval is None else timedelta(seconds=args.scan_interval)
+        hass = await create_hass(config_dir, scan_interval)
+
+        # Initial source states
+        for group in range(args.source_groups):
+            for kind, (low, high) in SOURCES.items():
+                for entity_id in source_entities(kind, group, args):
+                    hass.states.async_set(entity_id, (low + high) / 2)
+        weather = StubWeather(hass, args.source_groups) if args.weather else None
+
+        # Setup of all entries, memory is traced only here
+        entries = [create_config_entry(index, args) for index in range(args.entries)]
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        setup_start = time.perf_counter()
+        for entry in entries:
+            hass.config_entries.async_add_local(entry)
+            await async_setup_entry(hass, entry)
+        await hass.async_block_till_done()
+        setup_time = time.perf_counter() - setup_start
+        memory_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        computes = [hass.data[DOMAIN][entry.entry_id]["compute"] for entry in entries]
+        setup_times = [compute.stats.setup_time for compute in computes]
+        first_result_times = [compute.stats.first_result_time for compute in computes]
+        own_entities = set(entity_registry.async_get(hass).entities)
+
+        writes = 0
+
+        def count_write(event):
+            nonlocal writes
+            if event.data["entity_id"] in own_entities:
+                writes += 1
+
+        unsub = hass.bus.async_listen(EVENT_STATE_CHANGED, count_write)
+        computations_before = sum(compute.computations for compute in computes)
+
+        # Event storm
+        lags = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval, lags, stop))
+        storm = asyncio.create_task(drive_storm(hass, args, stop, weather))
+        storm_start = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        updates = await storm
+        await monitor
+
+        # Pending coalesced recalculations
+        await asyncio.sleep(args.coalesce_window + DEFAULT_COALESCE_MAX_LATENCY)
+        await hass.async_block_till_done()
+        elapsed = time.perf_counter() - storm_start
+        unsub()
+
+        computations = sum(compute.computations for compute in computes) - computations_before
+        report = {
+            "entries": args.entries,
+            "source_groups": args.source_groups,
+            "setup_seconds": round(setup_time, 3),
+            "entry_setup_ms": {
+                "p50": round(percentile(setup_times, 50) * 1000, 3),
+                "p95": round(percentile(setup_times, 95) * 1000, 3),
+                "max": round(max(setup_times) * 1000, 3),
+            },
+            "entry_first_result_ms_p95": round(percentile(first_result_times, 95) * 1000, 3),
+            "memory_per_entry_kib": round((memory_after - memory_before) / args.entries / 1024, 1),
+            "source_updates": updates,
+            "duration_seconds": round(elapsed, 3),
+            "recomputes": computations,
+            "recomputes_per_second": round(computations / elapsed, 1),
+            "state_writes": writes,
+            "state_writes_per_second": round(writes / elapsed, 1),
+            "loop_lag_ms": {
+                "p50": round(percentile(lags, 50) * 1000, 3),
+                "p95": round(percentile(lags, 95) * 1000, 3),
+                "p99": round(percentile(lags, 99) * 1000, 3),
+                "max": round(max(lags) * 1000, 3),
+                "mean": round(statistics.fmean(lags) * 1000, 3),
+            },
+        }
+
+        # Effective intervals of the periodic sensors
+        intervals = [compute.stats.update_interval for compute in computes]
+        report["update_interval_s"] = {"min": min(intervals), "max": max(intervals)}
+
+        if weather is not None:
+            trajectory = computes[0].trajectories.get(MAIN_CIRCUIT)
+            forecast_sensor = entity_registry.async_get(hass).async_get_entity_id(
+                Platform.SENSOR, DOMAIN, f"wda_forecast_sensor_{entries[0].entry_id}")
+            report["forecast"] = {
+                "service_calls": weather.calls,
+                "updates": sum(compute.forecast_updates for compute in computes),
+                "points": len(computes[0].forecast or ()),
+                "first_setpoints": None if trajectory is None else list(trajectory.setpoints[:6]),
+                "sensor_state": hass.states.get(forecast_sensor).state if forecast_sensor else None,
+            }
+
+        for entry in entries:
+            await async_unload_entry(hass, entry)
+        await hass.async_stop(force=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=500, help="number of config entries")
+    parser.add_argument("--source-groups", type=int, default=1, help="number of source sensor sets shared by entries")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between source updates")
+    parser.add_argument("--burst", type=int, default=1, help="updates of every source per interval")
+    parser.add_argument("--duration", type=float, default=30.0, help="storm duration, seconds")
+    parser.add_argument("--coalesce-window", type=float, default=DEFAULT_COALESCE_WINDOW,
+                        help="coalescing window of entries, seconds")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="loop lag sampling interval, seconds")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of source values")
+    parser.add_argument("--sources-per-input", type=int, default=1, help="source sensors of every input")
+    parser.add_argument("--fusion", choices=FUSION_MODES, default=DEFAULT_FUSION, help="fusion mode of all inputs")
+    parser.add_argument("--update-interval", type=int, default=DEFAULT_UPDATE_INTERVAL,
+                        help=f"periodic sensor update interval, seconds, {UPDATE_INTERVAL_ADAPTIVE} is adaptive")
+    parser.add_argument("--weather", action="store_true", help="use stub weather entities with hourly forecasts")
+    parser.add_argument("--scan-interval", type=float,
+                        help="scan interval of polling entities, seconds, the platform default (30) if not set")
+    parser.add_argument("--json", help="write report to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=4))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,9 @@ import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import config_validation as cv, device_registry as dr
 
+from .api import CurveGraph, async_setup_api
 from .const import (
     DEFAULT_EXP_MAX,
     DEFAULT_EXP_MIN,
@@ -13,6 +14,7 @@ from .const import (
     DEFAULT_ROOM_TEMP_CORRECTION,
     DEFAULT_WIND_CORRECTION,
     DOMAIN,
+    MAIN_CIRCUIT,
     OPT_NAME,
     OPT_WDA_EXP_MAX,
     OPT_WDA_EXP_MIN,
@@ -21,10 +23,21 @@ from .const import (
     OPT_WDA_WIND_CORRECTION,
     SECTION_ADVANCED_SETTINGS
 )
+from .compute import WDAComputation
 from .coordinator import WDAUpdateCoordinator
+from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config) -> bool:
+    """ Set up integration wide API and services. """
+    async_setup_api(hass)
+    async_setup_services(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """ Set up sensor from a config entry. """
@@ -40,16 +53,45 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
         model="Weather Driven Heating Control"
     )
 
+    # Calculation shared by all sensors of the entry
+    compute = WDAComputation(hass, config_entry)
+
+    # Create devices of additional heating circuits
+    for circuit in compute.settings.circuits:
+        if circuit.id != MAIN_CIRCUIT:
+            device_registry.async_get_or_create(
+                config_entry_id=config_entry.entry_id,
+                identifiers={circuit.device_identifier},
+                name=circuit.name,
+                manufacturer="Sergey V. Sokolov",
+                model="Heating Circuit",
+                via_device=(DOMAIN, config_entry.entry_id)
+            )
+
     # Create coordinator for periodic updates
-    coordinator = WDAUpdateCoordinator(hass, config_entry)
+    coordinator = WDAUpdateCoordinator(hass, config_entry, compute)
     hass.data[DOMAIN][config_entry.entry_id] = {
+        "compute": compute,
         "coordinator": coordinator,
+        "curve": CurveGraph(config_entry.entry_id),
         "device_id": device.id,
     }
 
-    await hass.config_entries.async_forward_entry_setups(config_entry, [Platform.NUMBER])
-    await hass.config_entries.async_forward_entry_setups(config_entry, [Platform.SENSOR])
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        # Number inputs are tracked by unique ID, subscriptions may precede their registration
+        await compute.async_start()
+
+        # Platform setup returns when its entities are added, numbers have restored their values then
+        await hass.config_entries.async_forward_entry_setups(config_entry, [Platform.NUMBER, Platform.SENSOR])
+    except Exception:
+        # Subscriptions of a failed setup must not outlive it
+        hass.data[DOMAIN].pop(config_entry.entry_id, None)
+        coordinator.async_stop()
+        compute.async_stop()
+        raise
+
+    # First calculation and coordinator refresh do not block the setup
+    compute.async_set_ready()
     return True
 
 
@@ -60,8 +102,13 @@ async def async_update_options(hass: HomeAssistant, config_entry: ConfigEntry) -
 
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """ Unload a config entry. """
-    await hass.config_entries.async_unload_platforms(config_entry, [Platform.SENSOR, Platform.NUMBER])
-    return True
+    unload_ok = await hass.config_entries.async_unload_platforms(
+        config_entry, [Platform.SENSOR, Platform.NUMBER])
+    if unload_ok:
+        entry_data = hass.data[DOMAIN].pop(config_entry.entry_id)
+        entry_data["coordinator"].async_stop()
+        entry_data["compute"].async_stop()
+    return unload_ok
 
 
 async def async_migrate_entry(hass, config_entry):
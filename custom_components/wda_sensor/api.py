@@ -0,0 +1,146 @@
+""" Websocket and HTTP API for heating curve data. """
+import hashlib
+import logging
+from http import HTTPStatus
+
+from aiohttp import web
+
+from homeassistant.components import websocket_api
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.http import KEY_HASS
+from homeassistant.helpers.json import json_bytes
+
+import voluptuous as vol
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CurveGraph:
+    """ Heating curve data of a config entry in columnar form """
+
+    def __init__(self, entry_id):
+        self.entry_id = entry_id
+        self.version = 0
+        self.outside_temps = ()
+        self.targets = ()
+        self.body = None
+        self.etag = None
+        self._listeners = []
+
+    @callback
+    def async_update(self, graph_data):
+        """ Store new graph data, notify listeners only if data is changed """
+        outside_temps = tuple(graph_data)
+        targets = tuple(graph_data.values())
+        if outside_temps == self.outside_temps and targets == self.targets:
+            return False
+
+        self.outside_temps = outside_temps
+        self.targets = targets
+        self.version += 1
+
+        # Serialize once per version, HTTP clients get cached body
+        self.body = json_bytes(self.as_dict())
+        self.etag = f'"{hashlib.blake2s(self.body, digest_size=8).hexdigest()}"'
+
+        for listener in list(self._listeners):
+            listener()
+        return True
+
+    def as_dict(self):
+        return {
+            "entry_id": self.entry_id,
+            "version": self.version,
+            "outside_temp": list(self.outside_temps),
+            "target_temp": list(self.targets),
+        }
+
+    @callback
+    def async_add_listener(self, listener):
+        """ Listen for data changes, return function to remove listener """
+        self._listeners.append(listener)
+
+        @callback
+        def remove_listener():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return remove_listener
+
+
+def get_curve_graph(hass, entry_id):
+    """ Return `CurveGraph` of config entry or None """
+    entry_data = hass.data.get(DOMAIN, {}).get(entry_id)
+    if not isinstance(entry_data, dict):
+        return None
+    return entry_data.get("curve")
+
+
+@callback
+def async_setup_api(hass: HomeAssistant):
+    """ Register websocket commands and HTTP view """
+    websocket_api.async_register_command(hass, websocket_get_curve)
+    websocket_api.async_register_command(hass, websocket_subscribe_curve)
+    hass.http.register_view(WDACurveView())
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/curve",
+    vol.Required("entry_id"): str,
+    vol.Optional("version"): int,
+})
+@callback
+def websocket_get_curve(hass, connection, msg):
+    """ Return heating curve data, or only version if client has actual data """
+    graph = get_curve_graph(hass, msg["entry_id"])
+    if graph is None:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "Config entry not found")
+        return
+
+    if msg.get("version") == graph.version:
+        connection.send_result(msg["id"], {"version": graph.version, "not_modified": True})
+        return
+
+    connection.send_result(msg["id"], graph.as_dict())
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/curve/subscribe",
+    vol.Required("entry_id"): str,
+})
+@callback
+def websocket_subscribe_curve(hass, connection, msg):
+    """ Send heating curve data now and on every change """
+    graph = get_curve_graph(hass, msg["entry_id"])
+    if graph is None:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "Config entry not found")
+        return
+
+    @callback
+    def forward_curve():
+        connection.send_message(websocket_api.event_message(msg["id"], graph.as_dict()))
+
+    connection.subscriptions[msg["id"]] = graph.async_add_listener(forward_curve)
+    connection.send_result(msg["id"])
+    forward_curve()
+
+
+class WDACurveView(HomeAssistantView):
+    """ Heating curve data with ETag support """
+
+    url = f"/api/{DOMAIN}/curve/{{entry_id}}"
+    name = f"api:{DOMAIN}:curve"
+
+    async def get(self, request, entry_id):
+        graph = get_curve_graph(request.app[KEY_HASS], entry_id)
+        if graph is None or graph.body is None:
+            return self.json_message("Config entry not found", HTTPStatus.NOT_FOUND)
+
+        headers = {"ETag": graph.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("If-None-Match") == graph.etag:
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+        return web.Response(body=graph.body, content_type="application/json", headers=headers)
@@ -0,0 +1,431 @@
+"""
+Offline backtesting: replay a time series of weather and room sensors
+through the setpoint calculation. Home Assistant is not required.
+
+The series is read in chunks and every chunk is evaluated vectorized, so
+memory is bounded by the chunk size. Many parameter sets are evaluated in
+parallel by a process pool, one pass over the data per parameter set.
+
+Input is a CSV or Parquet file with columns `time`, `outside_temp`,
+`inside_temp`, `wind_speed`, `outside_humidity` and optionally `actual`
+(real flow temperature, used for error metrics). Missing columns and
+non-numeric values are treated as unavailable sensors. Setpoints are the
+same as of the live calculation unless the curve is interpolated in lookup
+tables (`fast`). Run without Home Assistant by `scripts/backtest.py`.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .const import *  # noqa F403
+from .curve import CURVE_CACHE, ROUNDING_TIE_TOLERANCE, calc_target, calc_target_batch, get_numpy
+from .settings import FrozenSettings
+
+# Offline tool, NumPy is loaded together with the module
+np = get_numpy()
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Columns of the input series
+COLUMN_TIME = "time"
+COLUMN_OUTSIDE_TEMP = "outside_temp"
+COLUMN_INSIDE_TEMP = "inside_temp"
+COLUMN_WIND_SPEED = "wind_speed"
+COLUMN_OUTSIDE_HUMIDITY = "outside_humidity"
+COLUMN_ACTUAL = "actual"
+
+INPUT_COLUMNS = (COLUMN_OUTSIDE_TEMP, COLUMN_INSIDE_TEMP, COLUMN_WIND_SPEED, COLUMN_OUTSIDE_HUMIDITY)
+
+
+class CurveParams(FrozenSettings):
+    """ Parameters of one backtest run """
+
+    __slots__ = (
+        "name",
+        "heating_curve",
+        "target_room_temp",
+        "exp_min",
+        "exp_max",
+        "room_temp_correction",
+        "wind_correction",
+        "humidity_correction",
+        "min_coolant_temp",
+        "max_coolant_temp",
+    )
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name}>"
+
+    @classmethod
+    def from_dict(cls, params, name=None):
+        """ Parameters from dict, missing values are defaults of a new config entry """
+        heating_curve = int(params.get("heating_curve", DEFAULT_HEATING_CURVE))
+        return cls(
+            name=str(params.get("name") or name or f"hc{heating_curve}"),
+            heating_curve=heating_curve,
+            target_room_temp=float(params.get("target_room_temp", DEFAULT_TARGET_ROOM_TEMP)),
+            exp_min=float(params.get("exp_min", DEFAULT_EXP_MIN)),
+            exp_max=float(params.get("exp_max", DEFAULT_EXP_MAX)),
+            room_temp_correction=float(params.get("room_temp_correction", DEFAULT_ROOM_TEMP_CORRECTION)),
+            wind_correction=float(params.get("wind_correction", DEFAULT_WIND_CORRECTION)),
+            humidity_correction=float(params.get("humidity_correction", DEFAULT_HUMIDITY_CORRECTION)),
+            min_coolant_temp=int(params.get("min_coolant_temp", DEFAULT_MIN_COOLANT_TEMP)),
+            max_coolant_temp=int(params.get("max_coolant_temp", DEFAULT_MAX_COOLANT_TEMP)),
+        )
+
+    def replace(self, **values):
+        """ Return copy with changed values """
+        return self.__class__(**{**self.as_dict(), **values})
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Backtesting requires NumPy")
+
+
+def calc_base_batch(outside_temps, heating_curve, exp_min, exp_max, fast=False):
+    """ Base target temperatures by the formula, or interpolated in shared tables if `fast` """
+    if not fast:
+        return np.asarray(calc_target_batch(outside_temps, heating_curve, exp_min, exp_max), dtype=np.float64)
+    table = CURVE_CACHE.get_table(heating_curve, exp_min, exp_max)
+    return np.asarray(table.lookup_batch(outside_temps), dtype=np.float64)
+
+
+def calc_setpoint_batch(params, outside_temp, inside_temp=None, wind_speed=None, outside_humidity=None, fast=False):
+    """
+    Vectorized `calc_setpoint` for arrays of inputs, NaN marks unavailable
+    values. Return float array of setpoints, NaN where outside temperature
+    is not available. Setpoints are the same as of the live calculation,
+    unless `fast` interpolates the curve in tables.
+    """
+    _require_numpy()
+    outside_temp = np.asarray(outside_temp, dtype=np.float64)
+    valid = ~np.isnan(outside_temp)
+    target = np.full(outside_temp.shape, np.nan)
+    if not valid.any():
+        return target
+
+    # Unavailable inputs make no correction, adding zero keeps values exact
+    def correction(values, func):
+        if values is None:
+            return None
+        values = np.asarray(values, dtype=np.float64)[valid]
+        return np.where(np.isnan(values), 0.0, func(values))
+
+    outside_temps = outside_temp[valid]
+    base = calc_base_batch(outside_temps, params.heating_curve, params.exp_min, params.exp_max, fast)
+
+    # Corrections are added in the order of the live calculation
+    corrections = []
+    if params.room_temp_correction:
+        corrections.append(correction(
+            inside_temp, lambda inside: (params.target_room_temp - inside) * params.room_temp_correction))
+    if params.wind_correction:
+        corrections.append(correction(wind_speed, lambda wind: wind * params.wind_correction))
+    if params.humidity_correction:
+        corrections.append(correction(
+            outside_humidity,
+            lambda humidity: np.maximum(0, (humidity - DEFAULT_HUMIDITY_THRESHOLD) * params.humidity_correction)))
+    corrections = [values for values in corrections if values is not None]
+
+    value = base
+    for values in corrections:
+        value = value + values
+
+    # Limits and rounding to integer (half to even as `round`)
+    value = np.clip(value, params.min_coolant_temp, params.max_coolant_temp)
+
+    if not fast:
+        # Vectorized pow may differ from libm by an ulp, which only matters
+        # for values lying on a rounding tie. Recalculate those exactly.
+        ties = np.flatnonzero(np.abs(value - np.floor(value) - 0.5) < ROUNDING_TIE_TOLERANCE)
+        for i in ties.tolist():
+            exact = calc_target(float(outside_temps[i]), params.heating_curve, params.exp_min, params.exp_max)
+            for values in corrections:
+                exact = exact + float(values[i])
+            value[i] = min(max(exact, params.min_coolant_temp), params.max_coolant_temp)
+
+    target[valid] = np.round(value)
+    return target
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _iter_csv_chunks(path, columns, chunk_size, delimiter):
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+
+    # C parser of pandas is much faster if it is installed
+    if pd is not None:
+        yield from _iter_pandas_chunks(pd, path, columns, chunk_size, delimiter)
+        return
+
+    with open(path, newline="") as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        header = next(reader)
+        indexes = {name: header.index(column) for name, column in columns.items() if column in header}
+
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield _csv_chunk(rows, indexes)
+                rows = []
+        if rows:
+            yield _csv_chunk(rows, indexes)
+
+
+def _csv_chunk(rows, indexes):
+    chunk = {}
+    for name, index in indexes.items():
+        values = [row[index] if index < len(row) else "" for row in rows]
+        if name == COLUMN_TIME:
+            chunk[name] = values
+        else:
+            chunk[name] = np.fromiter(map(_to_float, values), dtype=np.float64, count=len(values))
+    return chunk
+
+
+def _iter_pandas_chunks(pd, path, columns, chunk_size, delimiter):
+    header = pd.read_csv(path, sep=delimiter, nrows=0).columns
+    selected = {name: column for name, column in columns.items() if column in header}
+    dtype = {column: str for name, column in selected.items() if name == COLUMN_TIME}
+    for frame in pd.read_csv(
+            path, sep=delimiter, usecols=list(selected.values()), dtype=dtype, chunksize=chunk_size):
+        chunk = {}
+        for name, column in selected.items():
+            if name == COLUMN_TIME:
+                chunk[name] = frame[column].tolist()
+            else:
+                # States like "unavailable" become NaN
+                chunk[name] = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float64)
+        yield chunk
+
+
+def _iter_parquet_chunks(path, columns, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Reading Parquet files requires pyarrow")
+
+    parquet = pq.ParquetFile(path)
+    available = set(parquet.schema_arrow.names)
+    selected = {name: column for name, column in columns.items() if column in available}
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=list(selected.values())):
+        chunk = {}
+        for name, column in selected.items():
+            array = batch.column(column)
+            if name == COLUMN_TIME:
+                chunk[name] = [str(value) for value in array.to_pylist()]
+            else:
+                chunk[name] = array.to_numpy(zero_copy_only=False).astype(np.float64)
+        yield chunk
+
+
+def iter_chunks(path, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, delimiter=","):
+    """
+    Yield chunks of the series as dicts of column arrays. `columns` maps
+    column names used here to names in the file. Missing columns are absent
+    from chunks. Parquet files are detected by extension.
+    """
+    _require_numpy()
+    columns = {name: name for name in (COLUMN_TIME, *INPUT_COLUMNS, COLUMN_ACTUAL)} | dict(columns or {})
+    if str(path).lower().endswith((".parquet", ".pq")):
+        return _iter_parquet_chunks(path, columns, chunk_size)
+    return _iter_csv_chunks(path, columns, chunk_size, delimiter)
+
+
+class Summary:
+    """ Streaming statistics of a setpoint series """
+
+    def __init__(self, params):
+        self.params = params
+        self.rows = 0
+        self.available = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.changes = 0
+        self.last = None
+
+        # Errors against actual flow temperature
+        self.compared = 0
+        self.error_sum = 0.0
+        self.abs_error_sum = 0.0
+        self.squared_error_sum = 0.0
+
+    def update(self, setpoints, actual=None):
+        self.rows += len(setpoints)
+        valid = setpoints[~np.isnan(setpoints)]
+        if not len(valid):
+            return
+
+        self.available += len(valid)
+        self.total += float(valid.sum())
+        low, high = float(valid.min()), float(valid.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+        # Setpoint changes, including the one between chunks
+        self.changes += int(np.count_nonzero(np.diff(valid)))
+        if self.last is not None and valid[0] != self.last:
+            self.changes += 1
+        self.last = float(valid[-1])
+
+        if actual is not None:
+            mask = ~np.isnan(setpoints) & ~np.isnan(actual)
+            error = setpoints[mask] - actual[mask]
+            self.compared += len(error)
+            self.error_sum += float(error.sum())
+            self.abs_error_sum += float(np.abs(error).sum())
+            self.squared_error_sum += float((error * error).sum())
+
+    def as_dict(self):
+        result = {
+            "params": self.params.as_dict(),
+            "rows": self.rows,
+            "available": self.available,
+            "mean": round(self.total / self.available, 3) if self.available else None,
+            "min": self.min,
+            "max": self.max,
+            "changes": self.changes,
+        }
+        if self.compared:
+            result["compared"] = self.compared
+            result["bias"] = round(self.error_sum / self.compared, 3)
+            result["mae"] = round(self.abs_error_sum / self.compared, 3)
+            result["rmse"] = round(math.sqrt(self.squared_error_sum / self.compared), 3)
+        return result
+
+
+def run_backtest(path, params, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, output=None, delimiter=",",
+                 fast=False):
+    """
+    Stream the series at `path` through the calculation with `params`.
+    Setpoints are written to `output` CSV if given. Return summary dict.
+    """
+    summary = Summary(params)
+    writer = None
+    with open(output, "w", newline="") if output else _NullContext() as file:
+        if file is not None:
+            writer = csv.writer(file)
+            writer.writerow([COLUMN_TIME, "setpoint"])
+
+        for chunk in iter_chunks(path, columns, chunk_size, delimiter):
+            setpoints = calc_setpoint_batch(
+                params,
+                chunk.get(COLUMN_OUTSIDE_TEMP, np.full(_chunk_size(chunk), np.nan)),
+                chunk.get(COLUMN_INSIDE_TEMP),
+                chunk.get(COLUMN_WIND_SPEED),
+                chunk.get(COLUMN_OUTSIDE_HUMIDITY),
+                fast)
+            summary.update(setpoints, chunk.get(COLUMN_ACTUAL))
+
+            if writer is not None:
+                times = chunk.get(COLUMN_TIME) or range(summary.rows - len(setpoints), summary.rows)
+                writer.writerows(
+                    (time, "" if math.isnan(value) else int(value))
+                    for time, value in zip(times, setpoints.tolist()))
+    return summary.as_dict()
+
+
+class _NullContext:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+def _chunk_size(chunk):
+    return len(next(iter(chunk.values()))) if chunk else 0
+
+
+def _run_job(job):
+    path, params, columns, chunk_size, output, delimiter, fast = job
+    return run_backtest(path, params, columns, chunk_size, output, delimiter, fast)
+
+
+def run_backtests(path, params_list, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, output_dir=None,
+                  delimiter=",", workers=None, fast=False):
+    """ Evaluate many parameter sets, in a process pool if `workers` is not 1 """
+    jobs = [
+        (path, params, columns, chunk_size,
+         os.path.join(output_dir, f"{params.name}.csv") if output_dir else None, delimiter, fast)
+        for params in params_list
+    ]
+    if workers == 1 or len(jobs) == 1:
+        return [_run_job(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_job, jobs))
+
+
+def load_params(path):
+    """ Parameter sets from JSON file with an object or a list of objects """
+    with open(path) as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = [data]
+    return [CurveParams.from_dict(params, name=f"set{index}") for index, params in enumerate(data)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a time series of weather and room sensors through the setpoint calculation")
+    parser.add_argument("series", help="CSV or Parquet file")
+    parser.add_argument("--params", help="JSON file with a parameter set or a list of parameter sets")
+    parser.add_argument("--heating-curve", type=int, help="heating curve number of a single parameter set")
+    parser.add_argument("--exp-min", type=float)
+    parser.add_argument("--exp-max", type=float)
+    parser.add_argument("--target-room-temp", type=float)
+    parser.add_argument("--output", help="CSV file of setpoints (single parameter set)")
+    parser.add_argument("--output-dir", help="directory for CSV files of setpoints, one per parameter set")
+    parser.add_argument("--column", action="append", default=[], metavar="NAME=COLUMN",
+                        help=f"column name in the file, NAME is one of: {COLUMN_TIME}, "
+                             f"{', '.join(INPUT_COLUMNS)}, {COLUMN_ACTUAL}")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--workers", type=int, help="worker processes, 1 disables the pool")
+    parser.add_argument("--fast", action="store_true",
+                        help="interpolate the curve in lookup tables, setpoints may differ from the live ones")
+    args = parser.parse_args(argv)
+
+    columns = dict(column.split("=", 1) for column in args.column)
+    overrides = {
+        key: value for key, value in {
+            "heating_curve": args.heating_curve,
+            "exp_min": args.exp_min,
+            "exp_max": args.exp_max,
+            "target_room_temp": args.target_room_temp,
+        }.items() if value is not None
+    }
+    if args.params:
+        params_list = [params.replace(**overrides) for params in load_params(args.params)]
+    else:
+        params_list = [CurveParams.from_dict(overrides)]
+
+    if args.output and len(params_list) == 1:
+        results = [run_backtest(
+            args.series, params_list[0], columns, args.chunk_size, args.output, args.delimiter, args.fast)]
+    else:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        results = run_backtests(
+            args.series, params_list, columns, args.chunk_size, args.output_dir, args.delimiter, args.workers,
+            args.fast)
+
+    json.dump(results, sys.stdout, indent=4)
+    sys.stdout.write("\n")
+    return 0
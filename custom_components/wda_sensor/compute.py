@@ -0,0 +1,350 @@
+import logging
+import time
+from functools import partial
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.util import dt as dt_util
+
+from .const import *  # noqa F403
+from .debounce import Coalescer
+from .forecast import calc_trajectories
+from .fusion import InputFusions
+from .helpers import (
+    async_track_unique_id, calc_setpoints, get_forecast, get_inputs, get_source_dispatcher, parse_state)
+from .instrumentation import TIMER_UPDATE, EntryStats
+from .settings import WDASettings
+from .trace import ComputationTrace
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WDAComputation:
+    """
+    Calculation shared by all sensors of a config entry. Owns subscriptions
+    to the inputs, the latest inputs snapshot and the latest results of all
+    heating circuits, which are calculated together in one batch.
+    """
+
+    def __init__(self, hass, config_entry):
+        self._hass = hass
+        self._config = config_entry
+        self._dirty = True
+        self._listeners = []
+        self._unsubs = []
+        self._source_unsubs = {}
+        self._pending_triggers = set()
+        self._setup_start = time.perf_counter()
+
+        # Recalculations wait until number inputs are restored
+        self._ready = False
+
+        # Recalculations are postponed while parameters are changed in bulk
+        self._held = 0
+
+        self.settings = WDASettings.from_config_entry(config_entry)
+        self.inputs = {}
+        self.results = {}
+        self.last_update = None
+        self.computations = 0
+        self.stats = EntryStats()
+
+        # Output filters of setpoint sensors by circuit
+        self.outputs = {}
+
+        # Number entities by unique ID
+        self.numbers = {}
+
+        # Last calculations with the terms of every setpoint, kept with instrumentation only
+        self.trace = None
+
+        # Hourly forecast of the weather entity and setpoint trajectories by circuit
+        self.forecast = None
+        self.forecast_updates = 0
+        self.trajectories = {}
+        self._weather_entity = None
+        self._weather_unsub = None
+        self._forecast_task = None
+        self._forecast_stale = False
+
+        # Bursts of input updates are collapsed into a single recalculation
+        self._coalescer = Coalescer(hass, self._async_process, name=config_entry.title)
+        self.configure()
+
+    def configure(self):
+        """ Apply settings """
+        self._coalescer.configure(
+            window=self.settings.coalesce_window,
+            max_latency=self.settings.coalesce_max_latency)
+        self.stats.enabled = self.settings.diagnostics
+        if not self.settings.diagnostics:
+            self.trace = None
+        elif self.trace is None:
+            self.trace = ComputationTrace()
+
+        # Source sensors are combined incrementally, as their states change
+        self.fusions = InputFusions(self.settings, get_source_dispatcher(self._hass).get_value)
+
+    @property
+    def coalescer(self):
+        return self._coalescer
+
+    @property
+    def result(self):
+        """ Result of the main circuit """
+        return self.results.get(MAIN_CIRCUIT)
+
+    async def async_start(self):
+        """ Subscribe to inputs and configuration update """
+
+        # Subscribe to update configuration via OptionsFlow
+        self._unsubs.append(
+            async_dispatcher_connect(
+                self._hass,
+                f"{SENSOR_UPDATE_SIGNAL}_{self._config.entry_id}",
+                self.handle_options_update
+            )
+        )
+
+        # Subscribe to update weather and room sensors, once per sensor
+        self._async_subscribe_sources()
+        self._async_subscribe_weather()
+
+        # Subscribe to number inputs of all circuits
+        for circuit in self.settings.circuits:
+            for key, unique_id in (
+                (OPT_WDA_TARGET_ROOM_TEMP, circuit.target_room_temp_unique_id),
+                (OPT_WDA_HEATING_CURVE, circuit.heating_curve_unique_id),
+            ):
+                self._unsubs.append(async_track_unique_id(
+                    self._hass, unique_id, partial(self.handle_number_update, circuit.id, key)))
+
+    @property
+    def source_entities(self):
+        """ Weather and room sensors of all circuits """
+        return self.fusions.entities
+
+    @callback
+    def _async_subscribe_sources(self):
+        """ Sync source subscriptions with the current settings """
+        sources = get_source_dispatcher(self._hass)
+        entities = self.source_entities
+
+        for entity_id in set(self._source_unsubs) - entities:
+            self._source_unsubs.pop(entity_id)()
+        for entity_id in entities - set(self._source_unsubs):
+            self._source_unsubs[entity_id] = sources.async_subscribe(entity_id, self.handle_sensor_update)
+
+    @callback
+    def _async_subscribe_weather(self):
+        """ Sync weather entity subscription with the current settings """
+        entity_id = self.settings.weather_entity
+        if entity_id == self._weather_entity:
+            return
+
+        if self._weather_unsub is not None:
+            self._weather_unsub()
+            self._weather_unsub = None
+        self._weather_entity = entity_id
+        self.forecast = None
+
+        if entity_id:
+            # Weather entity state is written when its forecast is updated
+            self._weather_unsub = async_track_state_change_event(
+                self._hass, entity_id, self.handle_weather_update)
+            if self._ready:
+                self._async_schedule_forecast_update()
+
+    async def handle_weather_update(self, event):
+        """ Handle weather entity update. """
+        _LOGGER.debug(f"Weather entity update detected: {event.data.get('entity_id')}")
+        self._async_schedule_forecast_update()
+
+    @callback
+    def _async_schedule_forecast_update(self):
+        """ Fetch forecast in background, once more if weather is updated during fetch """
+        if self._forecast_task is not None and not self._forecast_task.done():
+            self._forecast_stale = True
+            return
+        self._forecast_task = self._config.async_create_task(self._hass, self.async_update_forecast())
+
+    async def async_update_forecast(self):
+        """ Fetch hourly forecast and recalculate setpoint trajectories """
+        self._forecast_stale = True
+        while self._forecast_stale and self._weather_entity:
+            self._forecast_stale = False
+            self.forecast = await get_forecast(self._hass, self._weather_entity)
+            self.forecast_updates += 1
+        _LOGGER.debug(
+            f"Forecast of '{self._config.title}' updated: "
+            f"{0 if self.forecast is None else len(self.forecast)} points")
+        await self.async_request_refresh(TRIGGER_FORECAST)
+
+    @callback
+    def async_stop(self):
+        """ Unsubscribe from everything """
+        self._coalescer.async_cancel()
+        if self._weather_unsub is not None:
+            self._weather_unsub()
+            self._weather_unsub = None
+        self._weather_entity = None
+        while self._unsubs:
+            self._unsubs.pop()()
+        while self._source_unsubs:
+            self._source_unsubs.popitem()[1]()
+
+    @callback
+    def async_add_listener(self, listener):
+        """
+        Listen for recalculations, `listener` gets a set of triggers.
+        Return function to remove listener.
+        """
+        self._listeners.append(listener)
+
+        @callback
+        def remove_listener():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return remove_listener
+
+    async def handle_sensor_update(self, entity_id, value):
+        """ Handle weather sensors update. """
+        _LOGGER.debug(f"Sensor state change detected: {entity_id} = {value}")
+        # Change of a source may be hidden by the others, e.g. by min/max fusion
+        if self.fusions.update(entity_id, value):
+            await self.async_request_refresh(TRIGGER_ENTITY)
+
+    async def handle_number_update(self, circuit_id, key, event):
+        """ Handle number inputs update. """
+        entity_id = event.data.get("entity_id")
+        # Value may be already calculated, e.g. after a bulk change of parameters
+        value = parse_state(entity_id, event.data.get("new_state"))
+        if self._ready and value == self.inputs.get(OPT_WDA_CIRCUITS, {}).get(circuit_id, {}).get(key):
+            _LOGGER.debug(f"Number state change is already calculated: {entity_id}")
+            return
+        _LOGGER.debug(f"Number state change detected: {entity_id}")
+        await self.async_request_refresh(TRIGGER_NUMBER)
+
+    async def handle_options_update(self):
+        """ Handle options update. """
+        _LOGGER.info(f"Configuration updated, recalculating: {self._config.title}")
+        self._coalescer.async_cancel()
+
+        # Settings are compiled only here
+        self.settings = WDASettings.from_config_entry(self._config)
+        self.configure()
+        self.stats.count_trigger(TRIGGER_OPTIONS)
+
+        # Source sensors and weather entity may be changed
+        self._async_subscribe_sources()
+        self._async_subscribe_weather()
+        self._dirty = True
+        self._pending_triggers.add(TRIGGER_OPTIONS)
+        if self._ready:
+            await self._async_process()
+
+    @property
+    def ready(self):
+        return self._ready
+
+    @callback
+    def async_set_ready(self):
+        """
+        Number inputs are restored, run the first calculation in background
+        so that it does not delay the config entry setup
+        """
+        if self._ready:
+            return
+        self._ready = True
+        self.stats.setup_time = time.perf_counter() - self._setup_start
+        _LOGGER.debug(f"Setup of '{self._config.title}' took {self.stats.setup_time * 1000:.1f} ms")
+        self._config.async_create_task(self._hass, self._async_first_refresh())
+        if self._weather_entity:
+            self._async_schedule_forecast_update()
+
+    async def _async_first_refresh(self):
+        self._dirty = True
+        self._pending_triggers.add(TRIGGER_RESTORED)
+        await self._async_process()
+        self.stats.first_result_time = time.perf_counter() - self._setup_start
+
+    async def async_request_refresh(self, trigger):
+        """ Mark inputs as changed and schedule coalesced recalculation """
+        self._dirty = True
+        self._pending_triggers.add(trigger)
+        self.stats.count_trigger(trigger)
+        # Changes before the first calculation are picked up by it,
+        # changes during a hold are calculated on release
+        if not self._ready or self._held:
+            return
+        await self._coalescer.async_request()
+
+    @callback
+    def async_hold(self):
+        """ Postpone recalculations until `async_release` """
+        self._held += 1
+        # Pending recalculation is made on release
+        self._coalescer.async_cancel()
+
+    async def async_release(self, trigger=None):
+        """ Release a hold, recalculate at once if inputs are changed during it """
+        if trigger is not None:
+            self._dirty = True
+            self._pending_triggers.add(trigger)
+            self.stats.count_trigger(trigger)
+        self._held = max(0, self._held - 1)
+        if self._held or not self._ready or not self._dirty:
+            return
+        self._coalescer.async_cancel()
+        await self._async_process()
+
+    async def async_get_results(self):
+        """ Return the latest results of all circuits, recalculate only if inputs are changed """
+        if self._dirty:
+            await self.async_compute()
+        return self.results
+
+    async def async_get_result(self):
+        """ Return the latest result of the main circuit """
+        return (await self.async_get_results()).get(MAIN_CIRCUIT)
+
+    async def async_compute(self):
+        """ Read inputs snapshot and calculate result """
+        self._dirty = False
+        start = self.stats.start()
+        self.inputs = await get_inputs(self._hass, self.settings, self.fusions)
+        if self.trace is None:
+            self.results = calc_setpoints(self.settings, self.inputs)
+        else:
+            breakdown = {}
+            self.results = calc_setpoints(self.settings, self.inputs, breakdown)
+            self.trace.record(time.time(), self._pending_triggers, self.inputs, self.results, breakdown)
+        self.trajectories = calc_trajectories(self.settings, self.inputs, self.forecast)
+        self.stats.record(TIMER_UPDATE, start)
+        self.last_update = dt_util.utcnow()
+        self.computations += 1
+        _LOGGER.debug(f"Calculated results for '{self._config.title}': {self.results}")
+        return self.result
+
+    async def _async_process(self):
+        """ Recalculate if needed and notify listeners """
+        if self._dirty:
+            try:
+                await self.async_compute()
+            except Exception as e:
+                self.results = {}
+                self.trajectories = {}
+                _LOGGER.error(f"Failed to calculate result for '{self._config.title}': {e}")
+
+        triggers = frozenset(self._pending_triggers)
+        self._pending_triggers.clear()
+        for listener in list(self._listeners):
+            # A failed listener does not prevent the others from update
+            try:
+                await listener(triggers)
+            except Exception as e:
+                _LOGGER.error(
+                    f"Failed to handle recalculation of '{self._config.title}' "
+                    f"by {getattr(listener, '__self__', listener)}: {e}")
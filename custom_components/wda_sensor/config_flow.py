@@ -1,138 +1,18 @@
 import logging
+from uuid import uuid4
 
 from homeassistant import config_entries
-from homeassistant.components.sensor import SensorDeviceClass  # noqa: F401
-from homeassistant.const import Platform, UnitOfTemperature
+from homeassistant.const import MAJOR_VERSION, MINOR_VERSION
 from homeassistant.core import callback
-from homeassistant.data_entry_flow import section
+from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.dispatcher import async_dispatcher_send
-from homeassistant.helpers.selector import (
-    EntityFilterSelectorConfig,
-    EntitySelector,
-    EntitySelectorConfig,
-    NumberSelector,
-    NumberSelectorConfig,
-    NumberSelectorMode,
-    SelectSelector,
-    SelectSelectorConfig,
-    SelectSelectorMode,
-    TextSelector,
-    TextSelectorConfig,
-    TextSelectorType
-)
-
-import voluptuous as vol
 
 from .const import *  # noqa F403
 
 _LOGGER = logging.getLogger(__name__)
 
-
-async def create_schema(hass, config_entry=None, user_input=None, config_flow=True):
-    """ Common schema for ConfigFlow and OptionsFlow."""
-    return vol.Schema({
-        vol.Required(OPT_NAME): TextSelector(TextSelectorConfig(type=TextSelectorType.TEXT)),
-
-        # Settings
-        vol.Required(OPT_WDA_MIN_COOLANT_TEMP, default=DEFAULT_MIN_COOLANT_TEMP):
-            NumberSelector(NumberSelectorConfig(
-                min=10, max=50, mode=NumberSelectorMode.BOX,
-                unit_of_measurement=UnitOfTemperature.CELSIUS)),
-
-        vol.Required(OPT_WDA_MAX_COOLANT_TEMP, default=DEFAULT_MAX_COOLANT_TEMP):
-            NumberSelector(NumberSelectorConfig(
-                min=20, max=150, mode=NumberSelectorMode.BOX,
-                unit_of_measurement=UnitOfTemperature.CELSIUS)),
-
-        # Update interval (periodic sensor only)
-        vol.Required(OPT_WDA_UPDATE_INTERVAL, default=str(DEFAULT_UPDATE_INTERVAL)):
-            SelectSelector(SelectSelectorConfig(
-                options=UPDATE_INTERVAL_CHOICES,
-                mode=SelectSelectorMode.DROPDOWN)),
-
-        # Sensors
-        vol.Required(OPT_WDA_OUTSIDE_TEMP):
-            EntitySelector(EntitySelectorConfig(EntityFilterSelectorConfig(
-                domain=Platform.SENSOR,
-                # device_class=SensorDeviceClass.TEMPERATURE
-            ))),
-        vol.Optional(OPT_WDA_INSIDE_TEMP):
-            EntitySelector(EntitySelectorConfig(EntityFilterSelectorConfig(
-                domain=Platform.SENSOR,
-                # device_class=SensorDeviceClass.TEMPERATURE
-            ))),
-        vol.Optional(OPT_WDA_WIND_SPEED):
-            EntitySelector(EntitySelectorConfig(EntityFilterSelectorConfig(
-                domain=Platform.SENSOR,
-                # device_class=[SensorDeviceClass.SPEED, SensorDeviceClass.WIND_SPEED]
-            ))),
-        vol.Optional(OPT_WDA_OUTSIDE_HUMIDITY):
-            EntitySelector(EntitySelectorConfig(EntityFilterSelectorConfig(
-                domain=Platform.SENSOR,
-                # device_class=SensorDeviceClass.HUMIDITY
-            ))),
-
-        vol.Required(SECTION_ADVANCED_SETTINGS): section(vol.Schema({
-            # Corrections
-            vol.Optional(OPT_WDA_ROOM_TEMP_CORRECTION, default=DEFAULT_ROOM_TEMP_CORRECTION):
-                NumberSelector(NumberSelectorConfig(
-                    min=0.0, max=10.0, mode=NumberSelectorMode.BOX)),
-            vol.Optional(OPT_WDA_WIND_CORRECTION, default=DEFAULT_WIND_CORRECTION):
-                NumberSelector(NumberSelectorConfig(
-                    min=0.0, max=2.0, step=0.1, mode=NumberSelectorMode.BOX)),
-            vol.Optional(OPT_WDA_HUMIDITY_CORRECTION, default=DEFAULT_HUMIDITY_CORRECTION):
-                NumberSelector(NumberSelectorConfig(
-                    min=0.0, max=1.0, step=0.01, mode=NumberSelectorMode.BOX)),
-
-            # Exponent
-            vol.Optional(OPT_WDA_EXP_MIN, default=DEFAULT_EXP_MIN):
-                NumberSelector(NumberSelectorConfig(
-                    min=0.0, max=20.0, step=0.1, mode=NumberSelectorMode.BOX)),
-            vol.Optional(OPT_WDA_EXP_MAX, default=DEFAULT_EXP_MAX):
-                NumberSelector(NumberSelectorConfig(
-                    min=0.0, max=20.0, step=0.1, mode=NumberSelectorMode.BOX)),
-        }), {"collapsed": True}),
-
-        vol.Required(SECTION_CURVE_GRAPH_SETTINGS): section(vol.Schema({
-            # Curve graph data settings
-            vol.Optional(OPT_GRAPH_MIN_OUTSIDE_TEMP, default=GRAPH_MIN_OUTSIDE_TEMP):
-                NumberSelector(NumberSelectorConfig(
-                    min=DEFAULT_MIN_OUTSIDE_TEMP,
-                    max=DEFAULT_MAX_OUTSIDE_TEMP,
-                    mode=NumberSelectorMode.BOX,
-                    unit_of_measurement=UnitOfTemperature.CELSIUS)),
-            vol.Optional(OPT_GRAPH_MAX_OUTSIDE_TEMP, default=GRAPH_MAX_OUTSIDE_TEMP):
-                NumberSelector(NumberSelectorConfig(
-                    min=DEFAULT_MIN_OUTSIDE_TEMP,
-                    max=DEFAULT_MAX_OUTSIDE_TEMP,
-                    mode=NumberSelectorMode.BOX,
-                    unit_of_measurement=UnitOfTemperature.CELSIUS)),
-        }), {"collapsed": True}),
-    })
-
-
-def check_user_input(user_input):
-    errors = {}
-    if user_input is not None:
-        min_coolant_temp = user_input[OPT_WDA_MIN_COOLANT_TEMP]
-        max_coolant_temp = user_input[OPT_WDA_MAX_COOLANT_TEMP]
-        exp_min = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_EXP_MIN]
-        exp_max = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_EXP_MAX]
-        curve_min_temp = user_input[SECTION_CURVE_GRAPH_SETTINGS][OPT_GRAPH_MIN_OUTSIDE_TEMP]
-        curve_max_temp = user_input[SECTION_CURVE_GRAPH_SETTINGS][OPT_GRAPH_MAX_OUTSIDE_TEMP]
-
-        if exp_min > exp_max:
-            errors["base"] = "exp_min_must_be_less"
-            errors[OPT_WDA_EXP_MIN] = "exp_min_must_be_less"
-
-        if min_coolant_temp > max_coolant_temp:
-            errors["base"] = "min_coolant_temp_must_be_less"
-            errors[OPT_WDA_MIN_COOLANT_TEMP] = "min_coolant_temp_must_be_less"
-
-        if curve_min_temp > curve_max_temp:
-            errors["base"] = "graph_min_temp_must_be_less"
-            errors[OPT_GRAPH_MIN_OUTSIDE_TEMP] = "graph_min_temp_must_be_less"
-    return errors
+# Options flow gets config entry from Home Assistant since 2024.12
+OPTIONS_FLOW_HAS_CONFIG_ENTRY = (MAJOR_VERSION, MINOR_VERSION) >= (2024, 12)
 
 
 class WDASensorConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -142,6 +22,7 @@ class WDASensorConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def async_step_user(self, user_input=None):
         """ Handle the initial step. """
+        from .schema import check_user_input, create_schema
         _LOGGER.debug(f"Request to create config: {user_input}")
 
         errors = {}
@@ -171,11 +52,27 @@ class WDASensorOptionsFlow(config_entries.OptionsFlow):
     """ Handle options flow. """
 
     def __init__(self, config_entry):
-        if HA_VERSION < '2024.12':
+        if not OPTIONS_FLOW_HAS_CONFIG_ENTRY:
             self.config_entry = config_entry
 
+    @property
+    def current_options(self):
+        return self.config_entry.options or self.config_entry.data or {}
+
+    @property
+    def circuits(self):
+        return self.current_options.get(OPT_WDA_CIRCUITS, [])
+
     async def async_step_init(self, user_input=None):
         """ Manage the options. """
+        menu_options = ["settings", "add_circuit"]
+        if self.circuits:
+            menu_options.append("remove_circuit")
+        return self.async_show_menu(step_id="init", menu_options=menu_options)
+
+    async def async_step_settings(self, user_input=None):
+        """ Manage the settings. """
+        from .schema import check_user_input, create_schema, with_source_lists
         _LOGGER.debug(f"Request to update options: {user_input}")
 
         errors = {}
@@ -183,17 +80,26 @@ class WDASensorOptionsFlow(config_entries.OptionsFlow):
             errors = check_user_input(user_input)
 
             if not errors:
+                # Additional circuits are managed by separate steps
+                options = {**user_input, OPT_WDA_CIRCUITS: self.circuits}
+
+                # Forecast sensors are created only with weather entity
+                reload = bool(self.current_options.get(OPT_WDA_WEATHER)) != bool(options.get(OPT_WDA_WEATHER))
+
                 # Update configuration
                 self.hass.config_entries.async_update_entry(
                     self.config_entry,
                     title=user_input[OPT_NAME],
-                    options=user_input)
+                    options=options)
 
-                # Send signal to subscribers
-                async_dispatcher_send(self.hass, f"{SENSOR_UPDATE_SIGNAL}_{self.config_entry.entry_id}")
+                if reload:
+                    self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+                else:
+                    # Send signal to subscribers
+                    async_dispatcher_send(self.hass, f"{SENSOR_UPDATE_SIGNAL}_{self.config_entry.entry_id}")
 
                 # Close flow
-                return self.async_create_entry(title="", data=user_input)
+                return self.async_create_entry(title="", data=options)
 
         schema = await create_schema(
             hass=self.hass,
@@ -202,9 +108,60 @@ class WDASensorOptionsFlow(config_entries.OptionsFlow):
             config_flow=False
         )
 
-        options = user_input or self.config_entry.options or self.config_entry.data or {}
+        options = user_input or with_source_lists(self.current_options)
         return self.async_show_form(
-            step_id="init",
+            step_id="settings",
             data_schema=self.add_suggested_values_to_schema(schema, options),
             errors=errors
         )
+
+    async def async_step_add_circuit(self, user_input=None):
+        """ Add heating circuit sharing weather sensors of the entry. """
+        from .schema import check_circuit_input, create_circuit_schema
+        _LOGGER.debug(f"Request to add circuit: {user_input}")
+
+        errors = {}
+        if user_input is not None:
+            errors = check_circuit_input(user_input)
+
+            if not errors:
+                circuit = {OPT_CIRCUIT_ID: uuid4().hex[:8], **user_input}
+                return self.save_circuits([*self.circuits, circuit])
+
+        schema = create_circuit_schema(self.current_options)
+        return self.async_show_form(
+            step_id="add_circuit",
+            data_schema=self.add_suggested_values_to_schema(schema, user_input or {}),
+            errors=errors
+        )
+
+    async def async_step_remove_circuit(self, user_input=None):
+        """ Remove heating circuits with their entities. """
+        from .schema import create_remove_circuit_schema
+        _LOGGER.debug(f"Request to remove circuits: {user_input}")
+
+        if user_input is not None:
+            to_remove = set(user_input[OPT_CIRCUITS_TO_REMOVE])
+
+            # Entities are removed together with circuit device
+            device_registry = dr.async_get(self.hass)
+            for circuit_id in to_remove:
+                device = device_registry.async_get_device(
+                    identifiers={(DOMAIN, f"{self.config_entry.entry_id}_{circuit_id}")})
+                if device:
+                    device_registry.async_remove_device(device.id)
+
+            return self.save_circuits([
+                circuit for circuit in self.circuits
+                if circuit[OPT_CIRCUIT_ID] not in to_remove
+            ])
+
+        schema = create_remove_circuit_schema(self.circuits)
+        return self.async_show_form(step_id="remove_circuit", data_schema=schema)
+
+    def save_circuits(self, circuits):
+        """ Save circuits and reload entry to create or remove entities """
+        options = {**self.current_options, OPT_WDA_CIRCUITS: circuits}
+        self.hass.config_entries.async_update_entry(self.config_entry, options=options)
+        self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+        return self.async_create_entry(title="", data=options)
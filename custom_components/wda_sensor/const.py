@@ -1,14 +1,13 @@
-from awesomeversion import AwesomeVersion
-
-from homeassistant.const import __version__ as HAVERSION  # noqa: N812
-
-HA_VERSION = AwesomeVersion(HAVERSION)
+""" Constants, no Home Assistant imports to be usable by offline tools. """
 
 # WDA domain
 DOMAIN = "wda_sensor"
 SENSOR_UPDATE_SIGNAL = "WDA_SENSOR_OPTIONS_UPDATED"
+DATA_ENTITY_ID_CACHE = f"{DOMAIN}_entity_id_cache"
+DATA_SOURCE_DISPATCHER = f"{DOMAIN}_source_dispatcher"
 SECTION_ADVANCED_SETTINGS = "advanced_settings"
 SECTION_CURVE_GRAPH_SETTINGS = "curve_graph_settings"
+SECTION_FUSION_SETTINGS = "fusion_settings"
 
 # Config options
 OPT_NAME = "name"
@@ -17,17 +16,50 @@ OPT_WDA_MAX_COOLANT_TEMP = "wda_max_coolant_temp"
 OPT_WDA_TARGET_ROOM_TEMP = "wda_target_room_temp"
 OPT_WDA_HEATING_CURVE = "wda_heating_curve"
 OPT_WDA_UPDATE_INTERVAL = "wda_update_interval"
+OPT_WDA_MIN_UPDATE_INTERVAL = "wda_min_update_interval"
+OPT_WDA_MAX_UPDATE_INTERVAL = "wda_max_update_interval"
 OPT_WDA_OUTSIDE_TEMP = "wda_outside_temp"
 OPT_WDA_INSIDE_TEMP = "wda_inside_temp"
 OPT_WDA_WIND_SPEED = "wda_wind_speed"
 OPT_WDA_OUTSIDE_HUMIDITY = "wda_outside_humidity"
+OPT_WDA_OUTSIDE_TEMP_FUSION = "wda_outside_temp_fusion"
+OPT_WDA_OUTSIDE_TEMP_WEIGHTS = "wda_outside_temp_weights"
+OPT_WDA_INSIDE_TEMP_FUSION = "wda_inside_temp_fusion"
+OPT_WDA_INSIDE_TEMP_WEIGHTS = "wda_inside_temp_weights"
+OPT_WDA_WIND_SPEED_FUSION = "wda_wind_speed_fusion"
+OPT_WDA_WIND_SPEED_WEIGHTS = "wda_wind_speed_weights"
+OPT_WDA_OUTSIDE_HUMIDITY_FUSION = "wda_outside_humidity_fusion"
+OPT_WDA_OUTSIDE_HUMIDITY_WEIGHTS = "wda_outside_humidity_weights"
+OPT_WDA_WEATHER = "wda_weather"
+OPT_WDA_FORECAST_LEAD_TIME = "wda_forecast_lead_time"
 OPT_WDA_ROOM_TEMP_CORRECTION = "wda_room_temp_correction"
 OPT_WDA_WIND_CORRECTION = "wda_wind_correction"
 OPT_WDA_HUMIDITY_CORRECTION = "wda_humidity_correction"
 OPT_WDA_EXP_MIN = "wda_exp_min"
 OPT_WDA_EXP_MAX = "wda_exp_max"
+OPT_WDA_COALESCE_WINDOW = "wda_coalesce_window"
+OPT_WDA_COALESCE_MAX_LATENCY = "wda_coalesce_max_latency"
+OPT_WDA_OUTPUT_DEADBAND = "wda_output_deadband"
+OPT_WDA_OUTPUT_MIN_HOLD_TIME = "wda_output_min_hold_time"
+OPT_WDA_DIAGNOSTICS = "wda_diagnostics"
+OPT_WDA_CIRCUITS = "wda_circuits"
+OPT_CIRCUIT_ID = "id"
+OPT_CIRCUITS_TO_REMOVE = "circuits_to_remove"
 OPT_GRAPH_MIN_OUTSIDE_TEMP = "wda_graph_min_outside_temp"
 OPT_GRAPH_MAX_OUTSIDE_TEMP = "wda_graph_max_outside_temp"
+OPT_GRAPH_ATTRIBUTES = "wda_graph_attributes"
+
+# Heating circuit defined by the config entry settings
+MAIN_CIRCUIT = ""
+
+# Calculation triggers
+TRIGGER_ENTITY = "entity"
+TRIGGER_NUMBER = "number"
+TRIGGER_OPTIONS = "options"
+TRIGGER_COORDINATOR = "coordinator"
+TRIGGER_HA_STARTED = "ha_started"
+TRIGGER_RESTORED = "restored"
+TRIGGER_FORECAST = "forecast"
 
 # Min/max heating curve number
 MIN_HEATING_CURVE = 1
@@ -61,9 +93,50 @@ DEFAULT_EXP_MAX = 3.8
 GRAPH_MIN_OUTSIDE_TEMP = -25
 GRAPH_MAX_OUTSIDE_TEMP = 20
 
-# Update interval (seconds)
+# Graph data in the state attributes of the graph sensor, used by dashboard cards
+DEFAULT_GRAPH_ATTRIBUTES = True
+
+# Coalescing of sensor updates bursts (seconds)
+DEFAULT_COALESCE_WINDOW = 0.5
+DEFAULT_COALESCE_MAX_LATENCY = 2.0
+
+# Output filter: min. change of the setpoint (°C) and min. time between changes (seconds)
+DEFAULT_OUTPUT_DEADBAND = 0
+DEFAULT_OUTPUT_MIN_HOLD_TIME = 0
+
+# Performance instrumentation
+DEFAULT_DIAGNOSTICS = False
+
+# Fusion of several sensors of an input
+FUSION_MEAN = "mean"
+FUSION_WEIGHTED_MEAN = "weighted_mean"
+FUSION_MEDIAN = "median"
+FUSION_MIN = "min"
+FUSION_MAX = "max"
+FUSION_MODES = [FUSION_MEAN, FUSION_WEIGHTED_MEAN, FUSION_MEDIAN, FUSION_MIN, FUSION_MAX]
+DEFAULT_FUSION = FUSION_MEAN
+
+# Fusion options and outlier threshold of min/max fusion by input
+FUSION_INPUTS = {
+    OPT_WDA_OUTSIDE_TEMP: (OPT_WDA_OUTSIDE_TEMP_FUSION, OPT_WDA_OUTSIDE_TEMP_WEIGHTS, 5.0),
+    OPT_WDA_INSIDE_TEMP: (OPT_WDA_INSIDE_TEMP_FUSION, OPT_WDA_INSIDE_TEMP_WEIGHTS, 3.0),
+    OPT_WDA_WIND_SPEED: (OPT_WDA_WIND_SPEED_FUSION, OPT_WDA_WIND_SPEED_WEIGHTS, 5.0),
+    OPT_WDA_OUTSIDE_HUMIDITY: (OPT_WDA_OUTSIDE_HUMIDITY_FUSION, OPT_WDA_OUTSIDE_HUMIDITY_WEIGHTS, 20.0),
+}
+
+# Records of the calculation trace of an entry
+DEFAULT_TRACE_SIZE = 512
+
+# Setpoint of the forecast sensor is taken this time ahead (hours)
+DEFAULT_FORECAST_LEAD_TIME = 2
+
+# Update interval (seconds), adaptive interval is limited by min and max ones
 DEFAULT_UPDATE_INTERVAL = 3600
+UPDATE_INTERVAL_ADAPTIVE = 0
+DEFAULT_MIN_UPDATE_INTERVAL = 300
+DEFAULT_MAX_UPDATE_INTERVAL = 7200
 UPDATE_INTERVAL_CHOICES = [
+    {"value": "0", "label": "auto"},
     {"value": "300", "label": "5m"},
     {"value": "600", "label": "10m"},
     {"value": "900", "label": "15m"},
@@ -72,3 +145,12 @@ UPDATE_INTERVAL_CHOICES = [
     {"value": "3600", "label": "1h"},
     {"value": "7200", "label": "2h"}
 ]
+
+# Adaptive update interval: expected change of the outside temperature and
+# of the setpoint (°C) between updates
+ADAPTIVE_OUTSIDE_TEMP_STEP = 0.5
+ADAPTIVE_SETPOINT_STEP = 1
+
+# Curve lookup tables cache
+CURVE_CACHE_SIZE = 64
+CURVE_TABLE_RESOLUTION = 10  # points per 1°C
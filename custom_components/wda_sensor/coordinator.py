@@ -1,34 +1,177 @@
 import logging
+import time
+from collections import deque
 from datetime import timedelta
 
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import DEFAULT_UPDATE_INTERVAL, DOMAIN, OPT_WDA_UPDATE_INTERVAL
-from .helpers import get_config_value, update
+from .const import *  # noqa F403
 
 _LOGGER = logging.getLogger(__name__)
 
+# Values followed by the adaptive update interval
+RATE_OUTSIDE_TEMP = "outside_temp"
+RATE_SETPOINT = "setpoint"
+
+
+class AdaptiveInterval:
+    """
+    Update interval from the recent rate of change of tracked values: the
+    time in which the fastest value is expected to change by its step,
+    limited by min and max intervals. The rate of a value is its change over
+    the last `max_interval` seconds, spans shorter than `min_interval` count
+    as `min_interval` so that a single jump does not look infinitely fast.
+    """
+
+    def __init__(self, min_interval, max_interval, steps):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.steps = steps
+        self.interval = max_interval
+        self._samples = {name: deque() for name in steps}
+
+    def add(self, name, value, now):
+        """ Add sample of a value, old samples are dropped """
+        if value is None:
+            return
+        samples = self._samples[name]
+        samples.append((now, value))
+        while len(samples) > 1 and now - samples[0][0] > self.max_interval:
+            samples.popleft()
+
+    def rate(self, name):
+        """ Change of a value per second, 0 if unknown """
+        samples = self._samples[name]
+        if len(samples) < 2:
+            return 0
+        (start, first), (end, last) = samples[0], samples[-1]
+        return abs(last - first) / max(end - start, self.min_interval)
+
+    def rates(self):
+        """ Rates of all values per hour """
+        return {name: round(self.rate(name) * 3600, 3) for name in self.steps}
+
+    def update(self):
+        """ Recalculate and return the interval (seconds) """
+        interval = self.max_interval
+        for name, step in self.steps.items():
+            rate = self.rate(name)
+            if rate > 0:
+                interval = min(interval, step / rate)
+        self.interval = max(self.min_interval, interval)
+        return self.interval
+
+    def as_dict(self):
+        return {
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "interval": round(self.interval, 1),
+            "rates_per_hour": self.rates(),
+            "samples": {name: len(samples) for name, samples in self._samples.items()},
+        }
+
 
 class WDAUpdateCoordinator(DataUpdateCoordinator):
     """ Periodic sensor data updater """
 
-    def __init__(self, hass, config_entry):
+    def __init__(self, hass, config_entry, compute):
         self.hass = hass
-        self.config_entry = config_entry
-
-        update_interval = get_config_value(
-            config_entry, OPT_WDA_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
+        self.compute = compute
+        self.adaptive = None
+        self._last_refresh = None
+        self._unsub_adaptive = None
 
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(seconds=int(update_interval)))
+            update_interval=None)
+        # Newer versions take the entry from the setup context, older ones ignore it
+        self.config_entry = config_entry
+        self.configure()
+
+        # Recalculations provide samples of the adaptive interval and options updates
+        self._unsub_compute = compute.async_add_listener(self.handle_compute_update)
+
+    @callback
+    def configure(self):
+        """ Apply update interval settings """
+        settings = self.compute.settings
+        if settings.update_interval != UPDATE_INTERVAL_ADAPTIVE:
+            self.adaptive = None
+            self._async_cancel_adaptive()
+            self._set_interval(settings.update_interval)
+            return
+
+        bounds = (settings.min_update_interval, settings.max_update_interval)
+        if self.adaptive is None or (self.adaptive.min_interval, self.adaptive.max_interval) != bounds:
+            self.adaptive = AdaptiveInterval(*bounds, {
+                RATE_OUTSIDE_TEMP: ADAPTIVE_OUTSIDE_TEMP_STEP,
+                RATE_SETPOINT: ADAPTIVE_SETPOINT_STEP,
+            })
+        self._async_adapt()
+
+    def _set_interval(self, seconds):
+        self.update_interval = timedelta(seconds=round(seconds))
+        self.compute.stats.record_update_interval(
+            self.update_interval.total_seconds(), None if self.adaptive is None else self.adaptive.rates())
+
+    async def handle_compute_update(self, triggers):
+        """ Handle recalculation """
+        if TRIGGER_OPTIONS in triggers:
+            self.configure()
+        if self.adaptive is not None:
+            self._async_sample()
+            self._async_adapt()
+
+    @callback
+    def _async_sample(self):
+        now = time.monotonic()
+        self.adaptive.add(RATE_OUTSIDE_TEMP, self.compute.inputs.get(OPT_WDA_OUTSIDE_TEMP), now)
+        self.adaptive.add(RATE_SETPOINT, self.compute.results.get(MAIN_CIRCUIT), now)
+
+    @callback
+    def _async_adapt(self):
+        """ Apply adaptive interval, a shorter one takes effect before the scheduled refresh """
+        previous = self.update_interval
+        self._set_interval(self.adaptive.update())
+        if previous is None or self._last_refresh is None or self.update_interval >= previous:
+            return
+
+        _LOGGER.debug(f"Update interval of '{self.config_entry.title}' is shortened to {self.update_interval}")
+        self._async_cancel_adaptive()
+        delay = self._last_refresh + self.update_interval.total_seconds() - time.monotonic()
+        self._unsub_adaptive = async_call_later(self.hass, max(0, delay), self._handle_adaptive_refresh)
+
+    async def _handle_adaptive_refresh(self, _now):
+        self._unsub_adaptive = None
+        # Refresh reschedules the regular timer with the current interval
+        await self.async_refresh()
+
+    @callback
+    def _async_cancel_adaptive(self):
+        if self._unsub_adaptive is not None:
+            self._unsub_adaptive()
+            self._unsub_adaptive = None
+
+    @callback
+    def async_stop(self):
+        """ Unsubscribe from calculation and cancel adaptive refresh """
+        self._unsub_compute()
+        self._async_cancel_adaptive()
 
     async def _async_update_data(self):
         result = None
+        stats = self.compute.stats
+        stats.count_trigger(TRIGGER_COORDINATOR)
+        start = stats.start()
+        self._last_refresh = time.monotonic()
+        self._async_cancel_adaptive()
         try:
-            result = await update(self.hass, self.config_entry)
+            # Sample the shared calculation
+            result = await self.compute.async_get_result()
             _LOGGER.debug(f"Data received for sensor update: {result}")
 
             if result is None:
@@ -36,6 +179,13 @@ class WDAUpdateCoordinator(DataUpdateCoordinator):
                     f"Failed to update {self.__class__.__name__}: "
                     f"some sensors is not available now")
         except Exception as e:
+            stats.record_refresh(start, e)
             raise UpdateFailed(f"Exception while sensor update: {e}")
 
+        if self.adaptive is not None:
+            # Stable inputs are sampled at refreshes only, old changes expire
+            self._async_sample()
+            self._set_interval(self.adaptive.update())
+
+        stats.record_refresh(start)
         return result
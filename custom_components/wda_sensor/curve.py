@@ -0,0 +1,453 @@
+""" Heating curve math. """
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+
+from .const import (
+    CURVE_CACHE_SIZE,
+    CURVE_TABLE_RESOLUTION,
+    DEFAULT_EXP_MAX,
+    DEFAULT_EXP_MIN,
+    DEFAULT_MAX_OUTSIDE_TEMP,
+    DEFAULT_MIN_OUTSIDE_TEMP,
+    MAX_HEATING_CURVE,
+    MIN_HEATING_CURVE
+)
+
+# Below this size the NumPy call overhead is bigger than the gain,
+# see benchmarks/bench_calc_target.py
+NUMPY_MIN_BATCH_SIZE = 64
+
+# Interpolation in a table costs less than the formula in pure Python
+NUMPY_MIN_LOOKUP_SIZE = 8
+
+# Distance from a rounding tie that vectorized results may not be trusted for
+ROUNDING_TIE_TOLERANCE = 1e-9
+
+
+@lru_cache(maxsize=None)
+def get_numpy():
+    """
+    Return NumPy module, or None if it is not installed. NumPy is imported
+    on the first vectorized call, it is not needed to load the integration.
+    """
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        return None
+    return numpy
+
+
+def calc_target(
+        outside_temp: float,
+        heating_curve: int,
+        exp_min: float = DEFAULT_EXP_MIN,
+        exp_max: float = DEFAULT_EXP_MAX,
+        outside_temp_min: int = DEFAULT_MIN_OUTSIDE_TEMP,
+        outside_temp_max: int = DEFAULT_MAX_OUTSIDE_TEMP) -> float:
+    """
+    Calculation of the target temperature of the coolant based on the outside
+    temperature and the heating curve number
+    """
+
+    # Curve normolization from 1 to 200
+    # We bring it into the range from 0 to 1
+    normalized_hc = (heating_curve - 1) / 199
+
+    # The degree of the exponent depends on the curve number.
+    # Range from exp_min to exp_max
+    exponent = exp_min + normalized_hc * (exp_max - exp_min)
+
+    # The maximum temperature of the coolant — from 20 to 150°C
+    a = 20 + (150 - 20) * normalized_hc
+
+    # Temperature factor
+    denominator = outside_temp_max - outside_temp_min
+    temp_factor = (outside_temp_max - outside_temp) / denominator
+    temp_factor = 1 if temp_factor > 1 else temp_factor
+
+    # Target temperature of the coolant
+    target = a * (1 - (1 - temp_factor) ** exponent)
+    return target
+
+
+def _is_scalar(value):
+    return isinstance(value, (int, float))
+
+
+def _batch_size(*args):
+    """ Return common length of sequence arguments, scalars are broadcast """
+    size = None
+    for arg in args:
+        if _is_scalar(arg):
+            continue
+        if size is None:
+            size = len(arg)
+        elif len(arg) != size:
+            raise ValueError(f"Batch arguments have different lengths: {size} != {len(arg)}")
+    return 1 if size is None else size
+
+
+def _broadcast(value, size):
+    return [value] * size if _is_scalar(value) else value
+
+
+def calc_target_batch(
+        outside_temps,
+        heating_curves,
+        exp_min=DEFAULT_EXP_MIN,
+        exp_max=DEFAULT_EXP_MAX,
+        outside_temp_min: int = DEFAULT_MIN_OUTSIDE_TEMP,
+        outside_temp_max: int = DEFAULT_MAX_OUTSIDE_TEMP,
+        ndigits: int = None):
+    """
+    Vectorized `calc_target`. Outside temperatures, heating curve numbers and
+    exponent ranges may be scalars or sequences of the same length, scalars
+    are broadcast.
+
+    Without `ndigits` return `numpy.ndarray` if NumPy is available and the
+    batch is big enough, otherwise `array('d')`. Both support `tolist()`.
+    With `ndigits` return a list of values rounded exactly as
+    `round(calc_target(...), ndigits)` does.
+    """
+    size = _batch_size(outside_temps, heating_curves, exp_min, exp_max)
+    np = get_numpy() if size >= NUMPY_MIN_BATCH_SIZE else None
+
+    if np is None:
+        target = array("d", map(
+            calc_target,
+            _broadcast(outside_temps, size),
+            _broadcast(heating_curves, size),
+            _broadcast(exp_min, size),
+            _broadcast(exp_max, size),
+            [outside_temp_min] * size,
+            [outside_temp_max] * size))
+        if ndigits is None:
+            return target
+        return [round(value, ndigits) for value in target]
+
+    outside_temps, heating_curves, exp_min, exp_max = np.broadcast_arrays(
+        np.asarray(outside_temps, dtype=np.float64),
+        np.asarray(heating_curves, dtype=np.float64),
+        np.asarray(exp_min, dtype=np.float64),
+        np.asarray(exp_max, dtype=np.float64))
+
+    # Same operations in the same order as in `calc_target`
+    normalized_hc = (heating_curves - 1) / 199
+    exponent = exp_min + normalized_hc * (exp_max - exp_min)
+    a = 20 + (150 - 20) * normalized_hc
+
+    denominator = outside_temp_max - outside_temp_min
+    temp_factor = (outside_temp_max - outside_temps) / denominator
+    temp_factor = np.minimum(temp_factor, 1)
+
+    target = a * (1 - (1 - temp_factor) ** exponent)
+    if ndigits is None:
+        return target
+
+    # Vectorized pow may differ from libm by an ulp, which only matters
+    # for values lying on a rounding tie. Recalculate those exactly.
+    scaled = target * 10.0 ** ndigits
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < ROUNDING_TIE_TOLERANCE)
+    values = target.tolist()
+    for i in ties.tolist():
+        values[i] = calc_target(
+            float(outside_temps[i]), float(heating_curves[i]),
+            float(exp_min[i]), float(exp_max[i]),
+            outside_temp_min, outside_temp_max)
+    return [round(value, ndigits) for value in values]
+
+
+class CurveTable:
+    """
+    Heating curve precomputed over the outside temperature range with
+    `points_per_degree` resolution. Values between the points are linearly
+    interpolated, values at the points are exactly equal to `calc_target`.
+    """
+
+    __slots__ = ("outside_temp_min", "outside_temp_max", "points_per_degree", "values", "_params", "_grid")
+
+    def __init__(
+            self,
+            heating_curve,
+            exp_min,
+            exp_max,
+            points_per_degree=CURVE_TABLE_RESOLUTION,
+            outside_temp_min=DEFAULT_MIN_OUTSIDE_TEMP,
+            outside_temp_max=DEFAULT_MAX_OUTSIDE_TEMP):
+        self.outside_temp_min = outside_temp_min
+        self.outside_temp_max = outside_temp_max
+        self.points_per_degree = points_per_degree
+        self._params = (heating_curve, exp_min, exp_max, outside_temp_min, outside_temp_max)
+
+        # `min + i / ppd` gives exact integer temperatures at whole degrees
+        count = (outside_temp_max - outside_temp_min) * points_per_degree + 1
+        self.values = array("d", (
+            calc_target(outside_temp_min + i / points_per_degree, *self._params) for i in range(count)))
+        # Temperatures of the points for vectorized lookups, created on first use
+        self._grid = None
+
+    def lookup(self, outside_temp):
+        """ Return interpolated target temperature of the coolant """
+        pos = (outside_temp - self.outside_temp_min) * self.points_per_degree
+
+        # Below the range temperature factor is clamped by `calc_target`
+        if pos <= 0:
+            return self.values[0]
+
+        last = len(self.values) - 1
+        if pos >= last:
+            if pos == last:
+                return self.values[last]
+            return calc_target(outside_temp, *self._params)
+
+        i = int(pos)
+        value = self.values[i]
+        frac = pos - i
+        if frac:
+            value += (self.values[i + 1] - value) * frac
+        return value
+
+    def lookup_batch(self, outside_temps):
+        """ Vectorized `lookup` """
+        np = get_numpy() if len(outside_temps) >= NUMPY_MIN_LOOKUP_SIZE else None
+        if np is None:
+            return array("d", map(self.lookup, outside_temps))
+
+        if self._grid is None:
+            self._grid = self.outside_temp_min + np.arange(len(self.values)) / self.points_per_degree
+        outside_temps = np.asarray(outside_temps, dtype=np.float64)
+        target = np.interp(outside_temps, self._grid, self.values)
+
+        # Above the range the curve is extrapolated by the formula
+        above = outside_temps > self.outside_temp_max
+        if above.any():
+            target[above] = calc_target_batch(outside_temps[above], *self._params)
+        return target
+
+
+class CurveTableCache:
+    """
+    Process-wide LRU cache of `CurveTable` keyed on curve parameters.
+    Config entries with identical curve parameters share the same table.
+    Tables serve batches of graphs, forecasts and backtests, a single value
+    is cheaper to calculate by the formula than to interpolate, and
+    setpoints of config entries are always calculated exactly.
+    """
+
+    def __init__(self, max_size=CURVE_CACHE_SIZE, points_per_degree=CURVE_TABLE_RESOLUTION, exact=False):
+        self.max_size = max_size
+        self.points_per_degree = points_per_degree
+        self.exact = exact
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tables = OrderedDict()
+
+    def configure(self, max_size=None, points_per_degree=None, exact=None):
+        """ Change cache settings, tables are rebuilt if resolution is changed """
+        if exact is not None:
+            self.exact = exact
+        if points_per_degree is not None and points_per_degree != self.points_per_degree:
+            self.points_per_degree = points_per_degree
+            self._tables.clear()
+        if max_size is not None:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        """ Drop all tables and reset counters """
+        self._tables.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """ Return cache counters """
+        return {
+            "size": len(self._tables),
+            "max_size": self.max_size,
+            "points_per_degree": self.points_per_degree,
+            "exact": self.exact,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self):
+        while len(self._tables) > self.max_size:
+            self._tables.popitem(last=False)
+            self.evictions += 1
+
+    def get_table(
+            self,
+            heating_curve,
+            exp_min=DEFAULT_EXP_MIN,
+            exp_max=DEFAULT_EXP_MAX,
+            outside_temp_min=DEFAULT_MIN_OUTSIDE_TEMP,
+            outside_temp_max=DEFAULT_MAX_OUTSIDE_TEMP):
+        """ Return table for curve parameters, build it on cache miss """
+        key = (heating_curve, exp_min, exp_max, outside_temp_min, outside_temp_max)
+        table = self._tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(key)
+            return table
+
+        self.misses += 1
+        table = CurveTable(
+            heating_curve, exp_min, exp_max,
+            self.points_per_degree, outside_temp_min, outside_temp_max)
+        self._tables[key] = table
+        self._evict()
+        return table
+
+    def calc_target_batch(
+            self,
+            outside_temps,
+            heating_curves,
+            exp_min=DEFAULT_EXP_MIN,
+            exp_max=DEFAULT_EXP_MAX,
+            outside_temp_min=DEFAULT_MIN_OUTSIDE_TEMP,
+            outside_temp_max=DEFAULT_MAX_OUTSIDE_TEMP,
+            ndigits=None):
+        """ Cached `calc_target_batch` """
+        if self.exact:
+            return calc_target_batch(
+                outside_temps, heating_curves, exp_min, exp_max,
+                outside_temp_min, outside_temp_max, ndigits)
+
+        # One curve for all outside temperatures
+        if _is_scalar(heating_curves) and _is_scalar(exp_min) and _is_scalar(exp_max):
+            table = self.get_table(heating_curves, exp_min, exp_max, outside_temp_min, outside_temp_max)
+            if _is_scalar(outside_temps):
+                outside_temps = (outside_temps,)
+            target = table.lookup_batch(outside_temps)
+        else:
+            size = _batch_size(outside_temps, heating_curves, exp_min, exp_max)
+            target = array("d", (
+                self.get_table(hc, e_min, e_max, outside_temp_min, outside_temp_max).lookup(temp)
+                for temp, hc, e_min, e_max in zip(
+                    _broadcast(outside_temps, size),
+                    _broadcast(heating_curves, size),
+                    _broadcast(exp_min, size),
+                    _broadcast(exp_max, size))))
+
+        if ndigits is None:
+            return target
+        return [round(value, ndigits) for value in target.tolist()]
+
+
+# Shared by all config entries
+CURVE_CACHE = CurveTableCache()
+
+
+class HeatingCurveSolver:
+    """
+    Inverse of `calc_target`: heating curve number which gives the closest
+    target temperature of the coolant at an outside temperature. Targets of
+    all curve numbers are precomputed once per outside temperature and
+    searched by bisection, they grow with the curve number unless
+    `exp_max` is less than `exp_min`.
+    """
+
+    def __init__(
+            self,
+            exp_min=DEFAULT_EXP_MIN,
+            exp_max=DEFAULT_EXP_MAX,
+            outside_temp_min=DEFAULT_MIN_OUTSIDE_TEMP,
+            outside_temp_max=DEFAULT_MAX_OUTSIDE_TEMP,
+            max_columns=CURVE_CACHE_SIZE):
+        self.exp_min = exp_min
+        self.exp_max = exp_max
+        self.outside_temp_min = outside_temp_min
+        self.outside_temp_max = outside_temp_max
+        self.max_columns = max_columns
+        self.heating_curves = list(range(MIN_HEATING_CURVE, MAX_HEATING_CURVE + 1))
+        self._columns = OrderedDict()
+
+    def column(self, outside_temp):
+        """ Return targets of all curve numbers and whether they are sorted """
+        column = self._columns.get(outside_temp)
+        if column is not None:
+            self._columns.move_to_end(outside_temp)
+            return column
+
+        values = calc_target_batch(
+            outside_temp, self.heating_curves, self.exp_min, self.exp_max,
+            self.outside_temp_min, self.outside_temp_max).tolist()
+        column = self._columns[outside_temp] = (values, all(a <= b for a, b in zip(values, values[1:])))
+        while len(self._columns) > self.max_columns:
+            self._columns.popitem(last=False)
+        return column
+
+    def solve(self, outside_temp, flow_temp):
+        """ Return heating curve number """
+        values, monotonic = self.column(outside_temp)
+        if not monotonic:
+            i = min(range(len(values)), key=lambda i: abs(values[i] - flow_temp))
+            return self.heating_curves[i]
+
+        i = bisect_left(values, flow_temp)
+        if i == len(values) or (i and flow_temp - values[i - 1] <= values[i] - flow_temp):
+            i -= 1
+        return self.heating_curves[i]
+
+    def solve_batch(self, outside_temps, flow_temps):
+        """ Vectorized `solve`, one bisection per outside temperature for all its flow temperatures """
+        size = _batch_size(outside_temps, flow_temps)
+        outside_temps = _broadcast(outside_temps, size)
+        flow_temps = _broadcast(flow_temps, size)
+        np = get_numpy() if size >= NUMPY_MIN_BATCH_SIZE else None
+        if np is None:
+            return list(map(self.solve, outside_temps, flow_temps))
+
+        outside_temps = np.asarray(outside_temps, dtype=np.float64)
+        flow_temps = np.asarray(flow_temps, dtype=np.float64)
+        result = np.empty(size, dtype=np.int64)
+        last = len(self.heating_curves) - 1
+        for outside_temp in np.unique(outside_temps).tolist():
+            index = np.flatnonzero(outside_temps == outside_temp)
+            values, monotonic = self.column(outside_temp)
+            values = np.asarray(values)
+            flows = flow_temps[index]
+            if monotonic:
+                i = np.minimum(np.searchsorted(values, flows, side="left"), last)
+                lower = np.maximum(i - 1, 0)
+                closer = (i > 0) & (flows - values[lower] <= values[i] - flows)
+                i = np.where(closer, lower, i)
+            else:
+                i = np.abs(values[None, :] - flows[:, None]).argmin(axis=1)
+            result[index] = i + MIN_HEATING_CURVE
+        return result.tolist()
+
+    def best_fit(self, outside_temps, flow_temps):
+        """ Return one heating curve number with the least squared error for all pairs """
+        errors = [0.0] * len(self.heating_curves)
+        for outside_temp, flow_temp in zip(outside_temps, flow_temps):
+            values = self.column(outside_temp)[0]
+            errors = [error + (value - flow_temp) ** 2 for error, value in zip(errors, values)]
+        return self.heating_curves[min(range(len(errors)), key=errors.__getitem__)]
+
+
+@lru_cache(maxsize=CURVE_CACHE_SIZE)
+def get_curve_constants(exp_min=DEFAULT_EXP_MIN, exp_max=DEFAULT_EXP_MAX):
+    """
+    Normalized curve, maximum temperature and exponent of every heating curve
+    number, shared by all callers with the same exponent range
+    """
+    # Same operations as in `calc_target`
+    curves = range(0, MAX_HEATING_CURVE + 1)
+    normalized_hc = tuple((hc - 1) / 199 for hc in curves)
+    exponent = tuple(exp_min + n * (exp_max - exp_min) for n in normalized_hc)
+    a = tuple(20 + (150 - 20) * n for n in normalized_hc)
+    return normalized_hc, a, exponent
+
+
+@lru_cache(maxsize=CURVE_CACHE_SIZE)
+def get_curve_solver(
+        exp_min=DEFAULT_EXP_MIN,
+        exp_max=DEFAULT_EXP_MAX,
+        outside_temp_min=DEFAULT_MIN_OUTSIDE_TEMP,
+        outside_temp_max=DEFAULT_MAX_OUTSIDE_TEMP):
+    """ Return solver shared by all callers with the same curve parameters """
+    return HeatingCurveSolver(exp_min, exp_max, outside_temp_min, outside_temp_max)
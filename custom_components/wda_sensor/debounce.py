@@ -0,0 +1,150 @@
+import logging
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """
+    Collapse a burst of requests into a single execution of `action`.
+    Every request postpones the execution by `window` seconds, but never
+    later than `max_latency` seconds after the first request of the burst.
+    """
+
+    def __init__(self, hass, action, name=None, window=0, max_latency=0):
+        self._hass = hass
+        self._name = name
+        self._action = action
+        self._unsub = None
+        self._first_request = None
+
+        self.window = window
+        self.max_latency = max_latency
+        self.requested = 0
+        self.coalesced = 0
+        self.executed = 0
+
+    def configure(self, window, max_latency):
+        self.window = window
+        self.max_latency = max(window, max_latency)
+
+    @property
+    def pending(self):
+        return self._unsub is not None
+
+    async def async_request(self):
+        """ Request execution of action """
+        self.requested += 1
+
+        # Coalescing is disabled
+        if self.window <= 0:
+            await self._async_execute()
+            return
+
+        now = time.monotonic()
+        if self._unsub is not None:
+            self._unsub()
+            self.coalesced += 1
+        else:
+            self._first_request = now
+
+        delay = min(self.window, self._first_request + self.max_latency - now)
+        self._unsub = async_call_later(self._hass, max(0, delay), self._async_fire)
+
+    @callback
+    def async_cancel(self):
+        """ Cancel pending execution """
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._first_request = None
+
+    async def _async_fire(self, _now):
+        self._unsub = None
+        self._first_request = None
+        await self._async_execute()
+
+    async def _async_execute(self):
+        self.executed += 1
+        _LOGGER.debug(
+            f"Execution {self.executed} of {self.requested} requests "
+            f"({self.coalesced} coalesced) for '{self._name}'")
+        await self._action()
+
+
+class OutputFilter:
+    """
+    Deadband and minimum hold time of a published value. A new value is
+    published only if it differs from the published one by at least
+    `deadband` and the published one was held for at least `min_hold_time`
+    seconds. Becoming available or unavailable is always published.
+    """
+
+    REASON_UNCHANGED = "unchanged"
+    REASON_DEADBAND = "deadband"
+    REASON_HOLD = "hold"
+
+    def __init__(self, deadband=0, min_hold_time=0):
+        self.deadband = deadband
+        self.min_hold_time = min_hold_time
+        self.value = None
+        self.published = False
+        self.last_change = None
+
+        self.writes = 0
+        self.suppressed = dict.fromkeys((self.REASON_UNCHANGED, self.REASON_DEADBAND, self.REASON_HOLD), 0)
+
+    def configure(self, deadband, min_hold_time):
+        self.deadband = deadband
+        self.min_hold_time = min_hold_time
+
+    @property
+    def suppressed_writes(self):
+        return sum(self.suppressed.values())
+
+    def hold_remaining(self, now=None):
+        """ Return seconds left until a new value may be published """
+        if self.last_change is None or self.min_hold_time <= 0:
+            return 0
+        now = time.monotonic() if now is None else now
+        return max(0, self.last_change + self.min_hold_time - now)
+
+    def check(self, value, now=None):
+        """ Return reason to suppress `value`, or None if it has to be published """
+        if not self.published:
+            return None
+        if value == self.value:
+            return self.REASON_UNCHANGED
+        if value is None or self.value is None:
+            return None
+        if abs(value - self.value) < self.deadband:
+            return self.REASON_DEADBAND
+        if self.hold_remaining(now) > 0:
+            return self.REASON_HOLD
+        return None
+
+    def accept(self, value, now=None, force=False):
+        """ Return True and remember `value` if it has to be published """
+        now = time.monotonic() if now is None else now
+        reason = None if force else self.check(value, now)
+        if reason is not None:
+            self.suppressed[reason] += 1
+            return False
+
+        if not self.published or value != self.value:
+            self.last_change = now
+        self.value = value
+        self.published = True
+        self.writes += 1
+        return True
+
+    def stats(self):
+        """ Return write counters """
+        return {
+            "writes": self.writes,
+            "suppressed_writes": self.suppressed_writes,
+            **{f"suppressed_{reason}": count for reason, count in self.suppressed.items()},
+        }
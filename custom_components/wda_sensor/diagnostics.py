@@ -0,0 +1,73 @@
+""" Diagnostics support. """
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .curve import CURVE_CACHE
+from .helpers import get_source_dispatcher
+from .trace import trace_as_dict
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, config_entry: ConfigEntry) -> dict:
+    """ Return diagnostics of a config entry. """
+    diagnostics = {
+        "entry": {
+            "title": config_entry.title,
+            "version": config_entry.version,
+            "data": dict(config_entry.data),
+            "options": dict(config_entry.options),
+        },
+        "curve_cache": CURVE_CACHE.stats(),
+    }
+
+    entry_data = hass.data.get(DOMAIN, {}).get(config_entry.entry_id)
+    if not entry_data:
+        return diagnostics
+
+    compute = entry_data["compute"]
+    coordinator = entry_data["coordinator"]
+    coalescer = compute.coalescer
+    settings = compute.settings
+
+    # Curve constants are the same for all entries with the same exponents
+    diagnostics["settings"] = settings.as_dict(exclude=("normalized_hc", "a", "exponent"))
+
+    subscribers = get_source_dispatcher(hass).subscriber_counts()
+    diagnostics["compute"] = {
+        "computations": compute.computations,
+        "last_update": compute.last_update,
+        "last_inputs": compute.inputs,
+        "results": compute.results,
+        "fusion": compute.fusions.as_dict(),
+        "coalescer": {
+            "window": coalescer.window,
+            "max_latency": coalescer.max_latency,
+            "requested": coalescer.requested,
+            "coalesced": coalescer.coalesced,
+            "executed": coalescer.executed,
+            "pending": coalescer.pending,
+        },
+        "outputs": {circuit_id: output.stats() for circuit_id, output in compute.outputs.items()},
+        "forecast": None if compute.forecast is None else {
+            "fetched_at": compute.forecast.fetched_at,
+            "points": len(compute.forecast),
+            "updates": compute.forecast_updates,
+            "trajectories": {
+                circuit_id: None if trajectory is None else trajectory.as_list()
+                for circuit_id, trajectory in compute.trajectories.items()
+            },
+        },
+        "source_subscribers": {
+            entity_id: subscribers.get(entity_id, 0)
+            for entity_id in sorted(compute.source_entities)
+        },
+    }
+    diagnostics["coordinator"] = {
+        "update_interval": coordinator.update_interval.total_seconds(),
+        "adaptive_interval": None if coordinator.adaptive is None else coordinator.adaptive.as_dict(),
+        "last_update_success": coordinator.last_update_success,
+        "data": coordinator.data,
+    }
+    diagnostics["instrumentation"] = compute.stats.as_dict()
+    diagnostics["trace"] = trace_as_dict(compute.trace)
+    return diagnostics
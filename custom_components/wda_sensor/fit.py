@@ -0,0 +1,214 @@
+"""
+Heating curve fitting: search heating curve number and exponent range
+that reproduce the recorded flow temperature best. Home Assistant is
+not required.
+"""
+import math
+
+from .const import *  # noqa F403
+from .curve import calc_target_batch, get_numpy
+
+# Fitting runs in executor only, NumPy is loaded together with the module
+np = get_numpy()
+
+# Max. number of elements of intermediate arrays, bounds memory of a batch
+MAX_BATCH_ELEMENTS = 1_000_000
+
+# Steps of heating curve number and exponents: coarse grid over the whole
+# space first, then refinements around the best point
+COARSE_STEPS = (10, 0.5)
+REFINEMENT_STEPS = ((5, 0.2), (2, 0.1), (1, 0.1))
+EXPONENT_RANGE = (0.5, 8.0)
+
+
+def resample(times, values, grid):
+    """
+    Sample a step-wise series (value holds until next change) at `grid`
+    times. Return NaN before the first value.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(grid), np.nan)
+    if not len(times):
+        return result
+
+    order = np.argsort(times, kind="stable")
+    times, values = times[order], values[order]
+    index = np.searchsorted(times, grid, side="right") - 1
+    known = index >= 0
+    result[known] = values[index[known]]
+    return result
+
+
+def fuse(source, series):
+    """
+    Sample-wise fusion of resampled series of the sources of an input with
+    the rules of `fusion.SourceFusion`. NaN marks unavailable values.
+    """
+    if len(series) == 1:
+        return series[0]
+
+    values = np.vstack(series)
+    available = ~np.isnan(values)
+    count = available.sum(axis=0)
+    result = np.full(values.shape[1], np.nan)
+
+    if source.mode in (FUSION_MEAN, FUSION_WEIGHTED_MEAN):
+        weights = np.asarray(source.weights, dtype=np.float64)[:, None]
+        weight_sum = np.where(available, weights, 0.0).sum(axis=0)
+        total = np.where(available, values * weights, 0.0).sum(axis=0)
+        known = weight_sum > 0
+        result[known] = total[known] / weight_sum[known]
+        return result
+
+    # NaN is sorted last, lower and upper medians of available values
+    columns = np.nonzero(count)[0]
+    ordered = np.sort(values[:, columns], axis=0)
+    lower = ordered[(count[columns] - 1) // 2, np.arange(len(columns))]
+    upper = ordered[count[columns] // 2, np.arange(len(columns))]
+    values, available = values[:, columns], available[:, columns]
+    threshold = np.inf if source.outlier_threshold is None else source.outlier_threshold
+
+    if source.mode == FUSION_MEDIAN:
+        result[columns] = (lower + upper) / 2
+    elif source.mode == FUSION_MIN:
+        result[columns] = np.where(available & (values >= lower - threshold), values, np.inf).min(axis=0)
+    else:
+        result[columns] = np.where(available & (values <= upper + threshold), values, -np.inf).max(axis=0)
+    return result
+
+
+def calc_corrections(params, size, inside_temp=None, target_room_temp=None, wind_speed=None, outside_humidity=None):
+    """
+    Sum of room, wind and humidity corrections for arrays of `size` inputs,
+    NaN marks unavailable values which make no correction. `params` has
+    correction factors, e.g. `WDASettings` or `backtest.CurveParams`.
+    """
+    total = np.zeros(size)
+
+    def add(correction):
+        np.add(total, np.where(np.isnan(correction), 0.0, correction), out=total)
+
+    if params.room_temp_correction and inside_temp is not None and target_room_temp is not None:
+        add((np.asarray(target_room_temp) - np.asarray(inside_temp)) * params.room_temp_correction)
+    if params.wind_correction and wind_speed is not None:
+        add(np.asarray(wind_speed) * params.wind_correction)
+    if params.humidity_correction and outside_humidity is not None:
+        add(np.maximum(0, (np.asarray(outside_humidity) - DEFAULT_HUMIDITY_THRESHOLD) * params.humidity_correction))
+    return total
+
+
+def _predict(outside_temp, corrections, heating_curves, exp_min, exp_max, limits):
+    """ Predicted flow temperatures, one row per parameter combination """
+    count, size = len(heating_curves), len(outside_temp)
+    base = calc_target_batch(
+        np.tile(outside_temp, count),
+        np.repeat(heating_curves, size),
+        np.repeat(exp_min, size),
+        np.repeat(exp_max, size))
+    base = np.asarray(base, dtype=np.float64).reshape(count, size)
+    return np.clip(base + corrections, *limits)
+
+
+def evaluate(outside_temp, corrections, actual, heating_curves, exp_min, exp_max, limits):
+    """ Sum of squared errors of every parameter combination, in batches of bounded size """
+    heating_curves = np.asarray(heating_curves, dtype=np.float64)
+    exp_min = np.asarray(exp_min, dtype=np.float64)
+    exp_max = np.asarray(exp_max, dtype=np.float64)
+
+    batch = max(1, MAX_BATCH_ELEMENTS // max(1, len(outside_temp)))
+    sse = np.empty(len(heating_curves))
+    for start in range(0, len(heating_curves), batch):
+        end = start + batch
+        error = _predict(
+            outside_temp, corrections,
+            heating_curves[start:end], exp_min[start:end], exp_max[start:end], limits) - actual
+        sse[start:end] = np.einsum("ij,ij->i", error, error)
+    return sse
+
+
+def _grid(heating_curves, exp_mins, exp_maxs):
+    """ All combinations with exp_min <= exp_max """
+    hc, e_min, e_max = np.meshgrid(heating_curves, exp_mins, exp_maxs, indexing="ij")
+    valid = e_min <= e_max
+    return hc[valid], e_min[valid], e_max[valid]
+
+
+def _around(value, step, low, high, digits=None):
+    values = np.arange(-2, 3) * step + value
+    if digits is not None:
+        values = np.round(values, digits)
+    return np.unique(np.clip(values, low, high))
+
+
+def metrics(outside_temp, corrections, actual, heating_curve, exp_min, exp_max, limits):
+    """ Errors of the setpoints rounded as the sensor does """
+    predicted = np.round(_predict(outside_temp, corrections, [heating_curve], [exp_min], [exp_max], limits)[0])
+    error = predicted - actual
+    return {
+        "rmse": round(math.sqrt(float(np.mean(error * error))), 3),
+        "mae": round(float(np.mean(np.abs(error))), 3),
+        "bias": round(float(np.mean(error)), 3),
+    }
+
+
+def fit_curve(outside_temp, corrections, actual, min_coolant_temp, max_coolant_temp, current=None):
+    """
+    Find heating curve number and exponent range with the least squared
+    error between calculated and `actual` flow temperature. Samples with
+    unavailable outside or actual temperature are ignored. `current` is an
+    optional (heating_curve, exp_min, exp_max) to compare with.
+    """
+    if np is None:
+        raise RuntimeError("Curve fitting requires NumPy")
+
+    outside_temp = np.asarray(outside_temp, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    corrections = np.asarray(corrections, dtype=np.float64)
+    valid = ~np.isnan(outside_temp) & ~np.isnan(actual)
+    outside_temp, actual, corrections = outside_temp[valid], actual[valid], corrections[valid]
+    if not len(actual):
+        raise ValueError("No samples with both outside and actual flow temperature")
+
+    limits = (min_coolant_temp, max_coolant_temp)
+    low, high = EXPONENT_RANGE
+
+    # Coarse grid over the whole space
+    hc_step, exp_step = COARSE_STEPS
+    heating_curves = np.unique(np.append(
+        np.arange(MIN_HEATING_CURVE, MAX_HEATING_CURVE + 1, hc_step), MAX_HEATING_CURVE))
+    exponents = np.round(np.arange(low, high + exp_step / 2, exp_step), 1)
+    candidates = _grid(heating_curves, exponents, exponents)
+
+    evaluated = 0
+    for refinement in (None, *REFINEMENT_STEPS):
+        # Refinement around the best point with smaller steps
+        if refinement is not None:
+            hc_step, exp_step = refinement
+            candidates = _grid(
+                _around(best_hc, hc_step, MIN_HEATING_CURVE, MAX_HEATING_CURVE),
+                _around(best_min, exp_step, low, high, 1),
+                _around(best_max, exp_step, low, high, 1))
+
+        hc, e_min, e_max = candidates
+        sse = evaluate(outside_temp, corrections, actual, hc, e_min, e_max, limits)
+        evaluated += len(sse)
+        best = int(np.argmin(sse))
+        best_hc, best_min, best_max = float(hc[best]), float(e_min[best]), float(e_max[best])
+
+    result = {
+        "heating_curve": int(best_hc),
+        "exp_min": round(best_min, 1),
+        "exp_max": round(best_max, 1),
+        "samples": int(len(actual)),
+        "evaluated": evaluated,
+        **metrics(outside_temp, corrections, actual, int(best_hc), best_min, best_max, limits),
+    }
+    if current is not None:
+        result["current"] = {
+            "heating_curve": current[0],
+            "exp_min": current[1],
+            "exp_max": current[2],
+            **metrics(outside_temp, corrections, actual, *current, limits),
+        }
+    return result
@@ -0,0 +1,155 @@
+""" Setpoint trajectory from the hourly weather forecast. """
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+from .const import *  # noqa F403
+from .curve import CURVE_CACHE
+
+# Keys of forecast items returned by `weather.get_forecasts`
+FORECAST_TIME = "datetime"
+FORECAST_TEMPERATURE = "temperature"
+FORECAST_WIND_SPEED = "wind_speed"
+FORECAST_HUMIDITY = "humidity"
+
+# Period of the last point when it cannot be derived from the forecast
+FORECAST_STEP = timedelta(hours=1)
+
+
+def _parse_time(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    # Times without offset are UTC
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class Forecast:
+    """
+    Hourly forecast of outside temperature, wind speed (m/s) and humidity
+    sorted by time. Base curve values are computed once per curve and kept
+    until the forecast is replaced by the next one.
+    """
+
+    def __init__(self, items, fetched_at=None, convert_temperature=None, convert_wind_speed=None):
+        points = []
+        for item in items:
+            temperature = item.get(FORECAST_TEMPERATURE)
+            if temperature is None or item.get(FORECAST_TIME) is None:
+                continue
+            wind_speed = item.get(FORECAST_WIND_SPEED)
+            if convert_temperature is not None:
+                temperature = convert_temperature(temperature)
+            if wind_speed is not None and convert_wind_speed is not None:
+                wind_speed = convert_wind_speed(wind_speed)
+            points.append((_parse_time(item[FORECAST_TIME]), temperature, wind_speed, item.get(FORECAST_HUMIDITY)))
+        points.sort(key=lambda point: point[0])
+
+        self.fetched_at = fetched_at
+        self.times = tuple(point[0] for point in points)
+        self.temperatures = tuple(point[1] for point in points)
+        self.wind_speeds = tuple(point[2] for point in points)
+        self.humidities = tuple(point[3] for point in points)
+        self._base = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def base(self, heating_curve, exp_min, exp_max):
+        """ Target temperatures of the coolant of all forecast points, one batch per curve """
+        key = (heating_curve, exp_min, exp_max)
+        values = self._base.get(key)
+        if values is None:
+            values = self._base[key] = CURVE_CACHE.calc_target_batch(
+                self.temperatures, heating_curve, exp_min, exp_max).tolist()
+        return values
+
+
+class Trajectory:
+    """ Setpoints at forecast times, a setpoint holds until the next point """
+
+    __slots__ = ("times", "setpoints")
+
+    def __init__(self, times, setpoints):
+        self.times = times
+        self.setpoints = setpoints
+
+    def index(self, when):
+        """ Index of the point in effect at `when`, None beyond the forecast """
+        if not self.times:
+            return None
+        step = self.times[-1] - self.times[-2] if len(self.times) > 1 else FORECAST_STEP
+        if when >= self.times[-1] + step:
+            return None
+        # Before the first point the first setpoint is used
+        return max(0, bisect_right(self.times, when) - 1)
+
+    def at(self, when):
+        """ Setpoint in effect at `when` """
+        index = self.index(when)
+        return None if index is None else self.setpoints[index]
+
+    def next_change(self, when):
+        """ Time of the first point after `when`, None if there is no one """
+        index = bisect_right(self.times, when)
+        return self.times[index] if index < len(self.times) else None
+
+    def as_list(self):
+        return [
+            {"datetime": time.isoformat(), "setpoint": setpoint}
+            for time, setpoint in zip(self.times, self.setpoints)
+        ]
+
+
+def calc_trajectories(settings, inputs, forecast):
+    """
+    Setpoint trajectories of all circuits over the forecast. Wind speed and
+    humidity of the forecast are used when available, current values
+    otherwise; room correction uses the current room temperature.
+    """
+    circuit_inputs = inputs[OPT_WDA_CIRCUITS]
+    trajectories = dict.fromkeys(circuit_inputs)
+    if forecast is None or not len(forecast):
+        return trajectories
+
+    # Wind and humidity corrections of every point (shared)
+    wind_corrections = [None] * len(forecast)
+    if settings.wind_correction:
+        current = inputs[OPT_WDA_WIND_SPEED]
+        wind_corrections = [
+            None if wind_speed is None else wind_speed * settings.wind_correction
+            for wind_speed in (current if value is None else value for value in forecast.wind_speeds)
+        ]
+    humidity_corrections = [None] * len(forecast)
+    if settings.humidity_correction:
+        current = inputs[OPT_WDA_OUTSIDE_HUMIDITY]
+        humidity_corrections = [
+            None if humidity is None
+            else max(0, (humidity - DEFAULT_HUMIDITY_THRESHOLD) * settings.humidity_correction)
+            for humidity in (current if value is None else value for value in forecast.humidities)
+        ]
+
+    for circuit in settings.circuits:
+        heating_curve = circuit_inputs[circuit.id][OPT_WDA_HEATING_CURVE]
+        if heating_curve is None:
+            continue
+
+        room_correction = None
+        target_room_temp = circuit_inputs[circuit.id][OPT_WDA_TARGET_ROOM_TEMP]
+        inside_temp = circuit_inputs[circuit.id][OPT_WDA_INSIDE_TEMP]
+        if settings.room_temp_correction and inside_temp is not None and target_room_temp is not None:
+            room_correction = (target_room_temp - inside_temp) * settings.room_temp_correction
+
+        # Same order of operations as `calc_setpoints`
+        setpoints = []
+        base_values = forecast.base(heating_curve, settings.exp_min, settings.exp_max)
+        for value, wind_correction, humidity_correction in zip(base_values, wind_corrections, humidity_corrections):
+            if room_correction is not None:
+                value = value + room_correction
+            if wind_correction is not None:
+                value = value + wind_correction
+            if humidity_correction is not None:
+                value = value + humidity_correction
+            value = min(max(value, circuit.min_coolant_temp), circuit.max_coolant_temp)
+            setpoints.append(int(round(value)))
+        trajectories[circuit.id] = Trajectory(forecast.times, tuple(setpoints))
+
+    return trajectories
@@ -0,0 +1,149 @@
+""" Fusion of several source sensors into a single input value. """
+from bisect import bisect_left, bisect_right, insort
+
+from .const import *  # noqa F403
+
+# Running sums are recalculated from values after this number of updates
+# to drop accumulated floating point error
+RESUM_INTERVAL = 1000
+
+
+class SourceFusion:
+    """
+    Input value combined from source sensors and updated incrementally:
+    means keep running sums (O(1) per update), median, min and max keep a
+    sorted list of values (O(log n) search per update). Unavailable sources
+    drop out, the value is None only when all sources are unavailable.
+
+    Min and max ignore outliers: values farther than the outlier threshold
+    from the lower (min) or upper (max) median.
+    """
+
+    __slots__ = ("source", "value", "_weights", "_values", "_sorted", "_sum", "_weight_sum", "_updates")
+
+    def __init__(self, source, get_value=None):
+        self.source = source
+        self.value = None
+        self._weights = dict(zip(source.entities, source.weights))
+        self._values = {}
+        self._sorted = [] if source.mode in (FUSION_MEDIAN, FUSION_MIN, FUSION_MAX) else None
+        self._sum = 0.0
+        self._weight_sum = 0.0
+        self._updates = 0
+        if get_value is not None:
+            for entity_id in source.entities:
+                self._set(entity_id, get_value(entity_id))
+            self.value = self._calc()
+
+    @property
+    def available(self):
+        """ Number of available sources """
+        return len(self._values)
+
+    def update(self, entity_id, value):
+        """ Set value of a source, None if it is unavailable. Return True if the result is changed """
+        if entity_id not in self._weights or not self._set(entity_id, value):
+            return False
+        previous, self.value = self.value, self._calc()
+        return self.value != previous
+
+    def _set(self, entity_id, value):
+        previous = self._values.get(entity_id)
+        if value == previous:
+            return False
+
+        weight = self._weights[entity_id]
+        if previous is not None:
+            del self._values[entity_id]
+            self._sum -= previous * weight
+            self._weight_sum -= weight
+            if self._sorted is not None:
+                del self._sorted[bisect_left(self._sorted, previous)]
+        if value is not None:
+            self._values[entity_id] = value
+            self._sum += value * weight
+            self._weight_sum += weight
+            if self._sorted is not None:
+                insort(self._sorted, value)
+
+        self._updates += 1
+        if self._updates >= RESUM_INTERVAL:
+            self._updates = 0
+            self._sum = sum(value * self._weights[entity_id] for entity_id, value in self._values.items())
+            self._weight_sum = sum(self._weights[entity_id] for entity_id in self._values)
+        return True
+
+    def _calc(self):
+        count = len(self._values)
+        if not count:
+            return None
+
+        mode = self.source.mode
+        if mode == FUSION_WEIGHTED_MEAN:
+            return self._sum / self._weight_sum if self._weight_sum > 0 else None
+        if self._sorted is None:
+            # Weights of plain mean are 1
+            return self._sum / count
+
+        values = self._sorted
+        threshold = self.source.outlier_threshold
+        if mode == FUSION_MEDIAN:
+            middle = count // 2
+            return values[middle] if count % 2 else (values[middle - 1] + values[middle]) / 2
+        if mode == FUSION_MIN:
+            if threshold is None:
+                return values[0]
+            return values[bisect_left(values, values[(count - 1) // 2] - threshold)]
+        if threshold is None:
+            return values[-1]
+        return values[bisect_right(values, values[count // 2] + threshold) - 1]
+
+    def as_dict(self):
+        return {
+            "mode": self.source.mode,
+            "sources": len(self.source.entities),
+            "available": self.available,
+            "value": self.value,
+        }
+
+
+class InputFusions:
+    """
+    Fusions of all source inputs of a config entry: shared weather inputs
+    by option key and room temperature by circuit. A source entity may feed
+    several inputs.
+    """
+
+    def __init__(self, settings, get_value):
+        self.shared = {
+            OPT_WDA_OUTSIDE_TEMP: SourceFusion(settings.outside_temp_source, get_value),
+            OPT_WDA_WIND_SPEED: SourceFusion(settings.wind_speed_source, get_value),
+            OPT_WDA_OUTSIDE_HUMIDITY: SourceFusion(settings.outside_humidity_source, get_value),
+        }
+        self.circuits = {
+            circuit.id: SourceFusion(circuit.inside_temp_source, get_value)
+            for circuit in settings.circuits
+        }
+
+        self._by_entity = {}
+        for fusion in (*self.shared.values(), *self.circuits.values()):
+            for entity_id in fusion.source.entities:
+                self._by_entity.setdefault(entity_id, []).append(fusion)
+
+    @property
+    def entities(self):
+        """ Source entities of all inputs """
+        return set(self._by_entity)
+
+    def update(self, entity_id, value):
+        """ Set value of a source entity. Return True if any input is changed """
+        changed = False
+        for fusion in self._by_entity.get(entity_id, ()):
+            changed = fusion.update(entity_id, value) or changed
+        return changed
+
+    def as_dict(self):
+        return {
+            **{key: fusion.as_dict() for key, fusion in self.shared.items()},
+            OPT_WDA_CIRCUITS: {circuit_id: fusion.as_dict() for circuit_id, fusion in self.circuits.items()},
+        }
@@ -1,9 +1,19 @@
 import logging
+from functools import partial
 
-from homeassistant.const import Platform, STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.const import Platform, STATE_UNAVAILABLE, STATE_UNKNOWN, UnitOfSpeed, UnitOfTemperature
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import entity_registry
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.util import dt as dt_util
+from homeassistant.util.unit_conversion import SpeedConverter, TemperatureConverter
 
 from .const import *  # noqa F403
+from .curve import CURVE_CACHE, calc_target, calc_target_batch  # noqa F401
+from .forecast import Forecast
+from .fusion import InputFusions
+from .settings import WDASettings
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,44 +27,124 @@ def get_config_value(config_entry, key, default=None):
     return default
 
 
-def calc_target(
-        outside_temp: float,
-        heating_curve: int,
-        exp_min: float = DEFAULT_EXP_MIN,
-        exp_max: float = DEFAULT_EXP_MAX,
-        outside_temp_min: int = DEFAULT_MIN_OUTSIDE_TEMP,
-        outside_temp_max: int = DEFAULT_MAX_OUTSIDE_TEMP) -> float:
+class EntityIdCache:
     """
-    Calculation of the target temperature of the coolant based on the outside
-    temperature and the heating curve number
+    Cache of unique ID to entity ID resolution, shared by all config entries.
+    Entries are dropped when entity is renamed or removed from the registry.
+    Listeners of a unique ID are notified when its entity is registered,
+    renamed or removed, so no registry polling is needed.
     """
 
-    # Curve normolization from 1 to 200
-    # We bring it into the range from 0 to 1
-    normalized_hc = (heating_curve - 1) / 199
+    def __init__(self, hass):
+        self._hass = hass
+        self._entity_ids = {}
+        self._keys = {}
+        self._listeners = {}
+        self._unsub = hass.bus.async_listen(
+            entity_registry.EVENT_ENTITY_REGISTRY_UPDATED,
+            self._handle_registry_update)
+
+    def get(self, platform, unique_id):
+        """ Return entity ID by unique ID """
+        key = (platform, unique_id)
+        entity_id = self._entity_ids.get(key)
+        if entity_id is not None:
+            return entity_id
+
+        # Misses are not cached, entity may be registered later
+        reg = entity_registry.async_get(self._hass)
+        entity_id = reg.async_get_entity_id(platform, DOMAIN, unique_id)
+        if entity_id:
+            self._entity_ids[key] = entity_id
+            self._keys.setdefault(entity_id, set()).add(key)
+        return entity_id
+
+    def invalidate(self, entity_id):
+        """ Drop all entries resolved to `entity_id`, return their keys """
+        keys = self._keys.pop(entity_id, set())
+        for key in keys:
+            self._entity_ids.pop(key, None)
+        return keys
+
+    @callback
+    def async_add_listener(self, platform, unique_id, listener):
+        """
+        Call `listener(entity_id)` when entity ID of `unique_id` changes,
+        entity ID is None after removal. Return function to remove listener.
+        """
+        key = (platform, unique_id)
+        self._listeners.setdefault(key, []).append(listener)
+
+        @callback
+        def remove_listener():
+            listeners = self._listeners.get(key, [])
+            if listener in listeners:
+                listeners.remove(listener)
+            if not listeners:
+                self._listeners.pop(key, None)
+
+        return remove_listener
+
+    def _notify(self, keys, entity_id):
+        for key in keys:
+            for listener in list(self._listeners.get(key, ())):
+                listener(entity_id)
+
+    def _registered_key(self, entity_id):
+        """ Key of a registered entity of this integration with listeners """
+        entry = entity_registry.async_get(self._hass).async_get(entity_id)
+        if entry is None or entry.platform != DOMAIN:
+            return None
+        key = (entry.domain, entry.unique_id)
+        return key if key in self._listeners else None
+
+    @callback
+    def _handle_registry_update(self, event):
+        action = event.data.get("action")
+        entity_id = event.data["entity_id"]
+        if action == "remove":
+            self._notify(self.invalidate(entity_id), None)
+            return
+
+        if action == "update":
+            if "old_entity_id" in event.data:
+                self.invalidate(event.data["old_entity_id"])
+            elif "unique_id" in event.data.get("changes", {}):
+                self._notify(self.invalidate(entity_id), None)
+            else:
+                return
+        elif action != "create":
+            return
+
+        key = self._registered_key(entity_id)
+        if key is not None:
+            self._notify((key,), self.get(*key))
+
+
+def get_entity_id_cache(hass):
+    """ Return entity ID cache, create it on first use """
+    cache = hass.data.get(DATA_ENTITY_ID_CACHE)
+    if cache is None:
+        cache = hass.data[DATA_ENTITY_ID_CACHE] = EntityIdCache(hass)
+    return cache
 
-    # The degree of the exponent depends on the curve number.
-    # Range from exp_min to exp_max
-    exponent = exp_min + normalized_hc * (exp_max - exp_min)
 
-    # The maximum temperature of the coolant — from 20 to 150°C
-    a = 20 + (150 - 20) * normalized_hc
+async def get_entity_id(hass, platform, unique_id):
+    """ Return entity ID by unique ID """
+    return get_entity_id_cache(hass).get(platform, unique_id)
 
-    # Temperature factor
-    denominator = outside_temp_max - outside_temp_min
-    temp_factor = (outside_temp_max - outside_temp) / denominator
-    temp_factor = 1 if temp_factor > 1 else temp_factor
 
-    # Target temperature of the coolant
-    target = a * (1 - (1 - temp_factor) ** exponent)
-    return target
+def parse_state(entity_id, state, default=None, coerce=float):
+    """ Return coerced value of `state` object """
+    if state is None or state.state in [STATE_UNKNOWN, STATE_UNAVAILABLE, None]:
+        return default
 
+    try:
+        return coerce(state.state)
+    except ValueError:
+        _LOGGER.warning(f"Cannot convert state of {entity_id} to {coerce}: {state.state}")
 
-async def get_entity_id(hass, platform, unique_id):
-    """ Return entity ID by unique ID """
-    reg = entity_registry.async_get(hass)
-    entity_id = reg.async_get_entity_id(platform, DOMAIN, unique_id)
-    return entity_id
+    return default
 
 
 async def get_sensor_value(hass, entity_id, default=None, coerce=float):
@@ -65,16 +155,94 @@ async def get_sensor_value(hass, entity_id, default=None, coerce=float):
     if not callable(coerce):
         return default
 
-    state = hass.states.get(entity_id)
-    if state is None or state.state in [STATE_UNKNOWN, STATE_UNAVAILABLE, None]:
-        return default
+    return parse_state(entity_id, hass.states.get(entity_id), default, coerce)
 
-    try:
-        return coerce(state.state)
-    except ValueError:
-        _LOGGER.warning(f"Cannot convert state of {entity_id} to {coerce}: {state.state}")
 
-    return default
+class SourceDispatcher:
+    """
+    State changes of source sensors, shared by all config entries. There is
+    one subscription per source entity, the state is parsed once and the value
+    is handed to every subscriber in a single pass.
+    """
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._subscribers = {}
+        self._unsubs = {}
+        self._values = {}
+        self.events = 0
+        self.deliveries = 0
+
+    @callback
+    def async_subscribe(self, entity_id, listener):
+        """
+        Subscribe `listener(entity_id, value)` to value changes of source
+        entity. Return function to unsubscribe.
+        """
+        subscribers = self._subscribers.get(entity_id)
+        if subscribers is None:
+            subscribers = self._subscribers[entity_id] = []
+            self._values[entity_id] = parse_state(entity_id, self._hass.states.get(entity_id))
+            self._unsubs[entity_id] = async_track_state_change_event(
+                self._hass, entity_id, self._handle_state_change)
+            _LOGGER.debug(f"Subscribe to source '{entity_id}'")
+        subscribers.append(listener)
+
+        @callback
+        def unsubscribe():
+            self._async_unsubscribe(entity_id, listener)
+
+        return unsubscribe
+
+    @callback
+    def _async_unsubscribe(self, entity_id, listener):
+        subscribers = self._subscribers.get(entity_id)
+        if subscribers is None or listener not in subscribers:
+            return
+
+        subscribers.remove(listener)
+        if not subscribers:
+            # Last subscriber is gone
+            del self._subscribers[entity_id]
+            self._values.pop(entity_id, None)
+            self._unsubs.pop(entity_id)()
+            _LOGGER.debug(f"Unsubscribe from source '{entity_id}'")
+
+    def get_value(self, entity_id, default=None):
+        """ Return parsed value of source entity """
+        if not entity_id:
+            return default
+        if entity_id in self._values:
+            value = self._values[entity_id]
+        else:
+            # Not subscribed, read current state
+            value = parse_state(entity_id, self._hass.states.get(entity_id))
+        return default if value is None else value
+
+    def subscriber_counts(self):
+        """ Return number of subscribers per source entity """
+        return {entity_id: len(subscribers) for entity_id, subscribers in self._subscribers.items()}
+
+    async def _handle_state_change(self, event):
+        entity_id = event.data["entity_id"]
+        value = parse_state(entity_id, event.data.get("new_state"))
+        self.events += 1
+        self._values[entity_id] = value
+
+        for listener in list(self._subscribers.get(entity_id, ())):
+            self.deliveries += 1
+            try:
+                await listener(entity_id, value)
+            except Exception as e:
+                _LOGGER.error(f"Failed to handle update of '{entity_id}': {e}")
+
+
+def get_source_dispatcher(hass):
+    """ Return source dispatcher, create it on first use """
+    dispatcher = hass.data.get(DATA_SOURCE_DISPATCHER)
+    if dispatcher is None:
+        dispatcher = hass.data[DATA_SOURCE_DISPATCHER] = SourceDispatcher(hass)
+    return dispatcher
 
 
 async def get_sensor_value_by_uniq(hass, platform, unique_id, default=None, coerce=float):
@@ -85,84 +253,197 @@ async def get_sensor_value_by_uniq(hass, platform, unique_id, default=None, coer
     return default
 
 
-async def update(hass, config):
+@callback
+def async_track_unique_id(hass, unique_id, action, platform=Platform.NUMBER):
     """
-    Return calculated sensor value for update.
-    Return None if `wda_outside_temp` sensor is not available
+    Subscribe `action` to state changes of entity with `unique_id`. Tracking
+    starts at once if entity is registered, otherwise as soon as it is
+    registered, and follows entity ID changes. Return unsubscribe function.
     """
+    cache = get_entity_id_cache(hass)
+    unsub_state = None
+
+    @callback
+    def track(entity_id):
+        nonlocal unsub_state
+        if unsub_state is not None:
+            unsub_state()
+            unsub_state = None
+        if entity_id:
+            unsub_state = async_track_state_change_event(hass, entity_id, action)
+            _LOGGER.debug(f"Subscribe to '{entity_id}': SUCCESS")
+
+    unsub_registry = cache.async_add_listener(platform, unique_id, track)
+    entity_id = cache.get(platform, unique_id)
+    if entity_id:
+        track(entity_id)
+    else:
+        _LOGGER.debug(f"Entity '{unique_id}' is not registered yet, subscribe on registration")
+
+    @callback
+    def unsubscribe():
+        unsub_registry()
+        track(None)
+
+    return unsubscribe
 
-    # Get data from settings
-    min_coolant_temp = int(
-        get_config_value(config, OPT_WDA_MIN_COOLANT_TEMP, DEFAULT_MIN_COOLANT_TEMP))
-    max_coolant_temp = int(
-        get_config_value(config, OPT_WDA_MAX_COOLANT_TEMP, DEFAULT_MAX_COOLANT_TEMP))
-
-    # Get advanced settings
-    adv_config = get_config_value(config, SECTION_ADVANCED_SETTINGS, {})
-
-    # Correction settings
-    room_temp_correction = float(adv_config.get(OPT_WDA_ROOM_TEMP_CORRECTION, 0))
-    wind_correction = float(adv_config.get(OPT_WDA_WIND_CORRECTION, 0))
-    humidity_correction = float(adv_config.get(OPT_WDA_HUMIDITY_CORRECTION, 0))
-
-    # Exponent range
-    exp_min = float(adv_config.get(OPT_WDA_EXP_MIN, DEFAULT_EXP_MIN))
-    exp_max = float(adv_config.get(OPT_WDA_EXP_MAX, DEFAULT_EXP_MAX))
-
-    # Get data from number inputs
-    target_room_temp = await get_sensor_value_by_uniq(
-        hass=hass,
-        platform=Platform.NUMBER,
-        unique_id=f"{OPT_WDA_TARGET_ROOM_TEMP}_{config.entry_id}"
-    )
-    heating_curve = await get_sensor_value_by_uniq(
-        hass=hass,
-        platform=Platform.NUMBER,
-        unique_id=f"{OPT_WDA_HEATING_CURVE}_{config.entry_id}",
-        coerce=int
-    )
-
-    if heating_curve is None:
-        return
-
-    # Get data from sensors
-    outside_temp = await get_sensor_value(hass, get_config_value(config, OPT_WDA_OUTSIDE_TEMP))
+
+async def get_forecast(hass, entity_id):
+    """
+    Return hourly `Forecast` of weather entity in °C and m/s, None if
+    forecast is not available
+    """
+    state = hass.states.get(entity_id)
+    if state is None or state.state in [STATE_UNKNOWN, STATE_UNAVAILABLE]:
+        return None
+
+    try:
+        response = await hass.services.async_call(
+            Platform.WEATHER, "get_forecasts", {"entity_id": entity_id, "type": "hourly"},
+            blocking=True, return_response=True)
+    except (HomeAssistantError, ValueError) as e:
+        _LOGGER.warning(f"Cannot get hourly forecast of {entity_id}: {e}")
+        return None
+
+    # Forecast values are in units of the weather entity
+    convert_temperature = convert_wind_speed = None
+    temperature_unit = state.attributes.get("temperature_unit")
+    if temperature_unit and temperature_unit != UnitOfTemperature.CELSIUS:
+        convert_temperature = partial(
+            TemperatureConverter.convert, from_unit=temperature_unit, to_unit=UnitOfTemperature.CELSIUS)
+    wind_speed_unit = state.attributes.get("wind_speed_unit")
+    if wind_speed_unit and wind_speed_unit != UnitOfSpeed.METERS_PER_SECOND:
+        convert_wind_speed = partial(
+            SpeedConverter.convert, from_unit=wind_speed_unit, to_unit=UnitOfSpeed.METERS_PER_SECOND)
+
+    items = (response or {}).get(entity_id, {}).get("forecast") or []
+    return Forecast(items, dt_util.utcnow(), convert_temperature, convert_wind_speed)
+
+
+async def get_inputs(hass, settings, fusions=None):
+    """
+    Return snapshot of all calculation inputs. Source sensors are combined
+    by `fusions` which are kept up to date by the caller, or read at once
+    """
+    if fusions is None:
+        fusions = InputFusions(settings, get_source_dispatcher(hass).get_value)
+    circuits = {}
+    for circuit in settings.circuits:
+        circuits[circuit.id] = {
+            # Data from number inputs
+            OPT_WDA_TARGET_ROOM_TEMP: await get_sensor_value_by_uniq(
+                hass=hass,
+                platform=Platform.NUMBER,
+                unique_id=circuit.target_room_temp_unique_id
+            ),
+            OPT_WDA_HEATING_CURVE: await get_sensor_value_by_uniq(
+                hass=hass,
+                platform=Platform.NUMBER,
+                unique_id=circuit.heating_curve_unique_id,
+                coerce=int
+            ),
+
+            # Room sensors
+            OPT_WDA_INSIDE_TEMP: fusions.circuits[circuit.id].value,
+        }
+
+    return {
+        # Data from sensors shared by all circuits
+        OPT_WDA_OUTSIDE_TEMP: fusions.shared[OPT_WDA_OUTSIDE_TEMP].value,
+        OPT_WDA_WIND_SPEED: fusions.shared[OPT_WDA_WIND_SPEED].value,
+        OPT_WDA_OUTSIDE_HUMIDITY: fusions.shared[OPT_WDA_OUTSIDE_HUMIDITY].value,
+        OPT_WDA_CIRCUITS: circuits,
+    }
+
+
+def calc_setpoints(settings, inputs, breakdown=None):
+    """
+    Return target temperatures of the coolant for all circuits of inputs
+    snapshot, calculated in one batch. Result of a circuit is None if its
+    heating curve or outside temperature is not available. Terms of every
+    calculated result (base, room, wind and humidity corrections and clamp)
+    are added to `breakdown` dict by circuit ID, if it is given
+    """
+    circuit_inputs = inputs[OPT_WDA_CIRCUITS]
+    results = dict.fromkeys(circuit_inputs)
+
+    outside_temp = inputs[OPT_WDA_OUTSIDE_TEMP]
     if outside_temp is None:
-        return
-
-    outside_temp = float(outside_temp)
-    inside_temp = await get_sensor_value(
-        hass, get_config_value(config, OPT_WDA_INSIDE_TEMP))
-    wind_speed = await get_sensor_value(
-        hass, get_config_value(config, OPT_WDA_WIND_SPEED))
-    outside_humidity = await get_sensor_value(
-        hass, get_config_value(config, OPT_WDA_OUTSIDE_HUMIDITY))
-
-    # Base value
-    target_heat_temp = calc_target(outside_temp, heating_curve, exp_min, exp_max)
-
-    # Room Temperature Correction
-    if room_temp_correction and inside_temp is not None and target_room_temp is not None:
-        correction_value = (target_room_temp - float(inside_temp)) * room_temp_correction
-        target_heat_temp = target_heat_temp + correction_value
-
-    # Wind Speed Correction
-    if wind_correction and wind_speed is not None:
-        correction_value = float(wind_speed) * wind_correction
-        target_heat_temp = target_heat_temp + correction_value
-
-    # Humidity Correction
-    if humidity_correction and outside_humidity is not None:
-        correction_value = (
-            max(0, (float(outside_humidity) - DEFAULT_HUMIDITY_THRESHOLD) *
-                humidity_correction)
+        return results
+
+    circuits = [
+        circuit for circuit in settings.circuits
+        if circuit_inputs[circuit.id][OPT_WDA_HEATING_CURVE] is not None
+    ]
+    if not circuits:
+        return results
+
+    # Base values of all circuits
+    base_values = settings.calc_target_batch(
+        outside_temp,
+        [circuit_inputs[circuit.id][OPT_WDA_HEATING_CURVE] for circuit in circuits])
+
+    # Wind Speed Correction (shared)
+    wind_speed = inputs[OPT_WDA_WIND_SPEED]
+    wind_correction = None
+    if settings.wind_correction and wind_speed is not None:
+        wind_correction = wind_speed * settings.wind_correction
+
+    # Humidity Correction (shared)
+    outside_humidity = inputs[OPT_WDA_OUTSIDE_HUMIDITY]
+    humidity_correction = None
+    if settings.humidity_correction and outside_humidity is not None:
+        humidity_correction = (
+            max(0, (outside_humidity - DEFAULT_HUMIDITY_THRESHOLD) *
+                settings.humidity_correction)
         )
-        target_heat_temp = target_heat_temp + correction_value
 
-    # Going beyond the limits of values
-    if target_heat_temp < min_coolant_temp:
-        target_heat_temp = min_coolant_temp
-    if target_heat_temp > max_coolant_temp:
-        target_heat_temp = max_coolant_temp
+    for circuit, target_heat_temp in zip(circuits, base_values):
+        target_room_temp = circuit_inputs[circuit.id][OPT_WDA_TARGET_ROOM_TEMP]
+        inside_temp = circuit_inputs[circuit.id][OPT_WDA_INSIDE_TEMP]
+        base_value = target_heat_temp
+        correction_value = None
+
+        # Room Temperature Correction
+        if settings.room_temp_correction and inside_temp is not None and target_room_temp is not None:
+            correction_value = (target_room_temp - inside_temp) * settings.room_temp_correction
+            target_heat_temp = target_heat_temp + correction_value
+
+        if wind_correction is not None:
+            target_heat_temp = target_heat_temp + wind_correction
 
-    return int(round(target_heat_temp))
+        if humidity_correction is not None:
+            target_heat_temp = target_heat_temp + humidity_correction
+
+        # Going beyond the limits of values
+        unclamped = target_heat_temp
+        if target_heat_temp < circuit.min_coolant_temp:
+            target_heat_temp = circuit.min_coolant_temp
+        if target_heat_temp > circuit.max_coolant_temp:
+            target_heat_temp = circuit.max_coolant_temp
+
+        results[circuit.id] = int(round(target_heat_temp))
+        if breakdown is not None:
+            breakdown[circuit.id] = (
+                base_value, correction_value, wind_correction, humidity_correction,
+                target_heat_temp - unclamped)
+
+    return results
+
+
+def calc_setpoint(settings, inputs):
+    """
+    Return target temperature of the coolant of the main circuit.
+    Return None if heating curve or outside temperature is not available
+    """
+    return calc_setpoints(settings, inputs)[MAIN_CIRCUIT]
+
+
+async def update(hass, config, settings=None):
+    """
+    Return calculated sensor value for update.
+    Return None if `wda_outside_temp` sensor is not available
+    """
+    if settings is None:
+        settings = WDASettings.from_config_entry(config)
+    return calc_setpoint(settings, await get_inputs(hass, settings))
@@ -0,0 +1,126 @@
+""" Performance instrumentation of a config entry. """
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Upper bounds of latency histogram buckets (milliseconds)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+TIMER_UPDATE = "update"
+TIMER_GRAPH_DATA = "graph_data"
+TIMER_COORDINATOR = "coordinator_refresh"
+
+
+class LatencyHistogram:
+    """ Latency histogram with fixed buckets """
+
+    __slots__ = ("buckets", "count", "total", "max", "last")
+
+    def __init__(self):
+        # Last bucket counts values above the last bound
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = None
+
+    def record(self, milliseconds):
+        self.buckets[bisect_left(LATENCY_BUCKETS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.last = milliseconds
+        if milliseconds > self.max:
+            self.max = milliseconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def as_dict(self):
+        bounds = [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": None if self.mean is None else round(self.mean, 3),
+            "max_ms": round(self.max, 3),
+            "last_ms": None if self.last is None else round(self.last, 3),
+            "buckets_ms": dict(zip(bounds, self.buckets)),
+        }
+
+
+class EntryStats:
+    """
+    Latencies, trigger counts and coordinator refresh results of a config
+    entry. When disabled, `start` returns None and all records are no-ops,
+    so instrumented code pays only for an attribute check.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # Measured once per setup, regardless of `enabled`
+        self.setup_time = None
+        self.first_result_time = None
+        # Effective coordinator interval (seconds) and rates it is adapted to
+        self.update_interval = None
+        self.update_interval_rates = None
+        self.reset()
+
+    def reset(self):
+        """ Drop all collected data """
+        self.latency = {}
+        self.triggers = Counter()
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.last_refresh_error = None
+
+    def record_update_interval(self, seconds, rates=None):
+        """ Record effective update interval, regardless of `enabled` """
+        self.update_interval = seconds
+        self.update_interval_rates = rates
+
+    def start(self):
+        """ Return start time of a measurement, or None if disabled """
+        return time.perf_counter() if self.enabled else None
+
+    def record(self, timer, start):
+        """ Record latency of measurement started by `start` """
+        if start is None:
+            return
+        histogram = self.latency.get(timer)
+        if histogram is None:
+            histogram = self.latency[timer] = LatencyHistogram()
+        histogram.record((time.perf_counter() - start) * 1000)
+
+    def count_trigger(self, trigger):
+        if self.enabled:
+            self.triggers[trigger] += 1
+
+    def record_refresh(self, start, error=None):
+        """ Record coordinator refresh result """
+        if start is None:
+            return
+        self.record(TIMER_COORDINATOR, start)
+        self.refreshes += 1
+        if error is not None:
+            self.refresh_failures += 1
+            self.last_refresh_error = str(error)
+
+    def get_latency(self, timer):
+        return self.latency.get(timer)
+
+    def as_dict(self):
+        return {
+            "enabled": self.enabled,
+            "latency": {timer: histogram.as_dict() for timer, histogram in self.latency.items()},
+            "triggers": dict(self.triggers),
+            "setup": {
+                "setup_ms": None if self.setup_time is None else round(self.setup_time * 1000, 3),
+                "first_result_ms": None if self.first_result_time is None else round(self.first_result_time * 1000, 3),
+            },
+            "coordinator": {
+                "refreshes": self.refreshes,
+                "failures": self.refresh_failures,
+                "last_error": self.last_refresh_error,
+                "update_interval_s": self.update_interval,
+                "rates_per_hour": self.update_interval_rates,
+            },
+        }
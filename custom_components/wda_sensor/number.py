@@ -2,6 +2,7 @@ import logging
 
 from homeassistant.components.number import NumberDeviceClass, NumberEntity, NumberMode
 from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN, UnitOfTemperature
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.restore_state import RestoreEntity
@@ -13,44 +14,50 @@ _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
-    """ Set up number entities  """
-    async_add_entities([
-        WDANumber(hass, config_entry, OPT_WDA_HEATING_CURVE, {
-            "min": MIN_HEATING_CURVE,
-            "max": MAX_HEATING_CURVE,
-            "step": HEATING_CURVE_STEP,
-            "default": DEFAULT_HEATING_CURVE,
-            "category": EntityCategory.CONFIG,
-            "icon": "mdi:numeric",
-            "coerce": int
-        }),
-        WDANumber(hass, config_entry, OPT_WDA_TARGET_ROOM_TEMP, {
-            "min": MIN_TARGET_ROOT_TEMP,
-            "max": MAX_TARGET_ROOT_TEMP,
-            "step": TARGET_ROOT_TEMP_STEP,
-            "default": DEFAULT_TARGET_ROOM_TEMP,
-            "unit": UnitOfTemperature.CELSIUS,
-            "category": EntityCategory.CONFIG,
-            "device_class": NumberDeviceClass.TEMPERATURE,
-            "icon": "mdi:temperature-celsius",
-            "coerce": float
-        })
-    ])
+    """ Set up number entities for every heating circuit """
+    compute = hass.data[DOMAIN][config_entry.entry_id]["compute"]
+
+    entities = []
+    for circuit in compute.settings.circuits:
+        entities.extend([
+            WDANumber(hass, config_entry, compute, OPT_WDA_HEATING_CURVE, {
+                "min": MIN_HEATING_CURVE,
+                "max": MAX_HEATING_CURVE,
+                "step": HEATING_CURVE_STEP,
+                "default": DEFAULT_HEATING_CURVE,
+                "category": EntityCategory.CONFIG,
+                "icon": "mdi:numeric",
+                "coerce": int
+            }, circuit),
+            WDANumber(hass, config_entry, compute, OPT_WDA_TARGET_ROOM_TEMP, {
+                "min": MIN_TARGET_ROOT_TEMP,
+                "max": MAX_TARGET_ROOT_TEMP,
+                "step": TARGET_ROOT_TEMP_STEP,
+                "default": DEFAULT_TARGET_ROOM_TEMP,
+                "unit": UnitOfTemperature.CELSIUS,
+                "category": EntityCategory.CONFIG,
+                "device_class": NumberDeviceClass.TEMPERATURE,
+                "icon": "mdi:temperature-celsius",
+                "coerce": float
+            }, circuit)
+        ])
+    async_add_entities(entities)
 
 
 class WDANumber(NumberEntity, RestoreEntity):
     """ Number entity associated with a configuration parameter """
 
-    def __init__(self, hass, config_entry, name, entity_config):
+    def __init__(self, hass, config_entry, compute, name, entity_config, circuit):
         self._hass = hass
         self._config = config_entry
+        self._compute = compute
         self._name = name
         self._entity_config = entity_config
 
         self._attr_mode = NumberMode.BOX
         self._attr_has_entity_name = True
         self._attr_translation_key = name
-        self._attr_unique_id = f"{self._attr_translation_key}_{config_entry.entry_id}"
+        self._attr_unique_id = f"{self._attr_translation_key}_{config_entry.entry_id}{circuit.unique_id_suffix}"
 
         self._coerce = entity_config.get("coerce")
         self._icon = entity_config.get("icon")
@@ -64,11 +71,16 @@ class WDANumber(NumberEntity, RestoreEntity):
 
         # Device info
         self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, config_entry.entry_id)}
+            identifiers={circuit.device_identifier}
         )
 
     async def async_added_to_hass(self):
         await super().async_added_to_hass()
+
+        # Parameters of many circuits are changed at once by the set_parameters service
+        self._compute.numbers[self._attr_unique_id] = self
+        self.async_on_remove(lambda: self._compute.numbers.pop(self._attr_unique_id, None))
+
         last_state = await self.async_get_last_state()
 
         # Set default value for first time
@@ -97,6 +109,18 @@ class WDANumber(NumberEntity, RestoreEntity):
         self.async_write_ha_state()
         _LOGGER.info(f"Successfully set '{self._attr_translation_key}' to '{value}'")
 
+    @callback
+    def async_update_value(self, value):
+        """ Set value, state is written only if it is changed. Return True if it is changed """
+        if callable(self._coerce):
+            value = self._coerce(value)
+        if value == self._attr_native_value:
+            return False
+
+        self._attr_native_value = value
+        self.async_write_ha_state()
+        return True
+
     @property
     def assumed_state(self) -> bool:
         return True
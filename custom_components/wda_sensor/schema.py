@@ -0,0 +1,264 @@
+""" Config and options flow schemas, loaded only when a flow is opened. """
+from homeassistant.components.sensor import SensorDeviceClass  # noqa: F401
+from homeassistant.const import Platform, UnitOfTemperature, UnitOfTime
+from homeassistant.data_entry_flow import section
+from homeassistant.helpers.selector import (
+    BooleanSelector,
+    EntityFilterSelectorConfig,
+    EntitySelector,
+    EntitySelectorConfig,
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
+    SelectSelector,
+    SelectSelectorConfig,
+    SelectSelectorMode,
+    TextSelector,
+    TextSelectorConfig,
+    TextSelectorType
+)
+
+import voluptuous as vol
+
+from .const import *  # noqa F403
+from .settings import parse_weights
+
+
+def source_selector():
+    """ One or more sensors of an input """
+    return EntitySelector(EntitySelectorConfig(
+        EntityFilterSelectorConfig(domain=Platform.SENSOR), multiple=True))
+
+
+def fusion_schema(key):
+    """ Fusion mode and weights of the sources of an input """
+    mode_option, weights_option, _ = FUSION_INPUTS[key]
+    return {
+        vol.Optional(mode_option, default=DEFAULT_FUSION):
+            SelectSelector(SelectSelectorConfig(
+                options=FUSION_MODES,
+                translation_key="fusion_mode",
+                mode=SelectSelectorMode.DROPDOWN)),
+        vol.Optional(weights_option):
+            TextSelector(TextSelectorConfig(type=TextSelectorType.TEXT)),
+    }
+
+
+def with_source_lists(config):
+    """ Config with source entities as lists, older configs have a single entity """
+    config = dict(config)
+    for key in FUSION_INPUTS:
+        if isinstance(config.get(key), str):
+            config[key] = [config[key]]
+    return config
+
+
+def check_weights(config, keys, errors):
+    for key in keys:
+        weights_option = FUSION_INPUTS[key][1]
+        try:
+            parse_weights(config.get(weights_option))
+        except ValueError:
+            errors["base"] = "invalid_weights"
+            errors[weights_option] = "invalid_weights"
+
+
+async def create_schema(hass, config_entry=None, user_input=None, config_flow=True):
+    """ Common schema for ConfigFlow and OptionsFlow."""
+    return vol.Schema({
+        vol.Required(OPT_NAME): TextSelector(TextSelectorConfig(type=TextSelectorType.TEXT)),
+
+        # Settings
+        vol.Required(OPT_WDA_MIN_COOLANT_TEMP, default=DEFAULT_MIN_COOLANT_TEMP):
+            NumberSelector(NumberSelectorConfig(
+                min=10, max=50, mode=NumberSelectorMode.BOX,
+                unit_of_measurement=UnitOfTemperature.CELSIUS)),
+
+        vol.Required(OPT_WDA_MAX_COOLANT_TEMP, default=DEFAULT_MAX_COOLANT_TEMP):
+            NumberSelector(NumberSelectorConfig(
+                min=20, max=150, mode=NumberSelectorMode.BOX,
+                unit_of_measurement=UnitOfTemperature.CELSIUS)),
+
+        # Update interval (periodic sensor only)
+        vol.Required(OPT_WDA_UPDATE_INTERVAL, default=str(DEFAULT_UPDATE_INTERVAL)):
+            SelectSelector(SelectSelectorConfig(
+                options=UPDATE_INTERVAL_CHOICES,
+                mode=SelectSelectorMode.DROPDOWN)),
+
+        # Sensors, several sensors of an input are combined by fusion settings
+        vol.Required(OPT_WDA_OUTSIDE_TEMP): source_selector(),
+        vol.Optional(OPT_WDA_INSIDE_TEMP): source_selector(),
+        vol.Optional(OPT_WDA_WIND_SPEED): source_selector(),
+        vol.Optional(OPT_WDA_OUTSIDE_HUMIDITY): source_selector(),
+        vol.Optional(OPT_WDA_WEATHER):
+            EntitySelector(EntitySelectorConfig(EntityFilterSelectorConfig(domain=Platform.WEATHER))),
+
+        vol.Required(SECTION_ADVANCED_SETTINGS): section(vol.Schema({
+            # Corrections
+            vol.Optional(OPT_WDA_ROOM_TEMP_CORRECTION, default=DEFAULT_ROOM_TEMP_CORRECTION):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=10.0, mode=NumberSelectorMode.BOX)),
+            vol.Optional(OPT_WDA_WIND_CORRECTION, default=DEFAULT_WIND_CORRECTION):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=2.0, step=0.1, mode=NumberSelectorMode.BOX)),
+            vol.Optional(OPT_WDA_HUMIDITY_CORRECTION, default=DEFAULT_HUMIDITY_CORRECTION):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=1.0, step=0.01, mode=NumberSelectorMode.BOX)),
+
+            # Exponent
+            vol.Optional(OPT_WDA_EXP_MIN, default=DEFAULT_EXP_MIN):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=20.0, step=0.1, mode=NumberSelectorMode.BOX)),
+            vol.Optional(OPT_WDA_EXP_MAX, default=DEFAULT_EXP_MAX):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=20.0, step=0.1, mode=NumberSelectorMode.BOX)),
+
+            # Coalescing of sensor updates
+            vol.Optional(OPT_WDA_COALESCE_WINDOW, default=DEFAULT_COALESCE_WINDOW):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=10.0, step=0.1, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTime.SECONDS)),
+            vol.Optional(OPT_WDA_COALESCE_MAX_LATENCY, default=DEFAULT_COALESCE_MAX_LATENCY):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=60.0, step=0.1, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTime.SECONDS)),
+
+            # Output deadband and hysteresis
+            vol.Optional(OPT_WDA_OUTPUT_DEADBAND, default=DEFAULT_OUTPUT_DEADBAND):
+                NumberSelector(NumberSelectorConfig(
+                    min=0.0, max=10.0, step=0.5, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTemperature.CELSIUS)),
+            vol.Optional(OPT_WDA_OUTPUT_MIN_HOLD_TIME, default=DEFAULT_OUTPUT_MIN_HOLD_TIME):
+                NumberSelector(NumberSelectorConfig(
+                    min=0, max=86400, step=1, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTime.SECONDS)),
+
+            # Bounds of the adaptive update interval
+            vol.Optional(OPT_WDA_MIN_UPDATE_INTERVAL, default=DEFAULT_MIN_UPDATE_INTERVAL):
+                NumberSelector(NumberSelectorConfig(
+                    min=60, max=86400, step=60, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTime.SECONDS)),
+            vol.Optional(OPT_WDA_MAX_UPDATE_INTERVAL, default=DEFAULT_MAX_UPDATE_INTERVAL):
+                NumberSelector(NumberSelectorConfig(
+                    min=60, max=86400, step=60, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTime.SECONDS)),
+
+            # Forecast sensor
+            vol.Optional(OPT_WDA_FORECAST_LEAD_TIME, default=DEFAULT_FORECAST_LEAD_TIME):
+                NumberSelector(NumberSelectorConfig(
+                    min=0, max=24, step=0.5, mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTime.HOURS)),
+
+            # Performance instrumentation
+            vol.Optional(OPT_WDA_DIAGNOSTICS, default=DEFAULT_DIAGNOSTICS): BooleanSelector(),
+        }), {"collapsed": True}),
+
+        vol.Required(SECTION_FUSION_SETTINGS): section(vol.Schema({
+            **fusion_schema(OPT_WDA_OUTSIDE_TEMP),
+            **fusion_schema(OPT_WDA_INSIDE_TEMP),
+            **fusion_schema(OPT_WDA_WIND_SPEED),
+            **fusion_schema(OPT_WDA_OUTSIDE_HUMIDITY),
+        }), {"collapsed": True}),
+
+        vol.Required(SECTION_CURVE_GRAPH_SETTINGS): section(vol.Schema({
+            # Curve graph data settings
+            vol.Optional(OPT_GRAPH_MIN_OUTSIDE_TEMP, default=GRAPH_MIN_OUTSIDE_TEMP):
+                NumberSelector(NumberSelectorConfig(
+                    min=DEFAULT_MIN_OUTSIDE_TEMP,
+                    max=DEFAULT_MAX_OUTSIDE_TEMP,
+                    mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTemperature.CELSIUS)),
+            vol.Optional(OPT_GRAPH_MAX_OUTSIDE_TEMP, default=GRAPH_MAX_OUTSIDE_TEMP):
+                NumberSelector(NumberSelectorConfig(
+                    min=DEFAULT_MIN_OUTSIDE_TEMP,
+                    max=DEFAULT_MAX_OUTSIDE_TEMP,
+                    mode=NumberSelectorMode.BOX,
+                    unit_of_measurement=UnitOfTemperature.CELSIUS)),
+            vol.Optional(OPT_GRAPH_ATTRIBUTES, default=DEFAULT_GRAPH_ATTRIBUTES): BooleanSelector(),
+        }), {"collapsed": True}),
+    })
+
+
+def create_circuit_schema(config):
+    """ Schema of additional heating circuit """
+    # Limits, by default the same as for the main circuit
+    min_coolant_temp = config.get(OPT_WDA_MIN_COOLANT_TEMP, DEFAULT_MIN_COOLANT_TEMP)
+    max_coolant_temp = config.get(OPT_WDA_MAX_COOLANT_TEMP, DEFAULT_MAX_COOLANT_TEMP)
+
+    return vol.Schema({
+        vol.Required(OPT_NAME): TextSelector(TextSelectorConfig(type=TextSelectorType.TEXT)),
+
+        # Limits
+        vol.Required(OPT_WDA_MIN_COOLANT_TEMP, default=min_coolant_temp):
+            NumberSelector(NumberSelectorConfig(
+                min=10, max=50, mode=NumberSelectorMode.BOX,
+                unit_of_measurement=UnitOfTemperature.CELSIUS)),
+        vol.Required(OPT_WDA_MAX_COOLANT_TEMP, default=max_coolant_temp):
+            NumberSelector(NumberSelectorConfig(
+                min=20, max=150, mode=NumberSelectorMode.BOX,
+                unit_of_measurement=UnitOfTemperature.CELSIUS)),
+
+        # Room sensors of the circuit
+        vol.Optional(OPT_WDA_INSIDE_TEMP): source_selector(),
+        **fusion_schema(OPT_WDA_INSIDE_TEMP),
+    })
+
+
+def check_circuit_input(user_input):
+    errors = {}
+    if user_input[OPT_WDA_MIN_COOLANT_TEMP] > user_input[OPT_WDA_MAX_COOLANT_TEMP]:
+        errors["base"] = "min_coolant_temp_must_be_less"
+        errors[OPT_WDA_MIN_COOLANT_TEMP] = "min_coolant_temp_must_be_less"
+    check_weights(user_input, [OPT_WDA_INSIDE_TEMP], errors)
+    return errors
+
+
+def check_user_input(user_input):
+    errors = {}
+    if user_input is not None:
+        min_coolant_temp = user_input[OPT_WDA_MIN_COOLANT_TEMP]
+        max_coolant_temp = user_input[OPT_WDA_MAX_COOLANT_TEMP]
+        exp_min = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_EXP_MIN]
+        exp_max = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_EXP_MAX]
+        curve_min_temp = user_input[SECTION_CURVE_GRAPH_SETTINGS][OPT_GRAPH_MIN_OUTSIDE_TEMP]
+        curve_max_temp = user_input[SECTION_CURVE_GRAPH_SETTINGS][OPT_GRAPH_MAX_OUTSIDE_TEMP]
+        coalesce_window = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_COALESCE_WINDOW]
+        coalesce_max_latency = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_COALESCE_MAX_LATENCY]
+        min_update_interval = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_MIN_UPDATE_INTERVAL]
+        max_update_interval = user_input[SECTION_ADVANCED_SETTINGS][OPT_WDA_MAX_UPDATE_INTERVAL]
+
+        if exp_min > exp_max:
+            errors["base"] = "exp_min_must_be_less"
+            errors[OPT_WDA_EXP_MIN] = "exp_min_must_be_less"
+
+        if min_coolant_temp > max_coolant_temp:
+            errors["base"] = "min_coolant_temp_must_be_less"
+            errors[OPT_WDA_MIN_COOLANT_TEMP] = "min_coolant_temp_must_be_less"
+
+        if curve_min_temp > curve_max_temp:
+            errors["base"] = "graph_min_temp_must_be_less"
+            errors[OPT_GRAPH_MIN_OUTSIDE_TEMP] = "graph_min_temp_must_be_less"
+
+        if coalesce_window > coalesce_max_latency:
+            errors["base"] = "coalesce_window_must_be_less"
+            errors[OPT_WDA_COALESCE_WINDOW] = "coalesce_window_must_be_less"
+
+        if min_update_interval > max_update_interval:
+            errors["base"] = "min_update_interval_must_be_less"
+            errors[OPT_WDA_MIN_UPDATE_INTERVAL] = "min_update_interval_must_be_less"
+
+        check_weights(user_input.get(SECTION_FUSION_SETTINGS, {}), FUSION_INPUTS, errors)
+    return errors
+
+
+def create_remove_circuit_schema(circuits):
+    """ Schema of heating circuits removal """
+    return vol.Schema({
+        vol.Required(OPT_CIRCUITS_TO_REMOVE): SelectSelector(SelectSelectorConfig(
+            options=[
+                {"value": circuit[OPT_CIRCUIT_ID], "label": circuit[OPT_NAME]}
+                for circuit in circuits
+            ],
+            multiple=True,
+            mode=SelectSelectorMode.LIST)),
+    })
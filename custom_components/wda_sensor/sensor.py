@@ -2,29 +2,52 @@ import logging
 from datetime import timedelta
 
 from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
-from homeassistant.const import EVENT_HOMEASSISTANT_STARTED, Platform, UnitOfTemperature
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED, Platform, UnitOfTemperature, UnitOfTime
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.event import async_call_later, async_track_state_change_event
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.event import async_call_later, async_track_point_in_utc_time
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 
-from .helpers import calc_target, get_config_value, get_entity_id, get_sensor_value_by_uniq, update
+from .helpers import CURVE_CACHE, async_track_unique_id, get_sensor_value_by_uniq
 from .const import *  # noqa F403
+from .debounce import OutputFilter
+from .instrumentation import TIMER_GRAPH_DATA, TIMER_UPDATE
 
 _LOGGER = logging.getLogger(__name__)
-_SUBSCRIBE_ATTEMPTS_DELAY = 5
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """ Set up WDASensor from a config entry. """
     data = hass.data[DOMAIN][config_entry.entry_id]
     coordinator = data["coordinator"]
+    compute = data["compute"]
+
+    # Target flow temperature sensor for every heating circuit
+    entities = [
+        WDASensor(hass, config_entry, compute, circuit)
+        for circuit in compute.settings.circuits
+    ]
+
+    # Forecast flow temperature sensor for every heating circuit
+    if compute.settings.weather_entity:
+        entities.extend([
+            WDAForecastSensor(hass, config_entry, compute, circuit)
+            for circuit in compute.settings.circuits
+        ])
+
+    # Diagnostic sensors, disabled by default
+    entities.extend([
+        WDADiagnosticSensor(hass, config_entry, compute, name, entity_config)
+        for name, entity_config in DIAGNOSTIC_SENSORS.items()
+    ])
 
     async_add_entities([
-            WDASensor(hass, config_entry),
-            WDAPeriodicSensor(hass, config_entry, coordinator),
-            WDACurveSensor(hass, config_entry)
-        ], update_before_add=True)
+            *entities,
+            WDAPeriodicSensor(hass, config_entry, coordinator, compute),
+            WDACurveSensor(hass, config_entry, compute)
+        ])
 
 
 class WDASensorMixin:
@@ -32,62 +55,37 @@ class WDASensorMixin:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    async def subscribe_with_retry(
-            self,
-            unique_id,
-            platform=Platform.NUMBER,
-            attempt=1,
-            max_attempts=10):
-        """ Subscribe to sensor updates with retry """
+    @callback
+    def track_unique_id(self, unique_id, platform=Platform.NUMBER):
+        """ Subscribe to sensor updates as soon as sensor is registered """
         if not (getattr(self, "handle_sensor_update", False) and callable(self.handle_sensor_update)):
             return
 
-        entity_id = await get_entity_id(
-            hass=self._hass,
-            platform=platform,
-            unique_id=unique_id
-        )
-
-        if entity_id:
-            self.async_on_remove(
-                async_track_state_change_event(
-                    self._hass, entity_id, self.handle_sensor_update))
-            _LOGGER.debug(f"Subscribe to '{entity_id}' for '{self._attr_translation_key}': SUCCESS")
-        else:
-            if attempt < max_attempts:
-                _LOGGER.debug(
-                    f"Subscription attempt '{attempt}' to '{unique_id}' "
-                    f"failed, try again in 5 seconds...")
-
-                async def _delayed_subscribe(_):
-                    await self.subscribe_with_retry(
-                        unique_id,
-                        platform,
-                        attempt + 1,
-                        max_attempts)
-
-                async_call_later(
-                    hass=self._hass,
-                    delay=_SUBSCRIBE_ATTEMPTS_DELAY,
-                    action=_delayed_subscribe
-                )
-            else:
-                _LOGGER.error(
-                    f"Unable to find entity '{unique_id}' "
-                    f"to subscribe to after '{max_attempts}' attempts")
+        self.async_on_remove(
+            async_track_unique_id(self._hass, unique_id, self.handle_sensor_update, platform))
 
 
 class WDASensor(WDASensorMixin, SensorEntity):
     """ Weather Dependent Automation Sensor for boiler automation. """
 
-    def __init__(self, hass, config_entry):
+    # Updated by recalculations of shared calculation
+    _attr_should_poll = False
+
+    def __init__(self, hass, config_entry, compute, circuit):
         """ Initialize the sensor. """
         self._hass = hass
         self._config = config_entry
+        self._compute = compute
+        self._circuit_id = circuit.id
+        self._unsub_hold = None
+
+        # Deadband and hysteresis of the published value
+        self._output = OutputFilter()
+        self.configure()
 
         self._attr_has_entity_name = True
         self._attr_translation_key = "wda_sensor"
-        self._attr_unique_id = f"wda_sensor_{config_entry.entry_id}"
+        self._attr_unique_id = circuit.sensor_unique_id
         self._attr_available = False
         self._attr_native_value = None
         self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
@@ -97,86 +95,200 @@ class WDASensor(WDASensorMixin, SensorEntity):
 
         # Device info
         self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, config_entry.entry_id)}
+            identifiers={circuit.device_identifier}
         )
 
+    def configure(self):
+        """ Apply settings """
+        settings = self._compute.settings
+        self._output.configure(
+            deadband=settings.output_deadband,
+            min_hold_time=settings.output_min_hold_time)
+
+    @property
+    def output(self):
+        return self._output
+
     async def async_added_to_hass(self):
-        """ Subscribe to sensors and configuration update. """
+        """ Subscribe to recalculations. """
         await super().async_added_to_hass()
 
-        # Subscribe to update configuration via OptionsFlow
+        # Inputs and configuration updates are handled by shared calculation
         self.async_on_remove(
-            async_dispatcher_connect(
-                self._hass,
-                f"{SENSOR_UPDATE_SIGNAL}_{self._config.entry_id}",
-                self.handle_options_update
-            )
-        )
+            self._compute.async_add_listener(self.handle_compute_update))
+        self.async_on_remove(self._cancel_hold)
 
-        # Subscribe to update weather sensors
-        subscribe_to_entities = [
-            get_config_value(self._config, OPT_WDA_OUTSIDE_TEMP),
-            get_config_value(self._config, OPT_WDA_INSIDE_TEMP),
-            get_config_value(self._config, OPT_WDA_WIND_SPEED),
-            get_config_value(self._config, OPT_WDA_OUTSIDE_HUMIDITY),
-        ]
-
-        for entity_id in subscribe_to_entities:
-            if entity_id:
-                self.async_on_remove(
-                    async_track_state_change_event(
-                        self._hass, entity_id, self.handle_sensor_update
-                    )
-                )
-
-        # Subscribe to number inputs
-        await self.subscribe_with_retry(
-            unique_id=f"{OPT_WDA_TARGET_ROOM_TEMP}_{self._config.entry_id}"
-        )
-        await self.subscribe_with_retry(
-            unique_id=f"{OPT_WDA_HEATING_CURVE}_{self._config.entry_id}"
-        )
+        # Write counters are reported by diagnostics
+        self._compute.outputs[self._circuit_id] = self._output
+        self.async_on_remove(lambda: self._compute.outputs.pop(self._circuit_id, None))
 
-    async def handle_sensor_update(self, event):
-        """ Handle sensors update. """
-        _LOGGER.info(
-            f"Sensor state change detected: {event.data.get('entity_id')}, "
+    async def handle_compute_update(self, triggers):
+        """ Handle recalculation. """
+        _LOGGER.debug(
+            f"Recalculation by {', '.join(sorted(triggers))} detected, "
             f"updating sensor: {self.name}")
-        await self.async_update()
-        self.async_write_ha_state()
 
-    async def handle_options_update(self):
-        """ Handle options update. """
-        _LOGGER.info(f"Configuration updated, updating sensor: {self.name}")
-        await self.async_update()
-        self.async_write_ha_state()
+        # Configuration change is always published
+        force = TRIGGER_OPTIONS in triggers
+        if force:
+            self.configure()
+        self.publish_result(self._compute.results.get(self._circuit_id), force)
+
+    @callback
+    def publish_result(self, result, force=False):
+        """ Write state if result passes the output filter """
+        self._cancel_hold()
+        if self._output.accept(result, force=force):
+            _LOGGER.info(f"Updating sensor {self.name}: {result}")
+            self.set_result(result)
+            self.async_write_ha_state()
+            return
+
+        _LOGGER.debug(f"Write of {self.name} suppressed: {result}")
+
+        # Changed value is published when hold time is over
+        if self._output.check(result) == OutputFilter.REASON_HOLD:
+            self._unsub_hold = async_call_later(
+                self._hass, self._output.hold_remaining(), self._handle_hold_expired)
+
+    @callback
+    def _handle_hold_expired(self, _now):
+        self._unsub_hold = None
+        self.publish_result(self._compute.results.get(self._circuit_id))
+
+    @callback
+    def _cancel_hold(self):
+        if self._unsub_hold is not None:
+            self._unsub_hold()
+            self._unsub_hold = None
+
+    def set_result(self, result):
+        """ Set sensor value from calculation result """
+        if result is None:
+            self._attr_available = False
+            self._attr_native_value = None
+            _LOGGER.debug(
+                f"Failed to update {self.name}: "
+                f"some sensors is not available now")
+            return
+
+        self._attr_available = True
+        self._attr_native_value = result
 
     async def async_update(self):
-        """ Fetch new state data for the sensor. """
+        """ Fetch new state data for the sensor, state is written by the caller anyway """
         try:
-            result = await update(self._hass, self._config)
-            if result is None:
-                self._attr_available = False
-                self._attr_native_value = None
-                _LOGGER.debug(
-                    f"Failed to update {self.name}: "
-                    f"some sensors is not available now")
-                return
-
-            self._attr_available = True
-            self._attr_native_value = result
+            results = await self._compute.async_get_results()
+            result = results.get(self._circuit_id)
+            self._output.accept(result, force=True)
+            self.set_result(result)
         except Exception as e:
             self._attr_available = False
             self._attr_native_value = None
             _LOGGER.error(f"Failed to update {self.name}: {e}")
 
 
+class WDAForecastSensor(SensorEntity):
+    """
+    Target flow temperature ahead by the lead time, read from the setpoint
+    trajectory which is calculated once per forecast and inputs change.
+    """
+
+    _attr_should_poll = False
+
+    # Trajectory changes with every forecast
+    _unrecorded_attributes = frozenset({"trajectory"})
+
+    def __init__(self, hass, config_entry, compute, circuit):
+        self._hass = hass
+        self._config = config_entry
+        self._compute = compute
+        self._circuit_id = circuit.id
+        self._unsub_point = None
+        self._written = None
+
+        self._attr_has_entity_name = True
+        self._attr_translation_key = "wda_forecast_sensor"
+        self._attr_unique_id = f"wda_forecast_sensor_{config_entry.entry_id}{circuit.unique_id_suffix}"
+        self._attr_available = False
+        self._attr_native_value = None
+        self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+        self._attr_device_class = SensorDeviceClass.TEMPERATURE
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_icon = "mdi:weather-partly-snowy-rainy"
+
+        # Device info
+        self._attr_device_info = DeviceInfo(
+            identifiers={circuit.device_identifier}
+        )
+
+    @property
+    def trajectory(self):
+        return self._compute.trajectories.get(self._circuit_id)
+
+    @property
+    def extra_state_attributes(self):
+        trajectory = self.trajectory
+        forecast = self._compute.forecast
+        return {
+            "lead_time": self._compute.settings.forecast_lead_time,
+            "forecast_time": None if forecast is None else forecast.fetched_at,
+            "trajectory": [] if trajectory is None else trajectory.as_list(),
+        }
+
+    async def async_added_to_hass(self):
+        """ Subscribe to recalculations. """
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self._compute.async_add_listener(self.handle_compute_update))
+        self.async_on_remove(self._cancel_point)
+
+    async def handle_compute_update(self, triggers):
+        """ Handle recalculation. """
+        self.refresh()
+
+    @callback
+    def refresh(self, _now=None):
+        """ Publish setpoint of the lead time, schedule update at the next trajectory point """
+        self._cancel_point()
+        trajectory = self.trajectory
+        lead_time = timedelta(hours=self._compute.settings.forecast_lead_time)
+        when = dt_util.utcnow() + lead_time
+
+        value = None if trajectory is None else trajectory.at(when)
+        self._attr_available = value is not None
+        self._attr_native_value = value
+
+        # Most recalculations leave forecast and inputs, hence the trajectory, unchanged
+        forecast = self._compute.forecast
+        written = (
+            value,
+            self._compute.settings.forecast_lead_time,
+            None if forecast is None else forecast.fetched_at,
+            None if trajectory is None else (trajectory.times, trajectory.setpoints),
+        )
+        if written != self._written:
+            self._written = written
+            self.async_write_ha_state()
+
+        next_change = None if trajectory is None else trajectory.next_change(when)
+        if next_change is not None:
+            self._unsub_point = async_track_point_in_utc_time(self._hass, self.refresh, next_change - lead_time)
+
+    @callback
+    def _cancel_point(self):
+        if self._unsub_point is not None:
+            self._unsub_point()
+            self._unsub_point = None
+
+
 class WDAPeriodicSensor(WDASensorMixin, CoordinatorEntity, SensorEntity):
     """ Periodically updated sensor """
 
-    def __init__(self, hass, config_entry, coordinator):
+    def __init__(self, hass, config_entry, coordinator, compute):
         self._hass = hass
         self._config = config_entry
+        self._compute = compute
         super().__init__(coordinator)
 
         self._attr_has_entity_name = True
@@ -197,14 +309,9 @@ class WDAPeriodicSensor(WDASensorMixin, CoordinatorEntity, SensorEntity):
     async def async_added_to_hass(self):
         await super().async_added_to_hass()
 
-        # Subscribe to update configuration via OptionsFlow
+        # Number inputs and configuration updates are handled by shared calculation
         self.async_on_remove(
-            async_dispatcher_connect(
-                self._hass,
-                f"{SENSOR_UPDATE_SIGNAL}_{self._config.entry_id}",
-                self.handle_options_update
-            )
-        )
+            self._compute.async_add_listener(self.handle_compute_update))
 
         # Subscribe to HA started
         self._hass.bus.async_listen_once(
@@ -212,38 +319,24 @@ class WDAPeriodicSensor(WDASensorMixin, CoordinatorEntity, SensorEntity):
             self.handle_ha_started
         )
 
-        # Subscribe to number inputs
-        await self.subscribe_with_retry(
-            unique_id=f"{OPT_WDA_TARGET_ROOM_TEMP}_{self._config.entry_id}"
-        )
-        await self.subscribe_with_retry(
-            unique_id=f"{OPT_WDA_HEATING_CURVE}_{self._config.entry_id}"
-        )
-
-    async def handle_sensor_update(self, event):
-        """ Handle sensors update. """
-        _LOGGER.info(
-            f"Sensor state change detected: {event.data.get('entity_id')}, "
-            f"updating sensor: {self.name}")
-
-        # Refresh data
-        await self.coordinator.async_refresh()
-
-    async def handle_options_update(self):
-        """ Handle options update. """
-        _LOGGER.info(f"Configuration updated, updating sensor: {self.name}")
-
-        # We have new update interval for coordinator
-        update_interval = timedelta(seconds=int(get_config_value(
-            self._config, OPT_WDA_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)))
-        if self.coordinator.update_interval != update_interval:
-            self.coordinator.update_interval = update_interval
+    async def handle_compute_update(self, triggers):
+        """ Handle recalculation, weather sensors are followed periodically only. """
+        if TRIGGER_OPTIONS in triggers:
+            # Update interval is applied by the coordinator
+            _LOGGER.info(f"Configuration updated, updating sensor: {self.name}")
+        elif TRIGGER_NUMBER in triggers:
+            _LOGGER.info(f"Number input change detected, updating sensor: {self.name}")
+        elif TRIGGER_RESTORED in triggers:
+            _LOGGER.debug(f"First calculation is done, updating sensor: {self.name}")
+        else:
+            return
 
         # Refresh data
         await self.coordinator.async_refresh()
 
     async def handle_ha_started(self, event):
         _LOGGER.info(f"HA started, updating sensor: {self.name}")
+        self._compute.stats.count_trigger(TRIGGER_HA_STARTED)
 
         # Refresh data
         await self.coordinator.async_refresh()
@@ -258,10 +351,15 @@ class WDAPeriodicSensor(WDASensorMixin, CoordinatorEntity, SensorEntity):
 class WDACurveSensor(WDASensorMixin, SensorEntity):
     """ Sensor for calculating heating curve graph data. """
 
-    def __init__(self, hass, config_entry):
+    # Graph data is also available on demand via websocket and HTTP API,
+    # state attributes may be disabled in the graph settings
+    _unrecorded_attributes = frozenset({"graph_data_map", "graph_data_items"})
+
+    def __init__(self, hass, config_entry, compute):
         """Initialize the sensor."""
         self._hass = hass
         self._config = config_entry
+        self._compute = compute
 
         self._attr_has_entity_name = True
         self._attr_translation_key = "wda_sensor_graph_data"
@@ -270,6 +368,13 @@ class WDACurveSensor(WDASensorMixin, SensorEntity):
         self._attr_native_value = None
         self._attr_icon = "mdi:chart-bell-curve-cumulative"
 
+        # Graph data is regenerated only on heating curve or settings change
+        self._graph_key = None
+        self._graph_attrs = {
+            "graph_data_map": {},
+            "graph_data_items": []
+        }
+
         # Device info
         self._attr_device_info = DeviceInfo(
             identifiers={(DOMAIN, config_entry.entry_id)}
@@ -279,18 +384,15 @@ class WDACurveSensor(WDASensorMixin, SensorEntity):
         """ Subscribe to sensors and configuration update. """
         await super().async_added_to_hass()
 
-        # Subscribe to update configuration via OptionsFlow
+        # Configuration is updated after settings are compiled by shared calculation
         self.async_on_remove(
-            async_dispatcher_connect(
-                self._hass,
-                f"{SENSOR_UPDATE_SIGNAL}_{self._config.entry_id}",
-                self.handle_options_update
-            )
-        )
+            self._compute.async_add_listener(self.handle_compute_update))
 
         # Subscribe to number input (heating curve number)
-        await self.subscribe_with_retry(
-            unique_id=f"{OPT_WDA_HEATING_CURVE}_{self._config.entry_id}")
+        self.track_unique_id(self._compute.settings.heating_curve_unique_id)
+
+        # Initial graph data
+        self.refresh_graph_data()
 
     async def handle_sensor_update(self, event):
         """ Handle sensors update. """
@@ -298,12 +400,25 @@ class WDACurveSensor(WDASensorMixin, SensorEntity):
             f"Sensor state change detected: {event.data.get('entity_id')}, "
             f"updating sensor: {self.name}")
         await self.async_update()
+        self.refresh_graph_data()
         self.async_write_ha_state()
 
+    async def handle_compute_update(self, triggers):
+        """ Handle recalculation. """
+        if TRIGGER_OPTIONS in triggers:
+            await self.handle_options_update()
+        elif TRIGGER_RESTORED in triggers:
+            await self.async_refresh()
+
     async def handle_options_update(self):
         """ Handle options update. """
         _LOGGER.info(f"Configuration updated, updating sensor: {self.name}")
+        await self.async_refresh()
+
+    async def async_refresh(self):
+        """ Update value and graph data, write state """
         await self.async_update()
+        self.refresh_graph_data()
         self.async_write_ha_state()
 
     async def async_update(self):
@@ -312,7 +427,7 @@ class WDACurveSensor(WDASensorMixin, SensorEntity):
             result = await get_sensor_value_by_uniq(
                 hass=self._hass,
                 platform=Platform.NUMBER,
-                unique_id=f"{OPT_WDA_HEATING_CURVE}_{self._config.entry_id}",
+                unique_id=self._compute.settings.heating_curve_unique_id,
                 coerce=int
             )
 
@@ -334,35 +449,144 @@ class WDACurveSensor(WDASensorMixin, SensorEntity):
     @property
     def extra_state_attributes(self):
         """ Return the state attributes. """
-        extra_attrs = {
-            "graph_data_map": {},
-            "graph_data_items": []
-        }
+        if not self._compute.settings.graph_attributes:
+            return None
+        return self._graph_attrs
 
+    def refresh_graph_data(self):
+        """ Regenerate graph data if heating curve or graph settings are changed """
         heating_curve = self.native_value
         if heating_curve is None:
-            return extra_attrs
-
-        # Get advanced settings
-        adv_config = get_config_value(self._config, SECTION_ADVANCED_SETTINGS, {})
+            graph_key = None
+        else:
+            settings = self._compute.settings
+            graph_key = (
+                heating_curve,
+                settings.exp_min,
+                settings.exp_max,
+                settings.graph_min_outside_temp,
+                settings.graph_max_outside_temp)
+
+        if graph_key == self._graph_key:
+            return
 
-        exp_min = float(adv_config.get(OPT_WDA_EXP_MIN, DEFAULT_EXP_MIN))
-        exp_max = float(adv_config.get(OPT_WDA_EXP_MAX, DEFAULT_EXP_MAX))
-        graph_data = self.generate_graph_data(heating_curve, exp_min, exp_max)
-        return {
+        self._graph_key = graph_key
+        start = self._compute.stats.start()
+        graph_data = {} if graph_key is None else self.generate_graph_data(*graph_key)
+        self._compute.stats.record(TIMER_GRAPH_DATA, start)
+        self._graph_attrs = {
             "graph_data_map": graph_data,
             "graph_data_items": list(graph_data.items())
         }
+        self._hass.data[DOMAIN][self._config.entry_id]["curve"].async_update(graph_data)
 
-    def generate_graph_data(self, heating_curve, exp_min, exp_max):
-        # Graph config
-        graph_config = get_config_value(self._config, SECTION_CURVE_GRAPH_SETTINGS, {})
-        min_outside_temp = int(graph_config.get(OPT_GRAPH_MIN_OUTSIDE_TEMP, GRAPH_MIN_OUTSIDE_TEMP))
-        max_outside_temp = int(graph_config.get(OPT_GRAPH_MAX_OUTSIDE_TEMP, GRAPH_MAX_OUTSIDE_TEMP))
+    def generate_graph_data(
+            self,
+            heating_curve,
+            exp_min,
+            exp_max,
+            min_outside_temp=GRAPH_MIN_OUTSIDE_TEMP,
+            max_outside_temp=GRAPH_MAX_OUTSIDE_TEMP):
+        """ Return heating curve points for the outside temperature range """
+        outside_temps = range(min_outside_temp, max_outside_temp + 1)
+        targets = CURVE_CACHE.calc_target_batch(outside_temps, heating_curve, exp_min, exp_max, ndigits=1)
+        return dict(zip(outside_temps, targets))
+
+
+def _latency_value(timer):
+    def value(compute):
+        histogram = compute.stats.get_latency(timer)
+        if histogram is None or histogram.mean is None:
+            return None
+        return round(histogram.mean, 3)
+    return value
+
+
+def _latency_attributes(timer):
+    def attributes(compute):
+        histogram = compute.stats.get_latency(timer)
+        return {} if histogram is None else histogram.as_dict()
+    return attributes
+
+
+DIAGNOSTIC_SENSORS = {
+    "wda_update_latency": {
+        "unit": UnitOfTime.MILLISECONDS,
+        "device_class": SensorDeviceClass.DURATION,
+        "icon": "mdi:timer-outline",
+        "value": _latency_value(TIMER_UPDATE),
+        "attributes": _latency_attributes(TIMER_UPDATE),
+    },
+    "wda_graph_data_latency": {
+        "unit": UnitOfTime.MILLISECONDS,
+        "device_class": SensorDeviceClass.DURATION,
+        "icon": "mdi:timer-outline",
+        "value": _latency_value(TIMER_GRAPH_DATA),
+        "attributes": _latency_attributes(TIMER_GRAPH_DATA),
+    },
+    "wda_recalculations": {
+        "state_class": SensorStateClass.TOTAL_INCREASING,
+        "icon": "mdi:counter",
+        "value": lambda compute: compute.computations,
+        "attributes": lambda compute: {"triggers": dict(compute.stats.triggers)},
+    },
+    "wda_effective_update_interval": {
+        "unit": UnitOfTime.SECONDS,
+        "device_class": SensorDeviceClass.DURATION,
+        "icon": "mdi:timer-sync-outline",
+        "value": lambda compute: compute.stats.update_interval,
+        "attributes": lambda compute: {"rates_per_hour": compute.stats.update_interval_rates},
+    },
+    "wda_coordinator_failures": {
+        "state_class": SensorStateClass.TOTAL_INCREASING,
+        "icon": "mdi:alert-circle-outline",
+        "value": lambda compute: compute.stats.refresh_failures,
+        "attributes": lambda compute: {
+            "refreshes": compute.stats.refreshes,
+            "last_error": compute.stats.last_refresh_error,
+        },
+    },
+}
+
+
+class WDADiagnosticSensor(SensorEntity):
+    """
+    Performance instrumentation of the config entry, polled. Available only
+    while instrumentation is enabled in the advanced settings.
+    """
+
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, hass, config_entry, compute, name, entity_config):
+        self._hass = hass
+        self._config = config_entry
+        self._compute = compute
+        self._value = entity_config["value"]
+        self._attributes = entity_config["attributes"]
 
-        # Range of outside temperature
-        outside_temps = list(range(min_outside_temp, max_outside_temp + 1))
-        return {
-            temp: round(calc_target(temp, heating_curve, exp_min, exp_max), 1)
-            for temp in outside_temps
-        }
+        self._attr_has_entity_name = True
+        self._attr_translation_key = name
+        self._attr_unique_id = f"{name}_{config_entry.entry_id}"
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._attr_native_unit_of_measurement = entity_config.get("unit")
+        self._attr_device_class = entity_config.get("device_class")
+        self._attr_state_class = entity_config.get("state_class", SensorStateClass.MEASUREMENT)
+        self._attr_icon = entity_config.get("icon")
+        self._attr_available = False
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+
+        # Device info
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, config_entry.entry_id)}
+        )
+
+    async def async_update(self):
+        """ Read collected data """
+        self._attr_available = self._compute.stats.enabled
+        if not self._attr_available:
+            self._attr_native_value = None
+            self._attr_extra_state_attributes = {}
+            return
+        self._attr_native_value = self._value(self._compute)
+        self._attr_extra_state_attributes = self._attributes(self._compute)
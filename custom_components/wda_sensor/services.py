@@ -0,0 +1,340 @@
+""" Integration services. """
+import logging
+import time
+from datetime import timedelta
+
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+import voluptuous as vol
+
+from .const import *  # noqa F403
+from .curve import calc_target_batch, get_curve_solver
+from .helpers import get_entity_id, get_sensor_value_by_uniq
+from .trace import trace_as_dict
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_FIT_CURVE = "fit_curve"
+SERVICE_SOLVE_HEATING_CURVE = "solve_heating_curve"
+SERVICE_GET_TRACE = "get_trace"
+SERVICE_SET_PARAMETERS = "set_parameters"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_CIRCUIT = "circuit"
+ATTR_FLOW_TEMP_ENTITY = "flow_temp_entity"
+ATTR_DAYS = "days"
+ATTR_SAMPLE_INTERVAL = "sample_interval"
+ATTR_MIN_FLOW_TEMP = "min_flow_temp"
+ATTR_TARGETS = "targets"
+ATTR_OUTSIDE_TEMP = "outside_temp"
+ATTR_FLOW_TEMP = "flow_temp"
+ATTR_EXP_MIN = "exp_min"
+ATTR_EXP_MAX = "exp_max"
+ATTR_LIMIT = "limit"
+ATTR_ENTRIES = "entries"
+ATTR_HEATING_CURVE = "heating_curve"
+ATTR_TARGET_ROOM_TEMP = "target_room_temp"
+
+# Service fields of circuit parameters and their number entities
+PARAMETERS = {
+    ATTR_HEATING_CURVE: OPT_WDA_HEATING_CURVE,
+    ATTR_TARGET_ROOM_TEMP: OPT_WDA_TARGET_ROOM_TEMP,
+}
+
+FIT_CURVE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Required(ATTR_FLOW_TEMP_ENTITY): cv.entity_id,
+    vol.Optional(ATTR_CIRCUIT, default=MAIN_CIRCUIT): cv.string,
+    vol.Optional(ATTR_DAYS, default=30): vol.All(vol.Coerce(float), vol.Range(min=1, max=365)),
+    vol.Optional(ATTR_SAMPLE_INTERVAL, default=300): vol.All(vol.Coerce(int), vol.Range(min=60, max=3600)),
+    vol.Optional(ATTR_MIN_FLOW_TEMP): vol.Coerce(float),
+})
+
+SOLVE_HEATING_CURVE_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Required(ATTR_TARGETS): vol.All(cv.ensure_list, vol.Length(min=1), [vol.Schema({
+        vol.Required(ATTR_OUTSIDE_TEMP): vol.Coerce(float),
+        vol.Required(ATTR_FLOW_TEMP): vol.Coerce(float),
+    })]),
+    vol.Optional(ATTR_EXP_MIN): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=10)),
+    vol.Optional(ATTR_EXP_MAX): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=10)),
+})
+
+GET_TRACE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Optional(ATTR_CIRCUIT): cv.string,
+    vol.Optional(ATTR_LIMIT): vol.All(vol.Coerce(int), vol.Range(min=1, max=DEFAULT_TRACE_SIZE)),
+})
+
+SET_PARAMETERS_SCHEMA = vol.Schema({
+    vol.Required(ATTR_ENTRIES): vol.All(cv.ensure_list, vol.Length(min=1), [vol.All(vol.Schema({
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_CIRCUIT): cv.string,
+        vol.Optional(ATTR_HEATING_CURVE): vol.All(
+            vol.Coerce(int), vol.Range(min=MIN_HEATING_CURVE, max=MAX_HEATING_CURVE)),
+        vol.Optional(ATTR_TARGET_ROOM_TEMP): vol.All(
+            vol.Coerce(float), vol.Range(min=MIN_TARGET_ROOT_TEMP, max=MAX_TARGET_ROOT_TEMP)),
+    }), cv.has_at_least_one_key(*PARAMETERS))]),
+})
+
+
+def get_entry_compute(hass, entry_id):
+    """ Return shared calculation of a loaded config entry """
+    entry_data = hass.data.get(DOMAIN, {}).get(entry_id)
+    if not isinstance(entry_data, dict):
+        raise ServiceValidationError(f"Config entry {entry_id} is not loaded")
+    return entry_data["compute"]
+
+
+def get_circuit(settings, circuit_id):
+    for circuit in settings.circuits:
+        if circuit.id == circuit_id:
+            return circuit
+    raise ServiceValidationError(f"Unknown heating circuit: {circuit_id}")
+
+
+def _history_arrays(states):
+    """ Times and numeric values of recorded states, non-numeric states are skipped """
+    times, values = [], []
+    for state in states:
+        try:
+            value = float(state.state)
+        except (TypeError, ValueError):
+            continue
+        times.append(state.last_changed.timestamp())
+        values.append(value)
+    return times, values
+
+
+def _fit_history(history, entities, settings, start, end, interval, min_flow_temp, current):
+    """ Resample recorded history and fit the heating curve, runs in executor """
+    from .fit import calc_corrections, fit_curve, fuse, np, resample
+
+    grid = np.arange(start, end, interval, dtype=np.float64)
+    series = {}
+    for name, (source, entity_ids) in entities.items():
+        if entity_ids:
+            # Several sensors of an input are combined as they are for the sensor
+            series[name] = fuse(source, [
+                resample(*_history_arrays(history.get(entity_id, ())), grid)
+                for entity_id in entity_ids
+            ])
+        else:
+            series[name] = None
+
+    actual = series[ATTR_FLOW_TEMP_ENTITY]
+    # Samples without heating (e.g. summer or DHW priority) are not related to the curve
+    actual[actual < min_flow_temp] = np.nan
+
+    corrections = calc_corrections(
+        settings, len(grid),
+        inside_temp=series[OPT_WDA_INSIDE_TEMP],
+        target_room_temp=series[OPT_WDA_TARGET_ROOM_TEMP],
+        wind_speed=series[OPT_WDA_WIND_SPEED],
+        outside_humidity=series[OPT_WDA_OUTSIDE_HUMIDITY])
+
+    return fit_curve(
+        series[OPT_WDA_OUTSIDE_TEMP], corrections, actual,
+        settings.min_coolant_temp, settings.max_coolant_temp, current)
+
+
+async def async_fit_curve(hass: HomeAssistant, call: ServiceCall):
+    """ Fit heating curve number and exponents of a circuit to recorded flow temperature """
+    from homeassistant.components.recorder import get_instance, history
+
+    compute = get_entry_compute(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+    settings = compute.settings
+    circuit = get_circuit(settings, call.data[ATTR_CIRCUIT])
+
+    # Input sources and their entities
+    target_room_temp_entity = await get_entity_id(hass, Platform.NUMBER, circuit.target_room_temp_unique_id)
+    entities = {
+        OPT_WDA_OUTSIDE_TEMP: (settings.outside_temp_source, settings.outside_temp_source.entities),
+        OPT_WDA_INSIDE_TEMP: (circuit.inside_temp_source, circuit.inside_temp_source.entities),
+        OPT_WDA_WIND_SPEED: (settings.wind_speed_source, settings.wind_speed_source.entities),
+        OPT_WDA_OUTSIDE_HUMIDITY: (settings.outside_humidity_source, settings.outside_humidity_source.entities),
+        OPT_WDA_TARGET_ROOM_TEMP: (None, (target_room_temp_entity,) if target_room_temp_entity else ()),
+        ATTR_FLOW_TEMP_ENTITY: (None, (call.data[ATTR_FLOW_TEMP_ENTITY],)),
+    }
+    if not entities[OPT_WDA_OUTSIDE_TEMP][1]:
+        raise ServiceValidationError("Outside temperature sensor is not configured")
+
+    heating_curve = await get_sensor_value_by_uniq(
+        hass, Platform.NUMBER, circuit.heating_curve_unique_id, coerce=int)
+    current = None
+    if heating_curve is not None:
+        current = (heating_curve, settings.exp_min, settings.exp_max)
+
+    end_time = dt_util.utcnow()
+    start_time = end_time - timedelta(days=call.data[ATTR_DAYS])
+    entity_ids = list({entity_id: None for _, ids in entities.values() for entity_id in ids})
+
+    started = time.perf_counter()
+    history_states = await get_instance(hass).async_add_executor_job(
+        lambda: history.get_significant_states(
+            hass, start_time, end_time, entity_ids,
+            significant_changes_only=False, no_attributes=True))
+
+    try:
+        result = await hass.async_add_executor_job(
+            _fit_history, history_states, entities, settings,
+            start_time.timestamp(), end_time.timestamp(), call.data[ATTR_SAMPLE_INTERVAL],
+            call.data.get(ATTR_MIN_FLOW_TEMP, circuit.min_coolant_temp), current)
+    except (RuntimeError, ValueError) as e:
+        raise HomeAssistantError(f"Heating curve fitting failed: {e}") from e
+
+    _LOGGER.debug(
+        f"Heating curve of {settings.title} fitted in {time.perf_counter() - started:.2f}s: {result}")
+    return result
+
+
+def solve_heating_curve(targets, exp_min=DEFAULT_EXP_MIN, exp_max=DEFAULT_EXP_MAX):
+    """
+    Heating curve numbers giving the flow temperatures of `targets`, a list
+    of (outside temperature, flow temperature) pairs, and the single curve
+    number which fits all pairs best
+    """
+    solver = get_curve_solver(exp_min, exp_max)
+    outside_temps = [outside_temp for outside_temp, _ in targets]
+    flow_temps = [flow_temp for _, flow_temp in targets]
+    heating_curves = solver.solve_batch(outside_temps, flow_temps)
+    calculated = calc_target_batch(outside_temps, heating_curves, exp_min, exp_max, ndigits=1)
+
+    return {
+        "heating_curve": solver.best_fit(outside_temps, flow_temps),
+        "exp_min": exp_min,
+        "exp_max": exp_max,
+        "targets": [
+            {
+                ATTR_OUTSIDE_TEMP: outside_temp,
+                ATTR_FLOW_TEMP: flow_temp,
+                "heating_curve": heating_curve,
+                "calculated_flow_temp": value,
+            }
+            for outside_temp, flow_temp, heating_curve, value in zip(
+                outside_temps, flow_temps, heating_curves, calculated)
+        ],
+    }
+
+
+@callback
+def async_solve_heating_curve(hass: HomeAssistant, call: ServiceCall):
+    """ Find heating curve numbers for desired flow temperatures at outside temperatures """
+    exp_min, exp_max = DEFAULT_EXP_MIN, DEFAULT_EXP_MAX
+    if ATTR_CONFIG_ENTRY_ID in call.data:
+        settings = get_entry_compute(hass, call.data[ATTR_CONFIG_ENTRY_ID]).settings
+        exp_min, exp_max = settings.exp_min, settings.exp_max
+
+    targets = [(target[ATTR_OUTSIDE_TEMP], target[ATTR_FLOW_TEMP]) for target in call.data[ATTR_TARGETS]]
+    return solve_heating_curve(
+        targets, call.data.get(ATTR_EXP_MIN, exp_min), call.data.get(ATTR_EXP_MAX, exp_max))
+
+
+@callback
+def async_get_trace(hass: HomeAssistant, call: ServiceCall):
+    """
+    Return the last calculations of a config entry with terms of every
+    setpoint, the trace is kept only with performance instrumentation
+    """
+    compute = get_entry_compute(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+    circuit_id = call.data.get(ATTR_CIRCUIT)
+    if circuit_id is not None:
+        get_circuit(compute.settings, circuit_id)
+    return trace_as_dict(compute.trace, limit=call.data.get(ATTR_LIMIT), circuit_id=circuit_id)
+
+
+def _circuit_numbers(compute, circuit, fields):
+    """ Number entities of circuit parameters by service field, only of the given fields """
+    numbers = {}
+    for field, unique_id in (
+        (ATTR_HEATING_CURVE, circuit.heating_curve_unique_id),
+        (ATTR_TARGET_ROOM_TEMP, circuit.target_room_temp_unique_id),
+    ):
+        if field not in fields:
+            continue
+        number = compute.numbers.get(unique_id)
+        if number is None:
+            raise ServiceValidationError(
+                f"Parameter {PARAMETERS[field]} of {compute.settings.title} is not available")
+        numbers[field] = number
+    return numbers
+
+
+async def async_set_parameters(hass: HomeAssistant, call: ServiceCall):
+    """
+    Set heating curve and target room temperature of many circuits at once.
+    All entries are validated before any change, every changed value is
+    written once and every config entry is recalculated once.
+    """
+    # Values of number entities by config entry, the last one wins
+    changes = {}
+    for item in call.data[ATTR_ENTRIES]:
+        entry_id = item[ATTR_CONFIG_ENTRY_ID]
+        compute = get_entry_compute(hass, entry_id)
+        if not compute.ready:
+            raise ServiceValidationError(f"Parameters of {compute.settings.title} are not restored yet")
+
+        if ATTR_CIRCUIT in item:
+            circuits = [get_circuit(compute.settings, item[ATTR_CIRCUIT])]
+        else:
+            circuits = compute.settings.circuits
+
+        values = changes.setdefault(entry_id, (compute, {}))[1]
+        for circuit in circuits:
+            for field, number in _circuit_numbers(compute, circuit, item).items():
+                values[number] = item[field]
+
+    # Recalculations by the number state changes are made on release
+    for compute, _ in changes.values():
+        compute.async_hold()
+
+    response = {}
+    try:
+        for entry_id, (compute, values) in changes.items():
+            changed = [number.entity_id for number, value in values.items() if number.async_update_value(value)]
+            response[entry_id] = {"changed": changed}
+    finally:
+        for entry_id, (compute, _) in changes.items():
+            await compute.async_release(TRIGGER_NUMBER if response.get(entry_id, {}).get("changed") else None)
+
+    _LOGGER.debug(f"Parameters set: {response}")
+    return response
+
+
+@callback
+def async_setup_services(hass: HomeAssistant):
+    """ Register integration services """
+
+    async def fit_curve(call: ServiceCall):
+        return await async_fit_curve(hass, call)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_FIT_CURVE, fit_curve,
+        schema=FIT_CURVE_SCHEMA, supports_response=SupportsResponse.ONLY)
+
+    @callback
+    def solve_curve(call: ServiceCall):
+        return async_solve_heating_curve(hass, call)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SOLVE_HEATING_CURVE, solve_curve,
+        schema=SOLVE_HEATING_CURVE_SCHEMA, supports_response=SupportsResponse.ONLY)
+
+    @callback
+    def get_trace(call: ServiceCall):
+        return async_get_trace(hass, call)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_TRACE, get_trace,
+        schema=GET_TRACE_SCHEMA, supports_response=SupportsResponse.ONLY)
+
+    async def set_parameters(call: ServiceCall):
+        return await async_set_parameters(hass, call)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_PARAMETERS, set_parameters,
+        schema=SET_PARAMETERS_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
@@ -0,0 +1,276 @@
+""" Compiled config entry settings. """
+from .const import *  # noqa F403
+from .curve import calc_target, get_curve_constants
+
+
+class FrozenSettings:
+    """ Base class of immutable settings objects """
+
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    # Pickling for process pools
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def as_dict(self, exclude=()):
+        """ Return settings as dict, nested settings are converted too """
+        result = {}
+        for name in self.__slots__:
+            if name in exclude:
+                continue
+            value = getattr(self, name)
+            if isinstance(value, tuple) and value and isinstance(value[0], FrozenSettings):
+                value = [item.as_dict() for item in value]
+            elif isinstance(value, FrozenSettings):
+                value = value.as_dict()
+            result[name] = value
+        return result
+
+
+def parse_weights(text):
+    """ Weights of sources from comma separated text, raise ValueError if invalid """
+    if not text or not text.strip():
+        return ()
+    weights = tuple(float(weight) for weight in text.split(","))
+    if any(weight < 0 for weight in weights):
+        raise ValueError("Weights must not be negative")
+    return weights
+
+
+class SourceSettings(FrozenSettings):
+    """
+    Source sensors of an input and the way their values are combined.
+    Weights are aligned with entities, all are 1 unless the mode is weighted.
+    """
+
+    __slots__ = (
+        "entities",
+        "mode",
+        "weights",
+        "outlier_threshold",
+    )
+
+    @classmethod
+    def create(cls, key, entities, fusion_config):
+        # Single entity of older configs
+        if isinstance(entities, str):
+            entities = [entities]
+        entities = tuple(dict.fromkeys(entity_id for entity_id in entities or () if entity_id))
+
+        mode_option, weights_option, outlier_threshold = FUSION_INPUTS[key]
+        mode = fusion_config.get(mode_option, DEFAULT_FUSION)
+        weights = (1.0,) * len(entities)
+        if mode == FUSION_WEIGHTED_MEAN:
+            # Missing weights are 1
+            configured = parse_weights(fusion_config.get(weights_option))[:len(entities)]
+            weights = configured + weights[len(configured):]
+
+        return cls(
+            entities=entities,
+            mode=mode,
+            weights=weights,
+            outlier_threshold=outlier_threshold,
+        )
+
+
+class CircuitSettings(FrozenSettings):
+    """
+    Heating circuit of a config entry. Circuits share weather inputs and
+    the curve shape, and differ in heating curve, limits and room sensor.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "min_coolant_temp",
+        "max_coolant_temp",
+        "inside_temp_source",
+        "device_identifier",
+        "unique_id_suffix",
+        "sensor_unique_id",
+        "target_room_temp_unique_id",
+        "heating_curve_unique_id",
+    )
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.id!r}: {self.name}>"
+
+    @classmethod
+    def create(cls, entry_id, circuit_id, name, min_coolant_temp, max_coolant_temp, inside_temp_source):
+        # Main circuit keeps unique IDs of the single circuit entries
+        suffix = f"_{circuit_id}" if circuit_id != MAIN_CIRCUIT else ""
+        return cls(
+            id=circuit_id,
+            name=name,
+            min_coolant_temp=int(min_coolant_temp),
+            max_coolant_temp=int(max_coolant_temp),
+            inside_temp_source=inside_temp_source,
+            device_identifier=(DOMAIN, f"{entry_id}{suffix}"),
+            unique_id_suffix=suffix,
+            sensor_unique_id=f"wda_sensor_{entry_id}{suffix}",
+            target_room_temp_unique_id=f"{OPT_WDA_TARGET_ROOM_TEMP}_{entry_id}{suffix}",
+            heating_curve_unique_id=f"{OPT_WDA_HEATING_CURVE}_{entry_id}{suffix}",
+        )
+
+
+class WDASettings(FrozenSettings):
+    """
+    Immutable snapshot of config entry data and options with validated
+    numeric values and precomputed heating curve constants. Curve constants
+    are tuples indexed by heating curve number.
+    """
+
+    __slots__ = (
+        "entry_id",
+        "title",
+        "min_coolant_temp",
+        "max_coolant_temp",
+        "update_interval",
+        "min_update_interval",
+        "max_update_interval",
+        "outside_temp_source",
+        "inside_temp_source",
+        "wind_speed_source",
+        "outside_humidity_source",
+        "weather_entity",
+        "forecast_lead_time",
+        "room_temp_correction",
+        "wind_correction",
+        "humidity_correction",
+        "exp_min",
+        "exp_max",
+        "coalesce_window",
+        "coalesce_max_latency",
+        "output_deadband",
+        "output_min_hold_time",
+        "diagnostics",
+        "graph_min_outside_temp",
+        "graph_max_outside_temp",
+        "graph_attributes",
+        "target_room_temp_unique_id",
+        "heating_curve_unique_id",
+        "outside_temp_min",
+        "outside_temp_max",
+        "denominator",
+        "normalized_hc",
+        "a",
+        "exponent",
+        "circuits",
+    )
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.entry_id}: {self.title}>"
+
+    @classmethod
+    def from_config_entry(cls, config_entry):
+        """ Compile settings of config entry """
+        # Value priority: options > data > default
+        config = config_entry.options or config_entry.data
+        adv_config = config.get(SECTION_ADVANCED_SETTINGS, {})
+        graph_config = config.get(SECTION_CURVE_GRAPH_SETTINGS, {})
+        fusion_config = config.get(SECTION_FUSION_SETTINGS, {})
+        entry_id = config_entry.entry_id
+
+        exp_min = float(adv_config.get(OPT_WDA_EXP_MIN, DEFAULT_EXP_MIN))
+        exp_max = float(adv_config.get(OPT_WDA_EXP_MAX, DEFAULT_EXP_MAX))
+
+        normalized_hc, a, exponent = get_curve_constants(exp_min, exp_max)
+
+        min_coolant_temp = int(config.get(OPT_WDA_MIN_COOLANT_TEMP, DEFAULT_MIN_COOLANT_TEMP))
+        max_coolant_temp = int(config.get(OPT_WDA_MAX_COOLANT_TEMP, DEFAULT_MAX_COOLANT_TEMP))
+        inside_temp_source = SourceSettings.create(
+            OPT_WDA_INSIDE_TEMP, config.get(OPT_WDA_INSIDE_TEMP), fusion_config)
+
+        # Main circuit is defined by the entry settings
+        circuits = [CircuitSettings.create(
+            entry_id, MAIN_CIRCUIT, config_entry.title,
+            min_coolant_temp, max_coolant_temp, inside_temp_source)]
+        for circuit in config.get(OPT_WDA_CIRCUITS, []):
+            # Fusion options of a circuit are stored with the circuit
+            circuits.append(CircuitSettings.create(
+                entry_id,
+                circuit[OPT_CIRCUIT_ID],
+                circuit[OPT_NAME],
+                circuit.get(OPT_WDA_MIN_COOLANT_TEMP, min_coolant_temp),
+                circuit.get(OPT_WDA_MAX_COOLANT_TEMP, max_coolant_temp),
+                SourceSettings.create(OPT_WDA_INSIDE_TEMP, circuit.get(OPT_WDA_INSIDE_TEMP), circuit)))
+
+        return cls(
+            entry_id=entry_id,
+            title=config_entry.title,
+            min_coolant_temp=min_coolant_temp,
+            max_coolant_temp=max_coolant_temp,
+            update_interval=int(config.get(OPT_WDA_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)),
+            min_update_interval=int(adv_config.get(OPT_WDA_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL)),
+            max_update_interval=int(adv_config.get(OPT_WDA_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL)),
+            outside_temp_source=SourceSettings.create(
+                OPT_WDA_OUTSIDE_TEMP, config.get(OPT_WDA_OUTSIDE_TEMP), fusion_config),
+            inside_temp_source=inside_temp_source,
+            wind_speed_source=SourceSettings.create(
+                OPT_WDA_WIND_SPEED, config.get(OPT_WDA_WIND_SPEED), fusion_config),
+            outside_humidity_source=SourceSettings.create(
+                OPT_WDA_OUTSIDE_HUMIDITY, config.get(OPT_WDA_OUTSIDE_HUMIDITY), fusion_config),
+            weather_entity=config.get(OPT_WDA_WEATHER),
+            forecast_lead_time=float(adv_config.get(OPT_WDA_FORECAST_LEAD_TIME, DEFAULT_FORECAST_LEAD_TIME)),
+            room_temp_correction=float(adv_config.get(OPT_WDA_ROOM_TEMP_CORRECTION, 0)),
+            wind_correction=float(adv_config.get(OPT_WDA_WIND_CORRECTION, 0)),
+            humidity_correction=float(adv_config.get(OPT_WDA_HUMIDITY_CORRECTION, 0)),
+            exp_min=exp_min,
+            exp_max=exp_max,
+            coalesce_window=float(adv_config.get(OPT_WDA_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW)),
+            coalesce_max_latency=float(
+                adv_config.get(OPT_WDA_COALESCE_MAX_LATENCY, DEFAULT_COALESCE_MAX_LATENCY)),
+            output_deadband=float(adv_config.get(OPT_WDA_OUTPUT_DEADBAND, DEFAULT_OUTPUT_DEADBAND)),
+            output_min_hold_time=float(
+                adv_config.get(OPT_WDA_OUTPUT_MIN_HOLD_TIME, DEFAULT_OUTPUT_MIN_HOLD_TIME)),
+            diagnostics=bool(adv_config.get(OPT_WDA_DIAGNOSTICS, DEFAULT_DIAGNOSTICS)),
+            graph_min_outside_temp=int(graph_config.get(OPT_GRAPH_MIN_OUTSIDE_TEMP, GRAPH_MIN_OUTSIDE_TEMP)),
+            graph_max_outside_temp=int(graph_config.get(OPT_GRAPH_MAX_OUTSIDE_TEMP, GRAPH_MAX_OUTSIDE_TEMP)),
+            graph_attributes=bool(graph_config.get(OPT_GRAPH_ATTRIBUTES, DEFAULT_GRAPH_ATTRIBUTES)),
+            target_room_temp_unique_id=f"{OPT_WDA_TARGET_ROOM_TEMP}_{entry_id}",
+            heating_curve_unique_id=f"{OPT_WDA_HEATING_CURVE}_{entry_id}",
+            outside_temp_min=DEFAULT_MIN_OUTSIDE_TEMP,
+            outside_temp_max=DEFAULT_MAX_OUTSIDE_TEMP,
+            denominator=DEFAULT_MAX_OUTSIDE_TEMP - DEFAULT_MIN_OUTSIDE_TEMP,
+            normalized_hc=normalized_hc,
+            a=a,
+            exponent=exponent,
+            circuits=tuple(circuits),
+        )
+
+    def calc_target(self, outside_temp, heating_curve):
+        """
+        `calc_target` for the settings exponent range. Setpoints are always
+        calculated exactly, interpolated tables are used only for graphs
+        and forecasts where a small error does not matter.
+        """
+        # Restored states may be floats, only whole curve numbers are precomputed
+        if not MIN_HEATING_CURVE <= heating_curve <= MAX_HEATING_CURVE or heating_curve != int(heating_curve):
+            return calc_target(outside_temp, heating_curve, self.exp_min, self.exp_max)
+
+        heating_curve = int(heating_curve)
+        temp_factor = (self.outside_temp_max - outside_temp) / self.denominator
+        temp_factor = 1 if temp_factor > 1 else temp_factor
+        return self.a[heating_curve] * (1 - (1 - temp_factor) ** self.exponent[heating_curve])
+
+    def calc_target_batch(self, outside_temp, heating_curves):
+        """
+        `calc_target` of one outside temperature for many heating curves.
+        Vectorized power may differ from `calc_target` by an ulp, so values
+        are calculated one by one with the precomputed constants.
+        """
+        return [self.calc_target(outside_temp, hc) for hc in heating_curves]
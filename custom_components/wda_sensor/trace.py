@@ -0,0 +1,141 @@
+""" Bounded trace of calculations with the contribution of every term. """
+import math
+from array import array
+from datetime import datetime, timezone
+
+from .const import *  # noqa F403
+
+# Calculation triggers, stored as a bit mask
+TRACE_TRIGGERS = (
+    TRIGGER_ENTITY,
+    TRIGGER_NUMBER,
+    TRIGGER_OPTIONS,
+    TRIGGER_COORDINATOR,
+    TRIGGER_HA_STARTED,
+    TRIGGER_RESTORED,
+    TRIGGER_FORECAST,
+)
+
+# Inputs of a circuit
+TRACE_INPUTS = (
+    OPT_WDA_OUTSIDE_TEMP,
+    OPT_WDA_INSIDE_TEMP,
+    OPT_WDA_TARGET_ROOM_TEMP,
+    OPT_WDA_WIND_SPEED,
+    OPT_WDA_OUTSIDE_HUMIDITY,
+    OPT_WDA_HEATING_CURVE,
+)
+
+# Terms of the setpoint: base curve value, corrections and the change made
+# by min/max limits, their sum rounded is the setpoint
+TRACE_TERMS = ("base", "room_correction", "wind_correction", "humidity_correction", "clamp")
+
+TRACE_FIELDS = ("time", "triggers", "circuit", *TRACE_INPUTS, *TRACE_TERMS, "setpoint")
+TRACE_WIDTH = len(TRACE_FIELDS)
+
+# Circuit inputs, the rest are shared by all circuits
+_CIRCUIT_INPUTS = (OPT_WDA_INSIDE_TEMP, OPT_WDA_TARGET_ROOM_TEMP, OPT_WDA_HEATING_CURVE)
+_NO_TERMS = (None,) * len(TRACE_TERMS)
+
+
+def _number(value):
+    return math.nan if value is None else float(value)
+
+
+def _value(number):
+    return None if math.isnan(number) else number
+
+
+def trace_as_dict(trace, limit=None, circuit_id=None):
+    """ `ComputationTrace.as_dict`, an empty disabled trace if `trace` is None """
+    if trace is None:
+        return {"enabled": False, "capacity": 0, "records_total": 0, "memory_bytes": 0, "records": []}
+    return trace.as_dict(limit, circuit_id)
+
+
+class ComputationTrace:
+    """
+    Ring buffer of the last `capacity` records, one per circuit of every
+    calculation. Records are rows of a flat array of doubles, NaN marks
+    unavailable values, so memory does not depend on uptime.
+    """
+
+    __slots__ = ("capacity", "records", "_data", "_next", "_count", "_circuits")
+
+    def __init__(self, capacity=DEFAULT_TRACE_SIZE):
+        self.capacity = capacity
+        # Total number of records, including overwritten ones
+        self.records = 0
+        self._data = array("d", bytes(8 * TRACE_WIDTH * capacity))
+        self._next = 0
+        self._count = 0
+        # Circuit IDs by index, circuits are never removed from the list
+        self._circuits = []
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def memory(self):
+        """ Size of records in bytes """
+        return self._data.buffer_info()[1] * self._data.itemsize
+
+    def _circuit_index(self, circuit_id):
+        try:
+            return self._circuits.index(circuit_id)
+        except ValueError:
+            self._circuits.append(circuit_id)
+            return len(self._circuits) - 1
+
+    def record(self, timestamp, triggers, inputs, results, breakdown):
+        """ Add records of a calculation: inputs snapshot, results and terms by circuit """
+        mask = 0
+        for bit, trigger in enumerate(TRACE_TRIGGERS):
+            if trigger in triggers:
+                mask |= 1 << bit
+
+        circuit_inputs = inputs.get(OPT_WDA_CIRCUITS, {})
+        for circuit_id, values in circuit_inputs.items():
+            row = array("d", (
+                timestamp,
+                mask,
+                self._circuit_index(circuit_id),
+                *(_number(values[key] if key in _CIRCUIT_INPUTS else inputs[key]) for key in TRACE_INPUTS),
+                *(_number(term) for term in breakdown.get(circuit_id, _NO_TERMS)),
+                _number(results.get(circuit_id)),
+            ))
+            offset = self._next * TRACE_WIDTH
+            self._data[offset:offset + TRACE_WIDTH] = row
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self.records += 1
+
+    def rows(self, limit=None, circuit_id=None):
+        """ Records as tuples of numbers, oldest first """
+        start = (self._next - self._count) % self.capacity
+        rows = []
+        for index in range(self._count):
+            offset = (start + index) % self.capacity * TRACE_WIDTH
+            row = self._data[offset:offset + TRACE_WIDTH]
+            if circuit_id is None or self._circuits[int(row[2])] == circuit_id:
+                rows.append(tuple(row))
+        return rows[-limit:] if limit else rows
+
+    def as_dict(self, limit=None, circuit_id=None):
+        """ Records with decoded time, triggers and circuit, for diagnostics and services """
+        records = []
+        for row in self.rows(limit, circuit_id):
+            record = dict(zip(TRACE_FIELDS, map(_value, row)))
+            record["time"] = datetime.fromtimestamp(row[0], timezone.utc).isoformat()
+            record["triggers"] = [
+                trigger for bit, trigger in enumerate(TRACE_TRIGGERS) if int(row[1]) & (1 << bit)]
+            record["circuit"] = self._circuits[int(row[2])]
+            records.append(record)
+
+        return {
+            "enabled": True,
+            "capacity": self.capacity,
+            "records_total": self.records,
+            "memory_bytes": self.memory,
+            "records": records,
+        }
@@ -0,0 +1,35 @@
+"""
+Offline backtesting CLI, Home Assistant is not required.
+
+    python scripts/backtest.py series.csv --heating-curve 80 --output setpoints.csv
+    python scripts/backtest.py series.parquet --params params.json --output-dir results
+
+See `custom_components/wda_sensor/backtest.py` for the input format.
+Parameter files contain an object or a list of objects with keys `name`,
+`heating_curve`, `target_room_temp`, `exp_min`, `exp_max`,
+`room_temp_correction`, `wind_correction`, `humidity_correction`,
+`min_coolant_temp` and `max_coolant_temp`.
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+PACKAGE = "wda_sensor"
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / PACKAGE
+
+
+def load_package():
+    """
+    Register the integration directory as a package without running its
+    `__init__`, which needs Home Assistant. Only HA-free modules are imported.
+    """
+    spec = importlib.util.spec_from_loader(PACKAGE, loader=None, is_package=True)
+    package = importlib.util.module_from_spec(spec)
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules[PACKAGE] = package
+
+
+if __name__ == "__main__":
+    load_package()
+    from wda_sensor.backtest import main
+    sys.exit(main())